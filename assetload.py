@@ -0,0 +1,113 @@
+"""
+Background asset loading for both front-ends.
+
+The front-ends used to load every horse frame and all eleven voice clips in
+their constructors, so the first frame waited for all of them. AssetLoader
+takes the jobs in priority order: horse frames first, then the voices in
+assets.SOUNDS order, which puts the hint voices last. Each job has two
+steps. prepare() runs on one daemon thread and does the file and pack
+reads plus the sound-cache extraction. finish() creates the texture,
+PhotoImage or Sound and runs on the UI thread.
+
+The front-end calls pump() once per frame. It finishes prepared jobs until
+a few milliseconds are spent, and progress() drives the bar on the start
+button. need() finishes one job right away (preparing it inline if the
+thread has not got to it yet). That is how a voice played before it has
+streamed in gets loaded on first use.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Set
+
+
+class LoadJob(NamedTuple):
+    key: str
+    prepare: Callable[[], Any]  # 后台线程：读文件、解包，不碰 Tk/GL
+    finish: Callable[[Any], None]  # UI 线程：建纹理/图片/声音
+
+
+class AssetLoader:
+    """按优先级在后台准备资源，UI 线程每帧按时间预算收尾。"""
+
+    def __init__(self, jobs: Iterable[LoadJob], budget: float = 0.004) -> None:
+        self.jobs: List[LoadJob] = list(jobs)
+        self.by_key: Dict[str, LoadJob] = {job.key: job for job in self.jobs}
+        self.budget = budget
+        self.cond = threading.Condition()
+        self.claimed: Set[str] = set()  # 已有人在准备（线程或 need）
+        self.prepared: Dict[str, Any] = {}  # 准备好待收尾，按完成先后
+        self.done: Set[str] = set()
+        self.started_at = time.perf_counter()
+        self.finished_at: float | None = None
+        self.thread = threading.Thread(target=self._run, name="asset-loader", daemon=True)
+
+    def start(self) -> "AssetLoader":
+        self.thread.start()
+        return self
+
+    @property
+    def complete(self) -> bool:
+        return len(self.done) == len(self.jobs)
+
+    def progress(self) -> float:
+        return len(self.done) / len(self.jobs) if self.jobs else 1.0
+
+    def _prepare(self, job: LoadJob) -> Any:
+        try:
+            return job.prepare()
+        except Exception:
+            return None
+
+    def _run(self) -> None:
+        for job in self.jobs:
+            with self.cond:
+                if job.key in self.claimed:
+                    continue
+                self.claimed.add(job.key)
+            data = self._prepare(job)
+            with self.cond:
+                self.prepared[job.key] = data
+                self.cond.notify_all()
+
+    def _finish(self, key: str, data: Any) -> None:
+        try:
+            self.by_key[key].finish(data)
+        except Exception:
+            pass
+        self.done.add(key)
+        if self.complete:
+            self.finished_at = time.perf_counter()
+
+    def pump(self) -> bool:
+        """UI 线程每帧调用：收尾已准备好的资源直到用完预算；返回是否仍在载入。"""
+        deadline = time.perf_counter() + self.budget
+        while not self.complete:
+            with self.cond:
+                if not self.prepared:
+                    break
+                key = next(iter(self.prepared))
+                data = self.prepared.pop(key)
+            self._finish(key, data)
+            if time.perf_counter() >= deadline:
+                break
+        return not self.complete
+
+    def need(self, key: str) -> bool:
+        """UI 线程：立刻要用 key（比如首次播放的语音），没载完就当场载完。"""
+        if key in self.done:
+            return True
+        if key not in self.by_key:
+            return False
+        with self.cond:
+            inline = key not in self.claimed
+            self.claimed.add(key)
+        if inline:
+            data = self._prepare(self.by_key[key])
+        else:
+            with self.cond:
+                while key not in self.prepared:
+                    self.cond.wait()
+                data = self.prepared.pop(key)
+        self._finish(key, data)
+        return True
@@ -0,0 +1,159 @@
+"""
+Single-file asset pack with a header index, read through mmap.
+
+Layout (little-endian)::
+
+    header   "HGPK", version u16, entry count u16, index bytes u32, reserved u32
+    index    per entry: offset u64, length u32, crc32 u32, type u8,
+             name length u8, UTF-8 name
+    data     entry payloads, each aligned to ALIGN bytes
+
+AssetPack maps the file once and get() returns zero-copy memoryview slices,
+so loading every sprite and clip costs one open and a few page faults.
+bake_assets.py writes baked/assets.pack; ``python assetpack.py list PACK``
+prints its index.
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, List, NamedTuple, Tuple
+
+MAGIC = b"HGPK"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII")
+ENTRY = struct.Struct("<QIIBB")
+ALIGN = 64
+
+TYPE_PNG = 0
+TYPE_WAV = 1
+TYPE_OTHER = 2
+TYPE_NAMES = ("png", "wav", "bin")
+
+
+class PackEntry(NamedTuple):
+    offset: int
+    length: int
+    crc32: int
+    kind: int
+
+
+def _kind_for(name: str) -> int:
+    ext = os.path.splitext(name)[1].lower()
+    return {".png": TYPE_PNG, ".wav": TYPE_WAV}.get(ext, TYPE_OTHER)
+
+
+def write_pack(path: str, files: List[Tuple[str, str]]) -> Dict[str, PackEntry]:
+    """把 (包内名字, 磁盘路径) 列表写成一个资源包，返回索引。"""
+    blobs = []
+    index_size = 0
+    for name, source in files:
+        raw_name = name.encode("utf-8")
+        if len(raw_name) > 255:
+            raise ValueError(f"asset name too long: {name}")
+        with open(source, "rb") as handle:
+            blobs.append((name, raw_name, handle.read()))
+        index_size += ENTRY.size + len(raw_name)
+
+    offset = HEADER.size + index_size
+    entries: Dict[str, PackEntry] = {}
+    index = bytearray()
+    for name, raw_name, data in blobs:
+        offset += -offset % ALIGN
+        entry = PackEntry(offset, len(data), zlib.crc32(data), _kind_for(name))
+        entries[name] = entry
+        index += ENTRY.pack(entry.offset, entry.length, entry.crc32, entry.kind, len(raw_name)) + raw_name
+        offset += len(data)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as handle:
+        handle.write(HEADER.pack(MAGIC, VERSION, len(blobs), len(index), 0))
+        handle.write(index)
+        for name, _raw_name, data in blobs:
+            handle.write(b"\0" * (entries[name].offset - handle.tell()))
+            handle.write(data)
+    os.replace(tmp_path, path)
+    return entries
+
+
+class AssetPack:
+    """只读映射的资源包，按名字取零拷贝切片。"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.handle = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.map)
+            self.entries = self._read_index()
+        except (OSError, ValueError, struct.error):
+            self.handle.close()
+            raise
+
+    def _read_index(self) -> Dict[str, PackEntry]:
+        magic, version, count, index_size, _reserved = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a supported asset pack")
+        entries: Dict[str, PackEntry] = {}
+        offset = HEADER.size
+        end = HEADER.size + index_size
+        for _ in range(count):
+            data_offset, length, crc, kind, name_len = ENTRY.unpack_from(self.map, offset)
+            offset += ENTRY.size
+            name = bytes(self.view[offset:offset + name_len]).decode("utf-8")
+            offset += name_len
+            if offset > end or data_offset + length > len(self.map):
+                raise ValueError("corrupt asset pack index")
+            entries[name] = PackEntry(data_offset, length, crc, kind)
+        return entries
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def names(self) -> List[str]:
+        return list(self.entries)
+
+    def entry(self, name: str) -> PackEntry | None:
+        return self.entries.get(name)
+
+    def get(self, name: str) -> memoryview | None:
+        """返回资源内容的只读切片（不复制）；包里没有时返回 None。"""
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        return self.view[entry.offset:entry.offset + entry.length]
+
+    def verify(self) -> List[str]:
+        """返回校验失败的条目名。"""
+        return [name for name, e in self.entries.items() if zlib.crc32(self.get(name)) != e.crc32]
+
+    def close(self) -> None:
+        try:
+            self.view.release()
+            self.map.close()
+        except BufferError:
+            # 还有切片在用（例如纹理解码中），交给垃圾回收
+            pass
+        self.handle.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Horse game asset pack tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    listing = sub.add_parser("list", help="print the index of a pack")
+    listing.add_argument("pack")
+    args = parser.parse_args()
+    if args.command == "list":
+        pack = AssetPack(args.pack)
+        bad = set(pack.verify())
+        for name, entry in sorted(pack.entries.items(), key=lambda item: item[1].offset):
+            state = "CRC MISMATCH" if name in bad else ""
+            print(f"{entry.offset:10d} {entry.length:9d} {TYPE_NAMES[entry.kind]:>4} {entry.crc32:08x} {name} {state}")
+        print(f"{len(pack.entries)} entries, {os.path.getsize(args.pack)} bytes")
+        pack.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Asset table and lookup shared by both front-ends and bake_assets.py.
+
+Raw sprites and voice clips live in image/. bake_assets.py writes
+pre-resized sprites and PCM voice clips to baked/ together with a
+manifest.json and a single memory-mapped assets.pack. Loaders try the pack
+first, then the loose baked files, then the raw ones.
+"""
+
+import json
+import os
+from typing import Any, Dict
+
+from assetpack import AssetPack
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT_DIR, "image")
+BAKED_DIR = os.path.join(ROOT_DIR, "baked")
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+PACK_NAME = "assets.pack"
+
+SPRITES = {
+    "main": "horse.png",
+    "jump": "horse_jump.png",
+    "defend": "horse_Defend.png",
+}
+# 顺序即异步载入的先后：开局与跳跃语音在前，提示语音最后（见 assetload.py）
+SOUNDS = {
+    "start": "先试一试，空格起跳.MP3",
+    "jump": "轻盈跃起！.MP3",
+    "double_jump": "连跳加速！.MP3",
+    "pause": "暂停.MP3",
+    "resume": "继续冲刺.MP3",
+    "hit": "撞到障碍了，按 R 继续.MP3",
+    "invincible": "星光护体，5秒无敌！.MP3",
+    "hint_keep": "保持节奏.MP3",
+    "hint_ready": "准备跳！.MP3",
+    "hint_caution": "贴近了，小心！.MP3",
+    "hint_observe": "观察前方，寻找创造路.MP3",
+}
+# 1 档就是桌面版在运行时缩放出来的尺寸（整数倍抽样，外框 150x110），2/3 档给高分屏
+SPRITE_BOX = (150, 110)
+SPRITE_SCALES = (1, 2, 3)
+
+_manifest: Dict[str, Any] | None = None
+_pack: AssetPack | None = None
+_pack_tried = False
+
+
+def sprite_size(width: int, height: int, scale: int) -> tuple[int, int]:
+    """与 tk.PhotoImage.subsample 相同的取整规则，保证烘焙前后碰撞尺寸一致。"""
+    box_w, box_h = SPRITE_BOX[0] * scale, SPRITE_BOX[1] * scale
+    step = max(1, int(max(width / box_w, height / box_h, 1.0)))
+    return (width + step - 1) // step, (height + step - 1) // step
+
+
+def load_manifest(baked_dir: str = BAKED_DIR) -> Dict[str, Any]:
+    """读取烘焙清单（只读一次）；没有烘焙或清单损坏时返回空表。"""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(os.path.join(baked_dir, MANIFEST_NAME), "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+            _manifest = data if data.get("version") == MANIFEST_VERSION else {}
+        except (OSError, ValueError, AttributeError):
+            _manifest = {}
+    return _manifest
+
+
+def _baked(relative: str | None) -> str | None:
+    if not relative:
+        return None
+    path = os.path.join(BAKED_DIR, relative)
+    return path if os.path.exists(path) else None
+
+
+def _scale_order(scale: int) -> list:
+    # 先取请求的档位，其次更大的，再次更小的
+    return sorted(SPRITE_SCALES, key=lambda s: (abs(s - scale), -s))
+
+
+def load_pack(baked_dir: str = BAKED_DIR) -> AssetPack | None:
+    """映射资源包（只映射一次）；没有或损坏时返回 None。"""
+    global _pack, _pack_tried
+    if not _pack_tried:
+        _pack_tried = True
+        try:
+            _pack = AssetPack(os.path.join(baked_dir, PACK_NAME))
+        except (OSError, ValueError):
+            _pack = None
+    return _pack
+
+
+def sprite_data(key: str, scale: int = 1) -> memoryview | None:
+    """从资源包取 scale 档（或最接近档）贴图的 PNG 字节，不复制。"""
+    pack = load_pack()
+    if pack is None:
+        return None
+    for candidate in _scale_order(scale):
+        data = pack.get(f"sprites/{key}@{candidate}x.png")
+        if data is not None:
+            return data
+    return None
+
+
+def sprite_bytes(key: str, scale: int = 1) -> bytes | None:
+    """scale 档贴图的 PNG 字节：先资源包，其次烘焙文件与原图；后台线程可调用。"""
+    data = sprite_data(key, scale)
+    if data is not None:
+        return bytes(data)
+    try:
+        with open(sprite_path(key, scale), "rb") as handle:
+            return handle.read()
+    except OSError:
+        return None
+
+
+def sprite_path(key: str, scale: int = 1) -> str:
+    """优先返回烘焙好的 scale 档贴图，没有则取最接近的档位，最后退回原图。"""
+    variants = load_manifest().get("sprites", {}).get(key, {})
+    for candidate in _scale_order(scale):
+        path = _baked(variants.get(str(candidate)))
+        if path:
+            return path
+    return os.path.join(SOURCE_DIR, SPRITES[key])
+
+
+def sound_file(key: str, cache_dir: str) -> str:
+    """返回可交给播放器的音效文件路径。
+
+    播放器只认文件路径，所以包里的音效按 CRC 解到 cache_dir，只在首次启动或
+    资源更新后写一次；没有资源包时退回 sound_path()。
+    """
+    pack = load_pack()
+    name = f"sounds/{key}.wav"
+    entry = pack.entry(name) if pack is not None else None
+    if entry is None:
+        return sound_path(key)
+    path = os.path.join(cache_dir, f"{key}-{entry.crc32:08x}.wav")
+    if not os.path.exists(path):
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as handle:
+                handle.write(pack.get(name))
+            os.replace(tmp_path, path)
+        except OSError:
+            return sound_path(key)
+    return path
+
+
+def sound_path(key: str) -> str:
+    path = _baked(load_manifest().get("sounds", {}).get(key))
+    return path or os.path.join(SOURCE_DIR, SOUNDS[key])
@@ -0,0 +1,237 @@
+"""
+Bake device-ready assets before packaging.
+
+Run on the build machine, before ``buildozer android debug``::
+
+    python bake_assets.py            # bake into baked/
+    python bake_assets.py --check    # verify baked/ against image/ (exit 1 if stale)
+
+Sprites are resized once with Pillow to the sizes the game would otherwise
+compute on the device at every launch (see assets.SPRITE_SCALES). Voice clips
+are transcoded with ffmpeg to mono 16-bit PCM WAV, which needs no decoder at
+load time. Every output is also packed into assets.pack (see assetpack.py),
+which is what ships in the APK. manifest.json records the SHA-256 of every
+source and output so unchanged assets are skipped on the next bake and
+stale ones are detected.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from typing import Any, Dict
+
+from assetpack import AssetPack, write_pack
+from assets import (
+    BAKED_DIR,
+    MANIFEST_NAME,
+    MANIFEST_VERSION,
+    PACK_NAME,
+    ROOT_DIR,
+    SOUNDS,
+    SOURCE_DIR,
+    SPRITE_SCALES,
+    SPRITES,
+    sprite_size,
+)
+
+AUDIO_RATE = 22050
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _relative(path: str) -> str:
+    return os.path.relpath(path, ROOT_DIR).replace(os.sep, "/")
+
+
+def _load_previous(out_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as handle:
+            data = json.load(handle)
+        return data if data.get("version") == MANIFEST_VERSION else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _up_to_date(previous: Dict[str, Any], out_dir: str, output: str, source_hash: str) -> bool:
+    entry = previous.get("files", {}).get(output)
+    path = os.path.join(out_dir, output)
+    return bool(entry) and entry.get("source_sha256") == source_hash and os.path.exists(path) and (
+        sha256_file(path) == entry.get("sha256")
+    )
+
+
+def _bake_sprite(source: str, target: str, scale: int) -> tuple[int, int]:
+    from PIL import Image
+
+    with Image.open(source) as img:
+        img = img.convert("RGBA")
+        size = sprite_size(img.width, img.height, scale)
+        if size != img.size:
+            img = img.resize(size, Image.LANCZOS)
+        img.save(target, "PNG", optimize=True)
+    return size
+
+
+def _bake_sound(ffmpeg: str, source: str, target: str) -> None:
+    subprocess.run(
+        [
+            ffmpeg, "-y", "-loglevel", "error", "-i", source,
+            "-ac", "1", "-ar", str(AUDIO_RATE), "-c:a", "pcm_s16le", target,
+        ],
+        check=True,
+    )
+
+
+def bake(out_dir: str = BAKED_DIR, force: bool = False) -> Dict[str, Any]:
+    """烘焙全部资源并写清单，返回新清单。"""
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise SystemExit("bake_assets.py needs Pillow: pip install pillow")
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise SystemExit("bake_assets.py needs ffmpeg on PATH")
+
+    os.makedirs(os.path.join(out_dir, "sprites"), exist_ok=True)
+    os.makedirs(os.path.join(out_dir, "sounds"), exist_ok=True)
+    previous = {} if force else _load_previous(out_dir)
+    manifest: Dict[str, Any] = {"version": MANIFEST_VERSION, "files": {}, "sprites": {}, "sounds": {}}
+    baked = skipped = 0
+
+    def record(output: str, source: str, source_hash: str, **extra: Any) -> None:
+        path = os.path.join(out_dir, output)
+        manifest["files"][output] = {
+            "source": _relative(source),
+            "source_sha256": source_hash,
+            "sha256": sha256_file(path),
+            "bytes": os.path.getsize(path),
+            **extra,
+        }
+
+    for key, filename in SPRITES.items():
+        source = os.path.join(SOURCE_DIR, filename)
+        if not os.path.exists(source):
+            print(f"missing sprite {filename}, skipped", file=sys.stderr)
+            continue
+        source_hash = sha256_file(source)
+        manifest["sprites"][key] = {}
+        for scale in SPRITE_SCALES:
+            output = f"sprites/{key}@{scale}x.png"
+            if _up_to_date(previous, out_dir, output, source_hash):
+                manifest["files"][output] = previous["files"][output]
+                skipped += 1
+            else:
+                size = _bake_sprite(source, os.path.join(out_dir, output), scale)
+                record(output, source, source_hash, size=list(size))
+                baked += 1
+            manifest["sprites"][key][str(scale)] = output
+
+    for key, filename in SOUNDS.items():
+        source = os.path.join(SOURCE_DIR, filename)
+        if not os.path.exists(source):
+            print(f"missing sound {filename}, skipped", file=sys.stderr)
+            continue
+        source_hash = sha256_file(source)
+        # 中文文件名换成 ASCII 键名，打包进 APK 时不受文件名编码影响
+        output = f"sounds/{key}.wav"
+        if _up_to_date(previous, out_dir, output, source_hash):
+            manifest["files"][output] = previous["files"][output]
+            skipped += 1
+        else:
+            _bake_sound(ffmpeg, source, os.path.join(out_dir, output))
+            record(output, source, source_hash, rate=AUDIO_RATE)
+            baked += 1
+        manifest["sounds"][key] = output
+
+    # 清理清单之外的旧产物
+    for sub in ("sprites", "sounds"):
+        for name in os.listdir(os.path.join(out_dir, sub)):
+            if f"{sub}/{name}" not in manifest["files"]:
+                os.remove(os.path.join(out_dir, sub, name))
+
+    # 所有产物再打成一个资源包，设备上只需打开这一个文件
+    pack_path = os.path.join(out_dir, PACK_NAME)
+    write_pack(pack_path, [(output, os.path.join(out_dir, output)) for output in sorted(manifest["files"])])
+    manifest["pack"] = {"file": PACK_NAME, "sha256": sha256_file(pack_path), "bytes": os.path.getsize(pack_path)}
+
+    tmp_path = os.path.join(out_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST_NAME))
+
+    source_bytes = sum(
+        os.path.getsize(os.path.join(SOURCE_DIR, name))
+        for name in list(SPRITES.values()) + list(SOUNDS.values())
+        if os.path.exists(os.path.join(SOURCE_DIR, name))
+    )
+    baked_bytes = sum(entry["bytes"] for entry in manifest["files"].values())
+    print(
+        f"baked {baked}, up to date {skipped}: "
+        f"{source_bytes / 1024:.0f} KB of sources -> {baked_bytes / 1024:.0f} KB in {_relative(out_dir)}/, "
+        f"packed into {PACK_NAME} ({manifest['pack']['bytes'] / 1024:.0f} KB)"
+    )
+    return manifest
+
+
+def check(out_dir: str = BAKED_DIR) -> bool:
+    """校验烘焙产物与源文件是否一致，不一致时打印原因。"""
+    manifest = _load_previous(out_dir)
+    if not manifest:
+        print(f"no manifest in {_relative(out_dir)}/")
+        return False
+    ok = True
+    expected = {f"sprites/{k}@{s}x.png" for k in SPRITES for s in SPRITE_SCALES}
+    expected |= {f"sounds/{k}.wav" for k in SOUNDS}
+    for output in sorted(expected - set(manifest.get("files", {}))):
+        print(f"missing {output}")
+        ok = False
+    for output, entry in sorted(manifest.get("files", {}).items()):
+        source = os.path.join(ROOT_DIR, entry["source"])
+        path = os.path.join(out_dir, output)
+        if not os.path.exists(source) or sha256_file(source) != entry["source_sha256"]:
+            print(f"stale {output}: {entry['source']} changed")
+            ok = False
+        elif not os.path.exists(path) or sha256_file(path) != entry["sha256"]:
+            print(f"corrupt {output}")
+            ok = False
+    pack_info = manifest.get("pack", {})
+    pack_path = os.path.join(out_dir, pack_info.get("file", PACK_NAME))
+    if not os.path.exists(pack_path) or sha256_file(pack_path) != pack_info.get("sha256"):
+        print(f"stale or missing {PACK_NAME}")
+        return False
+    pack = AssetPack(pack_path)
+    try:
+        if set(pack.names()) != set(manifest.get("files", {})):
+            print(f"{PACK_NAME} does not match the manifest")
+            ok = False
+        for name in pack.verify():
+            print(f"corrupt {name} in {PACK_NAME}")
+            ok = False
+    finally:
+        pack.close()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bake resized sprites and PCM voice clips for packaging")
+    parser.add_argument("--out", default=BAKED_DIR, help="output directory (default: baked/)")
+    parser.add_argument("--force", action="store_true", help="rebake everything")
+    parser.add_argument("--check", action="store_true", help="only verify the baked assets")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if check(args.out) else 1)
+    bake(args.out, args.force)
+
+
+if __name__ == "__main__":
+    main()
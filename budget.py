@@ -0,0 +1,352 @@
+"""
+Startup and memory budgets for the horse game.
+
+    python budget.py check  [--backend headless tk kivy] [--minutes 10]
+    python budget.py record [--backend ...]
+
+Each backend is measured in a fresh interpreter (``python budget.py probe``),
+so imports and asset loading are really cold. The probe starts the game the
+way ``python -m horsegame`` does but scripted instead of played. Once the
+assets are in, the horsegame autopilot plays endless runs on a step clock,
+restarting after each crash, until --minutes of game time have passed
+(drawing every frame through the backend's own render path). It reports:
+
+    import_ms           importing the backend modules
+    first_frame_ms      launcher start to the first drawn frame
+    assets_ms           AssetLoader start to its last finished job
+    rss_start_mb        resident memory after the first frame
+    rss_assets_peak_mb  peak resident memory once the assets are loaded
+    rss_steady_mb       resident memory at the end of the scripted session
+
+The headless probe is the stub backend: simulation, display list and diff,
+and the loader's file/pack half. The tk and kivy probes need a display.
+Without one the harness starts Xvfb if it is installed, and otherwise skips
+them. check compares against budgets.json (limits per backend) and exits 1
+on any regression. record measures each backend three times on this machine
+and writes the worst run, plus headroom, as the new limits; run it on the
+machine that runs check.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from horsegame import STEP_HZ, ImportTimer, StepClock, advance, finished, new_run
+
+BUDGETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "budgets.json")
+BACKENDS = ("headless", "tk", "kivy")
+METRICS = ("import_ms", "first_frame_ms", "assets_ms", "rss_start_mb", "rss_assets_peak_mb", "rss_steady_mb")
+# record 取几次中最差的一次，再按单位加余量（倍数, 绝对值）：冷启动计时抖动大，内存稳定
+HEADROOM = {"ms": (1.3, 20.0), "mb": (1.15, 2.0)}
+CHUNK = 600  # 脚本对局每次回调推进的步数，让窗口事件循环喘口气
+
+
+def rss_mb() -> float | None:
+    """当前常驻内存（Linux 读 /proc；其他平台只能退回峰值）。"""
+    try:
+        with open("/proc/self/statm", "r") as handle:
+            pages = int(handle.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError, IndexError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 按字节，Linux 按 KB
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class Probe:
+    """一次冷启动测量：各检查点的时间与内存。"""
+
+    def __init__(self, minutes: float) -> None:
+        self.timer = ImportTimer()
+        self.steps = int(minutes * 60 * STEP_HZ)
+        self.metrics: Dict[str, float | None] = {}
+
+    def since_start_ms(self) -> float:
+        self.timer.mark("checkpoint")
+        return self.timer.marks[-1][1] * 1000
+
+    def first_frame(self) -> None:
+        self.metrics["import_ms"] = sum(seconds for _name, seconds in self.timer.imports) * 1000
+        self.metrics["first_frame_ms"] = self.since_start_ms()
+        self.metrics["rss_start_mb"] = rss_mb()
+
+    def assets_done(self, loader: Any) -> None:
+        finished_at = loader.finished_at or time.perf_counter()
+        self.metrics["assets_ms"] = (finished_at - loader.started_at) * 1000
+        self.metrics["rss_assets_peak_mb"] = peak_rss_mb()
+
+    def steady(self) -> None:
+        self.metrics["rss_steady_mb"] = rss_mb()
+
+
+def _scripted(game: Any, data_dir: str) -> None:
+    """把前端换成虚拟时钟 + 自动驾驶，开一局无尽模式；记录和幽灵写到临时目录，不动玩家的。"""
+    game.records_path = os.path.join(data_dir, "horse_records.json")
+    game.ghost_path = os.path.join(data_dir, "horse_ghost.bin")
+    game.volume = 0.0
+    game.clock = StepClock()
+    game.mode = "endless"
+    game.reset()
+    game.post_input("start")
+
+
+def _script_chunk(game: Any, draw: Any, remaining: int) -> int:
+    """推进至多 CHUNK 步，每步都经前端自己的绘制路径；返回剩余步数。"""
+    for _ in range(min(CHUNK, remaining)):
+        advance(game)
+        draw()
+        if finished(game):
+            game.reset()
+            game.post_input("start")
+    return max(0, remaining - CHUNK)
+
+
+def probe_headless(probe: Probe) -> None:
+    timer = probe.timer
+    simulation = timer.load("simulation")
+    display = timer.load("display")
+    assetload = timer.load("assetload")
+    assets = timer.load("assets")
+    with tempfile.TemporaryDirectory() as data_dir:
+        sim = new_run(simulation, 2026, data_dir)
+        sim.top_lanterns = display.make_top_lanterns(int(sim.world_width))
+        display.build_display_list(sim, sim.horse_masks)
+        probe.first_frame()
+
+        # 桩后端：只有载入的后台一半（读包/读文件/解出语音），收尾只是留住数据
+        loaded: Dict[str, Any] = {}
+        sound_cache = os.path.join(data_dir, "sound_cache")
+        jobs = [
+            assetload.LoadJob(f"sprite:{key}", lambda key=key: assets.sprite_bytes(key), lambda data, key=key: loaded.__setitem__(key, data))
+            for key in assets.SPRITES
+        ]
+        jobs.extend(
+            assetload.LoadJob(f"sound:{key}", lambda key=key: assets.sound_file(key, sound_cache), lambda path, key=key: loaded.__setitem__(key, path))
+            for key in assets.SOUNDS
+        )
+        loader = assetload.AssetLoader(jobs).start()
+        while loader.pump():
+            time.sleep(0.001)
+        probe.assets_done(loader)
+
+        shown: Dict[str, Any] = {}
+        for _ in range(probe.steps):
+            advance(sim)
+            commands = display.build_display_list(sim, sim.horse_masks)
+            display.diff(shown, commands)
+            shown = {cmd.key: cmd for cmd in commands}
+            if finished(sim):
+                sim.reset()
+                sim.post_input("start")
+        probe.steady()
+
+
+def probe_tk(probe: Probe) -> None:
+    horse_game = probe.timer.load("horse_game")
+    game = horse_game.HorseGame(seed=2026)
+    root = game.root
+    remaining = probe.steps
+    data_dir = tempfile.TemporaryDirectory()
+
+    def first_frame() -> None:
+        probe.first_frame()
+        root.after(1, wait_assets)
+
+    def wait_assets() -> None:
+        # 真实的 tick 循环在收尾资源；载完后停掉它，换成脚本对局
+        if not game.loader.complete:
+            root.after(5, wait_assets)
+            return
+        probe.assets_done(game.loader)
+        root.after_cancel(game.tick_job)
+        _scripted(game, data_dir.name)
+        root.after(1, play)
+
+    def play() -> None:
+        nonlocal remaining
+        remaining = _script_chunk(game, game.render, remaining)
+        if remaining:
+            root.after(1, play)
+        else:
+            probe.steady()
+            root.quit()
+
+    root.after_idle(first_frame)
+    game.start()
+    root.destroy()
+    data_dir.cleanup()
+
+
+def probe_kivy(probe: Probe) -> None:
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    app = probe.timer.load("main").HorseGameApp()
+    clock = probe.timer.load("kivy.clock").Clock
+    remaining = probe.steps
+    data_dir = tempfile.TemporaryDirectory()
+
+    def first_frame(_dt: float) -> None:
+        probe.first_frame()
+        clock.schedule_once(wait_assets, 0)
+
+    def wait_assets(_dt: float) -> None:
+        game = app.game
+        if not game.loader.complete:
+            clock.schedule_once(wait_assets, 0.005)
+            return
+        probe.assets_done(game.loader)
+        game.tick_event.cancel()
+        _scripted(game, data_dir.name)
+        clock.schedule_once(play, 0)
+
+    def play(_dt: float) -> None:
+        nonlocal remaining
+        remaining = _script_chunk(app.game, app.game.draw, remaining)
+        if remaining:
+            clock.schedule_once(play, 0)
+        else:
+            probe.steady()
+            app.stop()
+
+    app.bind(on_start=lambda *_args: clock.schedule_once(first_frame, 0))
+    app.run()
+    data_dir.cleanup()
+
+
+PROBES = {"headless": probe_headless, "tk": probe_tk, "kivy": probe_kivy}
+
+
+def _virtual_display() -> Tuple[Any, Dict[str, str] | None]:
+    """GUI 探针需要显示器：有就直接用，没有就试着起一个 Xvfb；都不行返回 None。"""
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        return None, {}
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None, None
+    display = ":97"
+    server = subprocess.Popen([xvfb, display, "-screen", "0", "1280x800x24"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(0.5)
+    return server, {"DISPLAY": display}
+
+
+def measure(backend: str, minutes: float) -> Dict[str, Any] | str:
+    """在新的解释器里跑一次探针；返回指标，或说明跳过/失败原因的字符串。"""
+    server, extra_env = (None, {}) if backend == "headless" else _virtual_display()
+    if extra_env is None:
+        return "skipped: no display and no Xvfb"
+    try:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "probe", "--backend", backend, "--minutes", str(minutes)],
+            capture_output=True,
+            text=True,
+            env={**os.environ, **extra_env},
+        )
+    finally:
+        if server is not None:
+            server.terminate()
+    lines = result.stdout.strip().splitlines()
+    if result.returncode != 0 or not lines:
+        tail = result.stderr.strip().splitlines()[-1:] or ["no output"]
+        return f"failed: {tail[0]}"
+    return json.loads(lines[-1])
+
+
+def worst(runs: List[Dict[str, Any] | str]) -> Dict[str, Any] | str:
+    """几次测量逐项取最大；有一次跳过/失败就整体按那次算。"""
+    for run in runs:
+        if isinstance(run, str):
+            return run
+    return {name: max((run[name] for run in runs if run.get(name) is not None), default=None) for name in METRICS}
+
+
+def limit_for(name: str, value: float) -> float:
+    factor, slack = HEADROOM[name.rsplit("_", 1)[1]]
+    return float(round(max(value * factor, value + slack), 1))
+
+
+def load_budgets(path: str = BUDGETS_PATH) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def compare(metrics: Dict[str, Any], limits: Dict[str, float]) -> List[Tuple[str, float | None, float | None, bool]]:
+    """(指标, 实测, 上限, 是否超标)；缺实测或缺上限的不算超标。"""
+    rows = []
+    for name in METRICS:
+        value, limit = metrics.get(name), limits.get(name)
+        rows.append((name, value, limit, value is not None and limit is not None and value > limit))
+    return rows
+
+
+def _fmt(value: float | None) -> str:
+    return "-" if value is None else f"{value:.1f}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Horse game startup and memory budgets")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, text in (("check", "measure and compare against budgets.json"), ("record", "measure and write budgets.json")):
+        command = sub.add_parser(name, help=text)
+        command.add_argument("--backend", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+        command.add_argument("--minutes", type=float, default=None, help="scripted play time (default: from budgets.json, else 10)")
+        command.add_argument("--budgets", default=BUDGETS_PATH)
+        command.add_argument("--repeat", type=int, default=3 if name == "record" else 1, help="runs per backend, worst one counts")
+    probe = sub.add_parser("probe", help="(internal) measure one backend in this process and print JSON")
+    probe.add_argument("--backend", choices=BACKENDS, required=True)
+    probe.add_argument("--minutes", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.command == "probe":
+        run = Probe(args.minutes)
+        PROBES[args.backend](run)
+        print(json.dumps(run.metrics))
+        return
+
+    budgets = load_budgets(args.budgets)
+    minutes = args.minutes if args.minutes is not None else budgets.get("minutes", 10.0)
+    failed = False
+    for backend in args.backend:
+        metrics = worst([measure(backend, minutes) for _ in range(max(1, args.repeat))])
+        if isinstance(metrics, str):
+            print(f"{backend}: {metrics}")
+            failed = failed or metrics.startswith("failed")
+            continue
+        if args.command == "record":
+            budgets.setdefault("minutes", minutes)
+            budgets[backend] = {name: limit_for(name, value) for name, value in metrics.items() if value is not None}
+            print(f"{backend}: " + ", ".join(f"{name} {_fmt(value)}" for name, value in metrics.items()))
+            continue
+        limits = budgets.get(backend)
+        if not limits:
+            print(f"{backend}: no budget recorded (python budget.py record --backend {backend})")
+            continue
+        print(f"{backend} ({minutes:g} min scripted):")
+        for name, value, limit, over in compare(metrics, limits):
+            print(f"  {name:<20} {_fmt(value):>8} / {_fmt(limit):>8}  {'OVER BUDGET' if over else 'ok'}")
+            failed = failed or over
+    if args.command == "record":
+        with open(args.budgets, "w", encoding="utf-8") as handle:
+            json.dump(budgets, handle, indent=2, ensure_ascii=False)
+            handle.write("\n")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,8 +26,25 @@ source.dir = .
 source.main = main.py
 
 # (list) Source files to include (let buildozer filter by extension)
+# Assets ship as the single baked/assets.pack (run `python bake_assets.py`
+# first), so no loose images or sounds are packaged. include_patterns below
+# only narrows what this filter keeps, so the pack's and the manifest's
+# extensions have to be listed here too.
 #
-source.include_exts = py,png,mp3,MP3
+source.include_exts = py,json,pack
+
+# (list) List of inclusions using pattern matching
+#
+source.include_patterns = baked/assets.pack,baked/manifest.json
+
+# (list) Source directories to exclude (let empty to not exclude anything)
+# The raw full-size sources in image/ are replaced by baked/.
+#
+source.exclude_dirs = tests, bin, venv, image, telemetry
+
+# (list) List of exclusions using pattern matching
+#
+source.exclude_patterns = bake_assets.py
 
 # (list) Application requirements
 #
@@ -0,0 +1,501 @@
+"""
+Backend-neutral display list for the horse game.
+
+build_display_list() turns the simulation state into a flat list of typed
+draw commands in world coordinates (origin top-left, y down). Every command
+has a stable key, so diff() can compare two frames and tell a backend which
+items to add, update or remove instead of clearing and redrawing everything.
+The tkinter (horse_game.py) and Kivy (main.py) front-ends are thin
+consumers of the same list, and headless code can count and assert on it
+without importing either toolkit. Colors are precompiled Swatch values from
+palette.py; the scrolling background layers come from parallax.py.
+
+Detailed obstacles are emitted as one Stamp each. A stamp names an
+ObstacleSprite (theme, size quantized to STAMP_QUANTUM, label), and the
+backend renders obstacle_recipe() for that sprite once into an image or
+texture that it keeps in a small LRU cache.
+"""
+
+import math
+import random
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from palette import (
+    GHOST,
+    GOLD,
+    GREETING,
+    HORSE_BODY,
+    HORSE_EAR,
+    HORSE_EYE,
+    HORSE_LEG,
+    HUD_ACHIEVEMENT,
+    HUD_DIM,
+    HUD_EFFECTS,
+    HUD_HINT,
+    HUD_TEXT,
+    OBSTACLE_STYLES,
+    PANEL_BAD,
+    PANEL_EDGE,
+    PANEL_FILL,
+    PANEL_GOOD,
+    POWERUP_LABEL,
+    POWERUP_STYLES,
+    RIVAL,
+    SHIELD,
+    STAR,
+    THEMES,
+    UNKNOWN_POWERUP,
+    Swatch,
+    swatch,
+)
+from parallax import scroll_offset
+
+
+class Rect(NamedTuple):
+    key: str
+    x: float
+    y: float
+    w: float
+    h: float
+    fill: Swatch | None = None
+    outline: Swatch | None = None
+    width: float = 0
+
+
+class Oval(NamedTuple):
+    key: str
+    x: float
+    y: float
+    w: float
+    h: float
+    fill: Swatch | None = None
+    outline: Swatch | None = None
+    width: float = 0
+
+
+class Line(NamedTuple):
+    key: str
+    points: Tuple[float, ...]
+    color: Swatch
+    width: float = 1
+
+
+class Poly(NamedTuple):
+    key: str
+    points: Tuple[float, ...]
+    fill: Swatch
+
+
+class Text(NamedTuple):
+    key: str
+    x: float
+    y: float
+    text: str
+    color: Swatch
+    size: int
+    bold: bool = False
+    anchor: str = "center"
+
+
+class Sprite(NamedTuple):
+    key: str
+    x: float
+    y: float
+    w: float
+    h: float
+    frame: str
+
+
+class Ghost(NamedTuple):
+    """半透明的马（幽灵/对手），后端自行决定用贴图着色还是点阵。"""
+
+    key: str
+    x: float
+    y: float
+    w: float
+    h: float
+    color: Swatch
+    alpha: float
+
+
+class Gradient(NamedTuple):
+    """自上而下等高色带；后端按 stops 缓存成一张纹理/图片。"""
+
+    key: str
+    x: float
+    y: float
+    w: float
+    h: float
+    stops: Tuple[Swatch, ...]
+
+
+class Layer(NamedTuple):
+    """横向重复的视差层（parallax.tile 的图块），左移 offset 像素后铺满 w。"""
+
+    key: str
+    y: float
+    w: float
+    h: float
+    theme: int
+    offset: int
+
+
+class ObstacleSprite(NamedTuple):
+    """障碍贴图的缓存键：主题、量化后的宽高、祝福词。"""
+
+    theme: str
+    w: int
+    h: int
+    label: str
+
+
+class Stamp(NamedTuple):
+    """整张预渲染的障碍贴图，(x, y) 为贴图左上角（含 STAMP_PAD 留白）。"""
+
+    key: str
+    x: float
+    y: float
+    sprite: ObstacleSprite
+
+
+Command = Rect | Oval | Line | Poly | Text | Sprite | Ghost | Gradient | Layer | Stamp
+
+START_BUTTON = (160, 44)
+# 障碍宽高按 4 px 量化（画出来与碰撞框最多差 2 px）；贴图四周留白：左右、上（灯笼盖/屋顶）、下（流苏）
+STAMP_QUANTUM = 4
+STAMP_PAD = (2, 14, 20)
+# 后端最多缓存的障碍贴图数
+STAMP_CACHE = 48
+
+
+def make_top_lanterns(width: float) -> List[Dict[str, Any]]:
+    """生成顶部左右对称的灯笼坐标（从左到右排好）。"""
+    lanterns: List[Dict[str, Any]] = []
+    center = width / 2
+    offsets = [180, 270, 360]
+    sizes = [random.uniform(34, 54) for _ in offsets]
+    ys = [random.uniform(32, 46) for _ in offsets]
+    blessings = ["福", "春", "吉祥", "如意", "安康", "平安", "顺意", "招财"]
+    for off, size, y in zip(offsets, sizes, ys):
+        label = random.choice(blessings)
+        lanterns.append({"x": center - off, "y": y, "size": size, "label": label})
+        lanterns.append({"x": center + off, "y": y, "size": size, "label": label})
+    lanterns.sort(key=lambda l: l["x"])
+    return lanterns
+
+
+def start_button_bounds(width: float, height: float) -> Tuple[float, float, float, float]:
+    """开始按钮的外框 (x1, y1, x2, y2)，绘制与点击判定共用。"""
+    btn_w, btn_h = START_BUTTON
+    x1 = width / 2 - btn_w / 2
+    y1 = height / 2 - btn_h / 2 + 10
+    return x1, y1, x1 + btn_w, y1 + btn_h
+
+
+def star_points(x: float, y: float, size: float) -> Tuple[float, ...]:
+    points: List[float] = []
+    for i in range(5):
+        angle = (i * 72 - 90) * math.pi / 180
+        inner_angle = angle + 36 * math.pi / 180
+        points.extend([x + math.cos(angle) * size, y + math.sin(angle) * size])
+        points.extend([x + math.cos(inner_angle) * size * 0.45, y + math.sin(inner_angle) * size * 0.45])
+    return tuple(points)
+
+
+def build_display_list(game: Any, frames: Dict[str, Any], labels: bool = True, hud: bool = True) -> List[Command]:
+    """按绘制顺序生成本帧的全部绘制命令。
+
+    frames 为后端已加载的马贴图表（只看有无）；labels=False 时省略场景里的文字
+    （障碍贴图里的字不受影响），hud=False 时省略 HUD 与面板（Kivy 用控件显示）。
+    """
+    out: List[Command] = []
+    _background(out, game)
+    _lanterns(out, game, labels)
+    _fireworks(out, game)
+    _obstacles(out, game)
+    _ghosts(out, game)
+    _horse(out, game, frames)
+    _powerups(out, game, labels)
+    _stars(out, game)
+    if hud:
+        _hud(out, game)
+    return out
+
+
+def _background(out: List[Command], game: Any) -> None:
+    theme = THEMES[game.visual_mode]
+    width, height, ground_y = game.world_width, game.world_height, game.ground_y
+    out.append(Gradient("sky", 0, 0, width, height, theme.sky))
+    # 远景星点与地面网格是细节层，低画质时省掉
+    ground_details = game.quality.tier["ground_details"]
+    if ground_details:
+        out.append(_layer("far", game, 40, ground_y - 60))
+    out.append(Rect("ground.fill", 0, ground_y, width, height - ground_y, theme.ground))
+    if ground_details:
+        out.append(_layer("ground", game, ground_y, height - ground_y))
+    out.append(Line("horizon", (0, ground_y, width, ground_y), theme.line, 3))
+
+
+def _layer(name: str, game: Any, y: float, h: float) -> Layer:
+    return Layer(name, y, game.world_width, h, game.visual_mode, scroll_offset(name, game.distance))
+
+
+def _lanterns(out: List[Command], game: Any, labels: bool) -> None:
+    """顶部绳子 + 对称灯笼 + 中心祝福文字。"""
+    rope_y = 26
+    width = game.world_width
+    out.append(_layer("rope", game, rope_y - 8, 16))
+    if labels:
+        out.append(Text("greeting", width / 2, rope_y + 2, "新年快乐", GREETING, 26, True))
+    simple_art = game.quality.tier["simple_art"]
+    style = OBSTACLE_STYLES["lantern"]
+    for i, lantern in enumerate(game.top_lanterns):
+        x, y, h = lantern["x"], lantern["y"], lantern["size"]
+        w = h * 1.15
+        key = f"lantern{i}"
+        if simple_art:
+            out.append(Oval(key, x - w / 2, y - h / 2, w, h, style.fill))
+            continue
+        out.append(Oval(key, x - w / 2, y - h / 2, w, h, style.fill, style.outline, 3))
+        out.append(Rect(f"{key}.cap", x - 6, y - h / 2 - 6, 12, 12, style.detail))
+        out.append(Line(f"{key}.tassel", (x, y + h / 2, x, y + h / 2 + 16), GOLD, 3))
+        if labels and lantern.get("label"):
+            out.append(Text(f"{key}.label", x, y, lantern["label"], style.label, int(min(18, max(12, h * 0.45))), True))
+
+
+def _fireworks(out: List[Command], game: Any) -> None:
+    for fw in game.fireworks:
+        color = swatch(fw["color"])
+        for p in fw["particles"]:
+            size = max(2, 5 * p["life"])
+            out.append(Oval(f"fw{fw['id']}.{p['n']}", p["x"] - size, p["y"] - size, size * 2, size * 2, color))
+
+
+def _obstacles(out: List[Command], game: Any) -> None:
+    """障碍：低画质画一个纯色外形，否则每个障碍一张预渲染贴图（底边贴住障碍底边）。"""
+    simple_art = game.quality.tier["simple_art"]
+    pad_x, pad_top, _pad_bottom = STAMP_PAD
+    for obs in game.obstacles:
+        x, y, w, h = obs["x"], obs["y"], obs["w"], obs["h"]
+        theme = obs["theme"]
+        key = f"obs{obs['id']}"
+        if simple_art:
+            fill = OBSTACLE_STYLES.get(theme, OBSTACLE_STYLES["light"]).fill
+            out.append(Oval(key, x, y, w, h, fill) if theme == "lantern" else Rect(key, x, y, w, h, fill))
+            continue
+        sprite = ObstacleSprite(theme, _quantize(w), _quantize(h), obs.get("label") or "")
+        out.append(Stamp(key, x - pad_x, y + h - sprite.h - pad_top, sprite))
+
+
+def _quantize(value: float) -> int:
+    return max(STAMP_QUANTUM, int(round(value / STAMP_QUANTUM)) * STAMP_QUANTUM)
+
+
+def stamp_size(sprite: ObstacleSprite) -> Tuple[int, int]:
+    pad_x, pad_top, pad_bottom = STAMP_PAD
+    return sprite.w + 2 * pad_x, sprite.h + pad_top + pad_bottom
+
+
+def obstacle_recipe(sprite: ObstacleSprite) -> List[Command]:
+    """障碍贴图的绘制命令（贴图内坐标，原点为左上角），后端按它渲染一次后缓存。"""
+    pad_x, pad_top, _pad_bottom = STAMP_PAD
+    x, y, w, h = pad_x, pad_top, sprite.w, sprite.h
+    theme = sprite.theme
+    style = OBSTACLE_STYLES.get(theme, OBSTACLE_STYLES["light"])
+    out: List[Command] = []
+    if theme == "fence":
+        out.append(Rect("body", x, y, w, h, style.fill, style.outline, 2))
+        for bar in range(3):
+            yy = y + h * (bar + 1) / 4
+            out.append(Line(f"bar{bar}", (x, yy, x + w, yy), style.detail, 2))
+    elif theme == "data":
+        out.append(Rect("body", x, y, w, h, style.fill, style.outline, 2))
+        out.append(Text("bits", x + w / 2, y + h / 2, "01", style.detail, 12, True))
+    elif theme == "lantern":
+        out.append(Oval("body", x, y, w, h, style.fill, style.outline, 3))
+        out.append(Rect("cap", x + w * 0.45, y - 10, w * 0.1, 18, style.detail))
+        out.append(Line("tassel", (x + w / 2, y + h, x + w / 2, y + h + 18), GOLD, 3))
+    else:
+        out.append(Rect("body", x, y, w, h, style.fill, style.outline, 2))
+        out.append(Poly("roof", (x + w / 2, y - 14, x + w * 0.2, y, x + w * 0.8, y), style.detail))
+    if sprite.label:
+        out.append(Text("label", x + w / 2, y + h / 2, sprite.label, style.label, int(min(18, max(12, h * 0.4))), True))
+    return out
+
+
+def _ghosts(out: List[Command], game: Any) -> None:
+    x, w, h = game.horse["x"], game.horse["w"], game.horse["h"]
+    y = game.ghost_horse_y()
+    if y is not None:
+        out.append(Ghost("ghost", x, y, w, h, GHOST, 0.35))
+    rival_y = game.rival_horse_y()
+    if rival_y is not None:
+        out.append(Ghost("rival", x, rival_y, w, h, RIVAL, 0.45))
+
+
+def _horse(out: List[Command], game: Any, frames: Dict[str, Any]) -> None:
+    """马：有贴图画贴图，没有时用几何图形拼一匹。"""
+    horse = game.horse
+    x, y, w, h = horse["x"], horse["y"], horse["w"], horse["h"]
+    frame = game.horse_frame_key(frames)
+    if frame:
+        out.append(Sprite("horse", x, y, w, h, frame))
+    else:
+        out.append(Rect("horse", x, y + h * 0.25, w * 0.75, h * 0.6, HORSE_BODY))
+        out.append(Rect("horse.head", x + w * 0.7, y + h * 0.2, w * 0.3, h * 0.35, HORSE_BODY))
+        out.append(Poly("horse.ear", (x + w * 0.55, y + h * 0.2, x + w * 0.8, y + h * 0.05, x + w * 0.65, y + h * 0.2), HORSE_EAR))
+        leg_w = w * 0.12
+        for i, offset in enumerate([0.18, 0.38, 0.6, 0.8]):
+            swing = (i % 2) * 6 if not horse["on_ground"] else 0
+            out.append(Rect(f"horse.leg{i}", x + w * offset, y + h * 0.8, leg_w, h * 0.2 + swing, HORSE_LEG))
+        out.append(Oval("horse.eye", x + w * 0.82, y + h * 0.3, w * 0.06, h * 0.06, HORSE_EYE))
+    if game.shield:
+        out.append(Oval("shield", x - 6, y - 6, w + 12, h + 12, None, SHIELD, 2))
+
+
+def _powerups(out: List[Command], game: Any, labels: bool) -> None:
+    for p in game.powerups:
+        style = POWERUP_STYLES.get(p["kind"], UNKNOWN_POWERUP)
+        size = p["size"]
+        key = f"powerup{p['id']}"
+        out.append(Oval(key, p["x"] - size, p["y"] - size, size * 2, size * 2, style.fill))
+        if labels:
+            out.append(Text(f"{key}.label", p["x"], p["y"], style.label, POWERUP_LABEL, 10, True))
+
+
+def _stars(out: List[Command], game: Any) -> None:
+    for s in game.air_stars:
+        out.append(Poly(f"star{s['id']}", star_points(s["x"], s["y"], s["size"]), STAR))
+
+
+def hud_lines(game: Any) -> Tuple[str, str, str]:
+    """HUD 前三行：成绩、最佳纪录、效果（两个前端共用）。"""
+    time_label = f"{game.elapsed:05.2f}s"
+    if game.mode == "timed":
+        remaining = max(0.0, game.time_limit - game.elapsed)
+        time_label = f"{remaining:05.2f}s"
+    stats = (
+        f"{game.mode_labels[game.mode]}  时间 {time_label}  跃起 {game.jumps}  星星 {game.total_stars}  距离 {game.distance:05.1f}"
+    )
+    records = game.records
+    if game.mode == "timed":
+        best = f"最佳 计时星星 {records['best_timed_score']}  距离 {records['best_distance']:.1f}"
+    elif game.mode == "challenge":
+        best_time = records["best_challenge_time"]
+        label = f"{best_time:.1f}s" if best_time > 0 else "--"
+        best = f"最佳 挑战用时 {label}  星星 {records['best_score']}"
+    else:
+        best = f"最佳 时间 {records['best_time']:.1f}s  星星 {records['best_score']}  距离 {records['best_distance']:.1f}"
+    effects = []
+    if game.invincible_timer > 0:
+        effects.append(f"无敌 {game.invincible_timer:0.1f}s")
+    if game.slow_timer > 0:
+        effects.append(f"减速 {game.slow_timer:0.1f}s")
+    if game.magnet_timer > 0:
+        effects.append(f"磁吸 {game.magnet_timer:0.1f}s")
+    if game.double_score_timer > 0:
+        effects.append(f"翻倍 {game.double_score_timer:0.1f}s")
+    if game.shield:
+        effects.append("护盾")
+    return stats, best, " | ".join(effects)
+
+
+def _hud(out: List[Command], game: Any) -> None:
+    width, height = game.world_width, game.world_height
+    stats, best, effects = hud_lines(game)
+    out.append(Text("hud.stats", 20, 110, stats, HUD_TEXT, 12, True, "nw"))
+    out.append(Text("hud.best", 20, 132, best, HUD_DIM, 10, False, "nw"))
+    controls = "空格=起跳  S=滑行  M=模式  C=画面  V=音量  F=帧率  P=练习  F2=改键"
+    out.append(Text("hud.controls", 20, 150, controls, HUD_DIM, 10, False, "nw"))
+    if effects:
+        out.append(Text("hud.effects", 20, 168, effects, HUD_EFFECTS, 10, False, "nw"))
+    if game.versus is not None:
+        out.append(Text("hud.versus", 20, 186, game.versus_text(), RIVAL, 10, False, "nw"))
+    spectate = game.spectate_text()
+    if spectate:
+        out.append(Text("hud.spectate", 20, 204, spectate, RIVAL, 10, False, "nw"))
+    out.append(Text("hud.status", width - 20, 96, game.status_text, HUD_DIM, 12, True, "ne"))
+    out.append(Text("hud.hint", width - 20, 120, game.current_hint, HUD_HINT, 11, False, "ne"))
+    if game.achievement_timer > 0:
+        out.append(Text("hud.achievement", width - 20, 144, game.achievement_text, HUD_ACHIEVEMENT, 11, True, "ne"))
+
+    cx, cy = width / 2, height / 2
+    if (game.awaiting_start or game.preparing_start) and not game.running:
+        out.append(Rect("panel", cx - 200, cy - 100, 400, 200, PANEL_FILL, PANEL_EDGE, 3))
+        out.append(Text("panel.title", cx, cy - 40, "准备就绪再出发", GREETING, 16, True))
+        if game.preparing_start:
+            count = "…" if game.waiting_rival else f"{int(math.ceil(game.countdown_timer))}"
+            out.append(Text("panel.countdown", cx, cy, count, HUD_TEXT, 36, True))
+        else:
+            x1, y1, x2, y2 = start_button_bounds(width, height)
+            out.append(Rect("panel.button", x1, y1, x2 - x1, y2 - y1, PANEL_EDGE))
+            label = "点击开始"
+            if game.load_progress < 1:
+                # 资源还在后台载入：按钮底边画进度条，载入中也能开始
+                out.append(Rect("panel.button.progress", x1, y2 - 5, (x2 - x1) * game.load_progress, 5, GOLD))
+                label = f"点击开始 {int(game.load_progress * 100)}%"
+            out.append(Text("panel.button.text", cx, (y1 + y2) / 2, label, PANEL_FILL, 14, True))
+    elif not game.running or game.paused:
+        if game.paused:
+            title, subtitle, color = "暂停中", "Enter 继续 · M 切模式 · R 重置", GREETING
+        elif game.game_over_reason == "challenge":
+            title, subtitle, color = "挑战完成！", "M 切模式 · R 重置", PANEL_GOOD
+        elif game.game_over_reason == "timed":
+            title, subtitle, color = "计时完成！", "M 切模式 · R 重置", PANEL_GOOD
+        else:
+            title, subtitle, color = "碰撞了，再试一次！", "R 重置 · 空格跳跃 · Enter 继续", PANEL_BAD
+        out.append(Rect("panel", cx - 160, cy - 80, 320, 160, PANEL_FILL, PANEL_EDGE, 3))
+        out.append(Text("panel.title", cx, cy - 10, title, color, 16, True))
+        out.append(Text("panel.subtitle", cx, cy + 26, subtitle, HUD_EFFECTS, 12))
+
+
+class DisplayDiff(NamedTuple):
+    """两帧之间的变化：added 为 (命令, 插在哪个已有键之前，None 表示末尾)。"""
+
+    added: List[Tuple[Command, str | None]]
+    changed: List[Command]
+    removed: List[str]
+
+
+def diff(prev: Dict[str, Command], cur: List[Command]) -> DisplayDiff | None:
+    """比较上一帧（键 → 命令）与本帧列表。
+
+    同键但命令类型变了按删除+新增处理；保留下来的键若前后顺序不一致返回 None，
+    后端应整体重建。
+    """
+    removed_keys = set(prev)
+    for cmd in cur:
+        old = prev.get(cmd.key)
+        if old is not None and type(old) is type(cmd):
+            removed_keys.discard(cmd.key)
+    order = {key: i for i, key in enumerate(prev)}
+    last = -1
+    for cmd in cur:
+        if cmd.key in order and cmd.key not in removed_keys:
+            if order[cmd.key] < last:
+                return None
+            last = order[cmd.key]
+
+    added: List[Tuple[Command, str | None]] = []
+    changed: List[Command] = []
+    before: str | None = None
+    for cmd in reversed(cur):
+        old = prev.get(cmd.key)
+        if old is None or cmd.key in removed_keys:
+            added.append((cmd, before))
+        else:
+            if old != cmd:
+                changed.append(cmd)
+            before = cmd.key
+    added.reverse()
+    changed.reverse()
+    return DisplayDiff(added, changed, [key for key in prev if key in removed_keys])
+
+
+def count_by_type(commands: List[Command]) -> Dict[str, int]:
+    """按命令类型计数（无界面测试与遥测用）。"""
+    counts: Dict[str, int] = {}
+    for cmd in commands:
+        name = type(cmd).__name__
+        counts[name] = counts.get(name, 0) + 1
+    return counts
@@ -0,0 +1,84 @@
+"""
+Touch gestures for the Kivy front-end.
+
+Anywhere on the game view: tap to jump, swipe up to jump, swipe down to
+slide. Every finger is tracked on its own by touch id, so one finger can
+rest on the screen while another taps, and two quick taps with two fingers
+give a jump and an air jump. A tap fires from touch-down after a short
+tap_delay, unless the finger starts moving down within it (a slide in the
+making); moving up fires it at once. A swipe is recognized on the move
+event that first carries it past swipe_distance, mostly vertically. Each
+touch produces at most one gesture.
+"""
+
+import math
+from typing import Any, Dict, List, Set, Tuple
+
+TAP = "tap"
+SWIPE_UP = "swipe_up"
+SWIPE_DOWN = "swipe_down"
+# 手势 → 模拟的输入动作
+GESTURE_ACTIONS = {TAP: "jump", SWIPE_UP: "jump", SWIPE_DOWN: "slide"}
+
+
+class GestureTracker:
+    """按触点 id 跟踪多指手势；坐标 y 轴朝上（Kivy 窗口坐标）。"""
+
+    def __init__(self, swipe_distance: float = 40.0, tap_delay: float = 0.03, slop: float = 10.0) -> None:
+        self.swipe_distance = swipe_distance
+        self.tap_delay = tap_delay  # 按下后等这么久确认不是下划再起跳；0 为按下即跳
+        self.slop = slop  # 等待期内向下移动超过它就不再当点按
+        self.origins: Dict[Any, Tuple[float, float]] = {}  # 触点 → 按下位置
+        self.pending: Dict[Any, float] = {}  # 触点 → 点按生效时刻
+        self.spent: Set[Any] = set()  # 已经识别出手势的触点
+
+    def down(self, touch_id: Any, x: float, y: float, now: float) -> str | None:
+        """按下：tap_delay 为 0 时立即返回点按，否则等 poll() 或 move() 确认。"""
+        self.origins[touch_id] = (x, y)
+        self.spent.discard(touch_id)
+        if self.tap_delay <= 0:
+            self.spent.add(touch_id)
+            return TAP
+        self.pending[touch_id] = now + self.tap_delay
+        return None
+
+    def move(self, touch_id: Any, x: float, y: float) -> str | None:
+        """等待期内往上动立即起跳、往下动取消点按；竖直滑过阈值识别为上划/下划。"""
+        origin = self.origins.get(touch_id)
+        if origin is None or touch_id in self.spent:
+            return None
+        dx, dy = x - origin[0], y - origin[1]
+        if touch_id in self.pending and abs(dy) >= self.slop and abs(dy) >= abs(dx):
+            del self.pending[touch_id]
+            if dy > 0:
+                self.spent.add(touch_id)
+                return TAP
+        if abs(dy) < self.swipe_distance or abs(dy) < abs(dx):
+            return None
+        self.spent.add(touch_id)
+        return SWIPE_UP if dy > 0 else SWIPE_DOWN
+
+    def up(self, touch_id: Any, x: float, y: float) -> str | None:
+        """抬起时还没出手势、也没拖远，就按点按算。"""
+        origin = self.origins.pop(touch_id, None)
+        self.pending.pop(touch_id, None)
+        if origin is None or touch_id in self.spent:
+            self.spent.discard(touch_id)
+            return None
+        if math.hypot(x - origin[0], y - origin[1]) >= self.swipe_distance:
+            return None
+        return TAP
+
+    def poll(self, now: float) -> List[str]:
+        """等待期已过的点按（每帧调用）。"""
+        due = [touch_id for touch_id, at in self.pending.items() if at <= now]
+        for touch_id in due:
+            del self.pending[touch_id]
+            self.spent.add(touch_id)
+        return [TAP] * len(due)
+
+    def cancel(self) -> None:
+        """切到后台等场合丢掉所有进行中的触点。"""
+        self.origins.clear()
+        self.pending.clear()
+        self.spent.clear()
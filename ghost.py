@@ -0,0 +1,140 @@
+"""
+Ghost horse: a compact recording of the best run's trajectory.
+
+The horse only moves vertically, so a run is stored as its height above
+the ground sampled at a fixed rate, quantized to 16 bits (1/4 px). Ground
+frames are run-length encoded, which keeps a minute of play at a few KB.
+Tracks are decoded once when loaded; playback is a table lookup.
+"""
+
+import os
+import struct
+import sys
+from array import array
+from typing import Dict
+
+MAGIC = b"HGGH"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHI")
+RUN_MARKER = 0xFFFF
+QUANT = 4.0  # 每像素 4 级
+MAX_VALUE = 0xFFFE
+
+
+def _altitude(game_horse: Dict, ground_y: float) -> float:
+    return max(0.0, ground_y - (game_horse["y"] + game_horse["h"]))
+
+
+class GhostRecorder:
+    """按固定采样率记录马离地高度。"""
+
+    def __init__(self, rate: int = 30) -> None:
+        self.rate = rate
+        self.samples = array("H")
+
+    def clear(self) -> None:
+        self.samples = array("H")
+
+    def duration(self) -> float:
+        return len(self.samples) / self.rate
+
+    def sample(self, elapsed: float, horse: Dict, ground_y: float) -> None:
+        """补齐到 elapsed 对应的采样点；时间倒退（练习倒带）时截断。"""
+        target = int(elapsed * self.rate) + 1
+        if target < len(self.samples):
+            del self.samples[target:]
+            return
+        value = min(MAX_VALUE, int(round(_altitude(horse, ground_y) * QUANT)))
+        while len(self.samples) < target:
+            self.samples.append(value)
+
+    def encode(self) -> bytes:
+        return encode_track(self.samples, self.rate)
+
+
+class GhostTrack:
+    """已解码的幽灵轨迹，按时间查询离地高度。"""
+
+    def __init__(self, samples: array, rate: int) -> None:
+        self.samples = samples
+        self.rate = rate
+
+    def duration(self) -> float:
+        return len(self.samples) / self.rate
+
+    def altitude_at(self, elapsed: float) -> float | None:
+        """返回 elapsed 时刻的离地高度（像素），超出录制范围时返回 None。"""
+        pos = elapsed * self.rate
+        index = int(pos)
+        if index < 0 or index >= len(self.samples):
+            return None
+        a = self.samples[index]
+        b = self.samples[index + 1] if index + 1 < len(self.samples) else a
+        return (a + (b - a) * (pos - index)) / QUANT
+
+
+def encode_track(samples: array, rate: int) -> bytes:
+    """游程编码：连续 3 个以上相同值写成 (RUN_MARKER, 值, 次数)。"""
+    out = array("H")
+    i = 0
+    total = len(samples)
+    while i < total:
+        value = samples[i]
+        run = 1
+        while i + run < total and samples[i + run] == value and run < 0xFFFF:
+            run += 1
+        if run >= 3:
+            out.extend((RUN_MARKER, value, run))
+        else:
+            out.extend(samples[i:i + run])
+        i += run
+    if sys.byteorder != "little":
+        out.byteswap()
+    return HEADER.pack(MAGIC, VERSION, rate, 0, total) + out.tobytes()
+
+
+def decode_track(data: bytes) -> GhostTrack:
+    try:
+        magic, version, rate, _reserved, total = HEADER.unpack_from(data, 0)
+    except struct.error as exc:
+        raise ValueError("ghost file too short") from exc
+    if magic != MAGIC or version != VERSION or rate <= 0:
+        raise ValueError("not a supported ghost file")
+    words = array("H")
+    body = data[HEADER.size:]
+    words.frombytes(body[:len(body) - len(body) % 2])
+    if sys.byteorder != "little":
+        words.byteswap()
+    samples = array("H")
+    i = 0
+    while i < len(words):
+        if words[i] == RUN_MARKER:
+            if i + 2 >= len(words):
+                raise ValueError("truncated ghost run")
+            samples.extend(array("H", [words[i + 1]]) * words[i + 2])
+            i += 3
+        else:
+            samples.append(words[i])
+            i += 1
+    if len(samples) != total:
+        raise ValueError("ghost sample count mismatch")
+    return GhostTrack(samples, rate)
+
+
+def load_ghost(path: str) -> GhostTrack | None:
+    try:
+        with open(path, "rb") as handle:
+            return decode_track(handle.read())
+    except (OSError, ValueError):
+        return None
+
+
+def save_ghost(path: str, recorder: GhostRecorder) -> bool:
+    try:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(recorder.encode())
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        return False
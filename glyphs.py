@@ -0,0 +1,161 @@
+"""
+Glyph atlas for the Kivy HUD.
+
+A Kivy Label rasterizes and uploads a new texture every time its text
+changes, and the HUD timer changes every frame the HUD is refreshed.
+GlyphAtlas renders each character of the HUD font once into a single
+Fbo-backed texture: digits, ASCII, the fixed HUD words and the effect
+labels at start-up, and any other character (status lines, achievements)
+the first time it appears. AtlasLabel draws its text as one Mesh of quads
+cut from that texture, so changing a number only rewrites vertices and
+uploads no texture.
+"""
+
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from kivy.core.text import Label as CoreLabel
+from kivy.graphics import ClearBuffers, ClearColor, Color, Mesh, Rectangle
+from kivy.graphics.fbo import Fbo
+from kivy.metrics import sp
+from kivy.properties import StringProperty
+from kivy.uix.widget import Widget
+
+# 预先放进图集的字符：ASCII、HUD 固定词与效果名；其余字符首次出现时再补
+HUD_WORDS = (
+    "无尽挑战计时模式 时间 跃起 星星 距离 最佳 计时星星 挑战用时 "
+    "无敌 减速 磁吸 翻倍 护盾 对手 等待对手… "
+    "点按/上划/空格=起跳 下划/S=滑行 M=模式 C=画面 V=音量 F=帧率 P=练习 Enter=暂停 "
+    "陈思颖 成就达成 继续 暂停 准备起跑 "
+)
+HUD_CHARSET = "".join(chr(c) for c in range(32, 127)) + HUD_WORDS
+
+
+class Glyph(NamedTuple):
+    u0: float
+    v0: float
+    u1: float
+    v1: float
+    width: int
+    height: int
+
+
+class GlyphAtlas:
+    """把 HUD 字体的字符逐个画进同一张纹理，按字符取 UV 区域。"""
+
+    def __init__(self, font_name: str | None = None, font_size: float = 15, size: Tuple[int, int] = (1024, 1024)) -> None:
+        self.font_kwargs = {"font_size": sp(font_size)}
+        if font_name:
+            self.font_kwargs["font_name"] = font_name
+        self.size = size
+        self.fbo = Fbo(size=size)
+        with self.fbo:
+            ClearColor(0, 0, 0, 0)
+            ClearBuffers()
+            Color(1, 1, 1, 1)
+        self.glyphs: Dict[str, Glyph] = {}
+        # 图集重排后需要重新排版的标签
+        self.listeners: List[Callable[[], None]] = []
+        self.cursor = [0, 0]
+        self.row_height = 0
+        self.line_height = 0
+        self.add(HUD_CHARSET)
+
+    @property
+    def texture(self):
+        return self.fbo.texture
+
+    def add(self, text: str) -> None:
+        """补画 text 里还没有的字符；图集满了就从头重排。"""
+        missing = [ch for ch in dict.fromkeys(text) if ch not in self.glyphs and ch != "\n"]
+        if not missing:
+            return
+        for ch in missing:
+            if not self._place(ch):
+                self._reset()
+                self.add(HUD_CHARSET + text)
+                for refresh in self.listeners:
+                    refresh()
+                return
+        self.fbo.draw()
+
+    def _reset(self) -> None:
+        self.fbo.clear()
+        with self.fbo:
+            ClearColor(0, 0, 0, 0)
+            ClearBuffers()
+            Color(1, 1, 1, 1)
+        self.glyphs.clear()
+        self.cursor = [0, 0]
+        self.row_height = 0
+
+    def _place(self, ch: str) -> bool:
+        label = CoreLabel(text=ch, **self.font_kwargs)
+        label.refresh()
+        texture = label.texture
+        if texture is None:
+            return True
+        w, h = texture.size
+        atlas_w, atlas_h = self.size
+        x, y = self.cursor
+        if x + w > atlas_w:
+            x, y = 0, y + self.row_height + 1
+            self.row_height = 0
+        if y + h > atlas_h:
+            return False
+        # 字形纹理保留在 Fbo 的画布里，GL 上下文重建时 Kivy 会重画整张图集
+        self.fbo.add(Rectangle(texture=texture, pos=(x, y), size=(w, h)))
+        self.glyphs[ch] = Glyph(x / atlas_w, y / atlas_h, (x + w) / atlas_w, (y + h) / atlas_h, w, h)
+        self.cursor = [x + w + 1, y]
+        self.row_height = max(self.row_height, h)
+        self.line_height = max(self.line_height, h)
+        return True
+
+    def layout(self, text: str) -> Tuple[List[float], List[int], float, float]:
+        """文字排成一行四边形：返回 (顶点, 索引, 宽, 高)，原点在左下。"""
+        self.add(text)
+        vertices: List[float] = []
+        indices: List[int] = []
+        x = 0.0
+        for ch in text:
+            glyph = self.glyphs.get(ch)
+            if glyph is None:
+                continue
+            x1, y1 = x + glyph.width, glyph.height
+            base = len(vertices) // 4
+            vertices.extend(
+                (
+                    x, 0, glyph.u0, glyph.v0,
+                    x1, 0, glyph.u1, glyph.v0,
+                    x1, y1, glyph.u1, glyph.v1,
+                    x, y1, glyph.u0, glyph.v1,
+                )
+            )
+            indices.extend((base, base + 1, base + 2, base, base + 2, base + 3))
+            x = x1
+        return vertices, indices, x, float(self.line_height)
+
+
+class AtlasLabel(Widget):
+    """单行居中文字，用图集四边形代替 Label（改字不上传纹理）。"""
+
+    text = StringProperty("")
+
+    def __init__(self, atlas: GlyphAtlas, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.atlas = atlas
+        with self.canvas:
+            Color(1, 1, 1, 1)
+            self.mesh = Mesh(mode="triangles", texture=atlas.texture)
+        self.bind(text=self._layout, pos=self._layout, size=self._layout)
+        atlas.listeners.append(self._layout)
+
+    def _layout(self, *_args) -> None:
+        vertices, indices, width, height = self.atlas.layout(self.text)
+        ox = round(self.center_x - width / 2)
+        oy = round(self.center_y - height / 2)
+        for i in range(0, len(vertices), 4):
+            vertices[i] += ox
+            vertices[i + 1] += oy
+        self.mesh.texture = self.atlas.texture
+        self.mesh.vertices = vertices
+        self.mesh.indices = indices
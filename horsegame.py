@@ -0,0 +1,381 @@
+"""
+Single entry point for the horse game.
+
+    python -m horsegame play     [--backend tk|kivy] [game options]
+    python -m horsegame bench    [--backend headless|tk|kivy] [--seconds N]
+    python -m horsegame simulate [--runs N] [--seconds N] [--record GHOST]
+    python -m horsegame replay   GHOST [--backend headless|tk|kivy]
+
+Nothing but the standard library is imported up front. Each command imports
+the selected backend when it runs, so the headless commands never load
+tkinter or Kivy, and the GUI modules in turn defer ctypes and the network
+services (asyncio) until a feature asks for them. --timings prints, on
+stderr, how long each of those imports took and when the command became
+ready (and, for bench on a GUI backend, when the first frame was drawn);
+``python -X importtime`` gives the per-module breakdown.
+"""
+
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+_T0 = time.perf_counter()
+
+STEP_HZ = 60
+SPARK = " ▁▂▃▄▅▆▇█"
+
+
+class ImportTimer:
+    """记录按需导入的模块耗时（含它们的依赖）与启动里程碑。"""
+
+    def __init__(self) -> None:
+        self.imports: List[Tuple[str, float]] = []
+        self.marks: List[Tuple[str, float]] = []
+
+    def load(self, name: str) -> Any:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        self.imports.append((name, time.perf_counter() - start))
+        return module
+
+    def mark(self, label: str) -> None:
+        self.marks.append((label, time.perf_counter() - _T0))
+
+    def report(self) -> str:
+        lines = ["imports (ms, including their dependencies):"]
+        for name, seconds in self.imports:
+            lines.append(f"  {name:<14} {seconds * 1000:8.1f}")
+        lines.append(f"  {'total':<14} {sum(s for _n, s in self.imports) * 1000:8.1f}")
+        lines.append("since launcher start (ms):")
+        for label, seconds in self.marks:
+            lines.append(f"  {label:<14} {seconds * 1000:8.1f}")
+        return "\n".join(lines)
+
+
+def add_game_options(parser: argparse.ArgumentParser) -> None:
+    """对局选项（horse_game.py 与 play/replay 共用）。"""
+    parser.add_argument("--seed", type=int, default=None, help="固定赛道随机种子")
+    parser.add_argument("--versus-port", type=int, default=None, help="对战模式本机 UDP 端口")
+    parser.add_argument("--peer", default="127.0.0.1:47311", help="对手地址 host:port")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟单向延迟（秒）")
+    parser.add_argument("--loss", type=float, default=0.0, help="模拟丢包率")
+    parser.add_argument("--spectate-port", type=int, default=None, help="开启观战广播的本机 TCP 端口")
+    parser.add_argument("--watch", default=None, help="观战：镜像 host:port 上广播的对局")
+    parser.add_argument("--threaded", action="store_true", help="游戏规则放到独立线程运行，主线程只负责绘制")
+    parser.add_argument("--jump-buffer", type=float, default=None, help="跳跃缓冲窗口（毫秒，默认 120，0 关闭）")
+    parser.add_argument("--coyote", type=float, default=None, help="土狼时间窗口（毫秒，默认 80，0 关闭）")
+
+
+def _kivy_env(args: argparse.Namespace) -> None:
+    """Kivy 版从环境变量读对局选项（见 main.py）；同时关掉 Kivy 自己的命令行解析。"""
+    os.environ.setdefault("KIVY_NO_ARGS", "1")
+    if getattr(args, "seed", None) is not None:
+        os.environ["HORSE_SEED"] = str(args.seed)
+    if getattr(args, "threaded", False):
+        os.environ["HORSE_THREADED"] = "1"
+    if getattr(args, "versus_port", None) is not None:
+        os.environ["HORSE_VERSUS_PORT"] = str(args.versus_port)
+        os.environ["HORSE_VERSUS_PEER"] = args.peer
+        os.environ["HORSE_VERSUS_LATENCY"] = str(args.latency)
+        os.environ["HORSE_VERSUS_LOSS"] = str(args.loss)
+    if getattr(args, "spectate_port", None) is not None:
+        os.environ["HORSE_SPECTATE_PORT"] = str(args.spectate_port)
+    if getattr(args, "watch", None):
+        os.environ["HORSE_WATCH"] = args.watch
+    if getattr(args, "jump_buffer", None) is not None:
+        os.environ["HORSE_JUMP_BUFFER"] = str(args.jump_buffer)
+    if getattr(args, "coyote", None) is not None:
+        os.environ["HORSE_COYOTE"] = str(args.coyote)
+    if getattr(args, "ghost", None):
+        os.environ["HORSE_GHOST"] = os.path.abspath(args.ghost)
+
+
+def _play_gui(args: argparse.Namespace, timer: ImportTimer) -> None:
+    if args.backend == "tk":
+        horse_game = timer.load("horse_game")
+        timer.mark("ready")
+        horse_game.run(args)
+    else:
+        _kivy_env(args)
+        app = timer.load("main").HorseGameApp()
+        timer.mark("ready")
+        app.run()
+
+
+class StepClock:
+    """无界面跑局的虚拟墙钟：每步前进 1/STEP_HZ 秒，跑得比实时快也不影响局内计时。"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def autopilot(sim: Any) -> None:
+    """无界面跑局用的简单起跳策略：障碍约 0.2 s 内到马头时起跳，下落中快压到障碍时连跳。"""
+    horse = sim.horse
+    if not sim.running:
+        return
+    front = horse["x"] + horse["w"]
+    speed_mul = sim.world_speed_multiplier()
+    for obs in sim.obstacles:
+        if obs["x"] + obs["w"] < horse["x"] or obs["x"] - front > obs["speed"] * speed_mul * 0.2:
+            continue
+        if horse["on_ground"] or (horse["vy"] > 0 and horse["y"] + horse["h"] > obs["y"] - 40):
+            sim.post_input("jump")
+        return
+
+
+def new_run(simulation: Any, seed: int | None, data_dir: str, mode: str = "endless") -> Any:
+    """新开一局无界面对局（虚拟时钟、已按开始），记录写到 data_dir。"""
+    sim = simulation.HorseSimulation(seed=seed, data_dir=data_dir)
+    sim.clock = StepClock()
+    sim.mode = mode
+    sim.reset()
+    sim.post_input("start")
+    return sim
+
+
+def advance(sim: Any) -> None:
+    """自动驾驶走一步（1/STEP_HZ 秒），丢掉音效事件。"""
+    autopilot(sim)
+    sim.clock.now += 1 / STEP_HZ
+    sim.step(1 / STEP_HZ)
+    sim.sound_events.clear()
+
+
+def finished(sim: Any) -> bool:
+    return not sim.running and not sim.preparing_start and bool(sim.game_over_reason)
+
+
+def cmd_play(args: argparse.Namespace, timer: ImportTimer) -> None:
+    _play_gui(args, timer)
+
+
+def cmd_bench(args: argparse.Namespace, timer: ImportTimer) -> None:
+    if args.backend == "tk":
+        horse_game = timer.load("horse_game")
+        game = horse_game.HorseGame(seed=args.seed)
+
+        def first_frame() -> None:
+            timer.mark("first frame")
+            game.root.quit()
+
+        # 构造函数里已经跑过第一次 tick；窗口画完后的第一个空闲回调即首帧上屏
+        game.root.after_idle(first_frame)
+        game.start()
+        game.root.destroy()
+    elif args.backend == "kivy":
+        _kivy_env(args)
+        app = timer.load("main").HorseGameApp()
+        clock = timer.load("kivy.clock").Clock
+
+        def first_frame(_dt: float) -> None:
+            timer.mark("first frame")
+            app.stop()
+
+        app.bind(on_start=lambda *_args: clock.schedule_once(first_frame, 0))
+        app.run()
+    else:
+        _bench_headless(args, timer)
+    # GUI 后端的 bench 量的就是冷启动，总是给出报告
+    if args.backend != "headless" and not args.timings:
+        print(timer.report())
+
+
+def _bench_headless(args: argparse.Namespace, timer: ImportTimer) -> None:
+    """规则步进 + 显示列表生成与比对（两种前端共用、与窗口无关的那部分开销）。
+
+    顺带核对显示列表：每个障碍正好一张贴图，按差异增量更新的结果与整表重建一致；
+    显示列表读到的局面字段都能经 RenderSnapshot 带到线程模式的画面一侧。
+    """
+    simulation = timer.load("simulation")
+    display = timer.load("display")
+    steps = int(args.seconds * STEP_HZ)
+    with tempfile.TemporaryDirectory() as data_dir:
+        sim = new_run(simulation, args.seed, data_dir)
+        sim.top_lanterns = display.make_top_lanterns(int(sim.world_width))
+        timer.mark("ready")
+        shown = {}
+        step_time = draw_time = 0.0
+        ops = runs = 0
+        reads = _ReadLog(sim)
+        for step in range(steps):
+            t0 = time.perf_counter()
+            advance(sim)
+            t1 = time.perf_counter()
+            commands = display.build_display_list(sim, sim.horse_masks)
+            changes = display.diff(shown, commands)
+            t2 = time.perf_counter()
+            _check_display(display, sim, shown, changes, commands)
+            if step % 30 == 0:
+                _check_render_fields(simulation, display, sim, reads)
+            shown = {cmd.key: cmd for cmd in commands}
+            ops += len(commands) if changes is None else len(changes.added) + len(changes.changed) + len(changes.removed)
+            step_time += t1 - t0
+            draw_time += t2 - t1
+            if finished(sim):
+                runs += 1
+                sim.reset()
+                sim.post_input("start")
+    print(
+        f"{steps} steps ({args.seconds:.0f} s of play, {runs} restarts): "
+        f"step {step_time / steps * 1e6:.0f} us, display list {draw_time / steps * 1e6:.0f} us, "
+        f"{ops / steps:.1f} ops/frame, {steps / (step_time + draw_time):.0f} frames/s"
+    )
+
+
+def _check_display(display: Any, sim: Any, prev: Dict[str, Any], changes: Any, commands: List[Any]) -> None:
+    counts = display.count_by_type(commands)
+    if counts.get("Stamp", 0) != len(sim.obstacles):
+        sys.exit(f"display list has {counts.get('Stamp', 0)} obstacle stamps for {len(sim.obstacles)} obstacles")
+    if changes is None:
+        return
+    patched = {key: cmd for key, cmd in prev.items() if key not in changes.removed}
+    patched.update((cmd.key, cmd) for cmd in changes.changed)
+    patched.update((cmd.key, cmd) for cmd, _before in changes.added)
+    if patched != {cmd.key: cmd for cmd in commands}:
+        sys.exit("display diff does not reproduce the rebuilt display list")
+
+
+# 显示列表从前端自身读取、不经快照传递的属性（尺寸、画质、装饰等）
+UI_FIELDS = frozenset(
+    ("world_width", "world_height", "ground_y", "mode_labels", "quality", "top_lanterns", "versus", "visual_mode")
+)
+
+
+class _ReadLog:
+    """透传属性读取并记下名字，用来找出显示列表直接读了 game 的哪些属性。"""
+
+    def __init__(self, target: Any) -> None:
+        object.__setattr__(self, "target", target)
+        object.__setattr__(self, "names", set())
+
+    def __getattr__(self, name: str) -> Any:
+        self.names.add(name)
+        return getattr(self.target, name)
+
+
+def _check_render_fields(simulation: Any, display: Any, sim: Any, reads: _ReadLog) -> None:
+    display.build_display_list(reads, sim.horse_masks)
+    mirror = argparse.Namespace()
+    simulation.RenderSnapshot(0, sim).apply(mirror)
+    for name in sorted(reads.names - UI_FIELDS):
+        value = getattr(sim, name)
+        if callable(value):
+            continue
+        if not hasattr(mirror, name):
+            sys.exit(f"display list reads {name}, which RenderSnapshot does not carry")
+        if _plain(getattr(mirror, name)) != _plain(value):
+            sys.exit(f"{name} does not round-trip through RenderSnapshot")
+
+
+def _plain(value: Any) -> Any:
+    """快照里列表换成了元组、集合换成了 frozenset，比较前统一回来。"""
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, frozenset):
+        return set(value)
+    return value
+
+
+def cmd_simulate(args: argparse.Namespace, timer: ImportTimer) -> None:
+    simulation = timer.load("simulation")
+    timer.mark("ready")
+    seed = args.seed if args.seed is not None else 2026
+    steps = int(args.seconds * STEP_HZ)
+    best = None
+    with tempfile.TemporaryDirectory() as data_dir:
+        for run in range(args.runs):
+            sim = new_run(simulation, seed + run, data_dir, args.mode)
+            for _ in range(steps):
+                advance(sim)
+                if finished(sim):
+                    break
+            print(
+                f"seed {seed + run}: {sim.elapsed:6.1f} s, distance {sim.distance:7.1f}, score {sim.score:5d}, "
+                f"stars {sim.total_stars:3d}, jumps {sim.jumps:3d}, {sim.game_over_reason or 'time up'}"
+            )
+            if best is None or sim.distance > best.distance:
+                best = sim
+    if args.record and best is not None:
+        ghost = timer.load("ghost")
+        if not ghost.save_ghost(args.record, best.ghost_recorder):
+            sys.exit(f"could not write {args.record}")
+        print(f"best run (seed {best.course_seed}) written to {args.record}")
+
+
+def cmd_replay(args: argparse.Namespace, timer: ImportTimer) -> None:
+    ghost = timer.load("ghost")
+    track = ghost.load_ghost(args.ghost)
+    if track is None:
+        sys.exit(f"{args.ghost}: not a ghost file")
+    if args.backend != "headless":
+        # 在窗口里与这条轨迹同场比赛
+        _play_gui(args, timer)
+        return
+    timer.mark("ready")
+    samples = track.samples
+    takeoffs = sum(1 for a, b in zip(samples, samples[1:]) if a == 0 and b > 0)
+    airborne = sum(1 for value in samples if value > 0)
+    print(
+        f"{args.ghost}: {track.duration():.1f} s at {track.rate} Hz, {takeoffs} jumps, "
+        f"{airborne / max(1, len(samples)) * 100:.0f}% airborne, peak {max(samples, default=0) / ghost.QUANT:.0f} px"
+    )
+    # 每秒最高离地高度
+    peaks = [max(samples[i:i + track.rate]) for i in range(0, len(samples), track.rate)]
+    top = max(peaks, default=0) or 1
+    print("".join(SPARK[round(value / top * (len(SPARK) - 1))] for value in peaks))
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m horsegame", description="Horse game launcher")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--timings", action="store_true", help="print import and startup times to stderr")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    play = sub.add_parser("play", parents=[common], help="play in a window")
+    play.add_argument("--backend", choices=("tk", "kivy"), default="tk")
+    add_game_options(play)
+
+    bench = sub.add_parser("bench", parents=[common], help="headless frame cost, or cold start to first frame of a GUI backend")
+    bench.add_argument("--backend", choices=("headless", "tk", "kivy"), default="headless")
+    bench.add_argument("--seconds", type=float, default=60.0, help="play time to simulate (headless)")
+    bench.add_argument("--seed", type=int, default=2026)
+
+    simulate = sub.add_parser("simulate", parents=[common], help="autoplay runs without a window and print their results")
+    simulate.add_argument("--backend", choices=("headless",), default="headless")
+    simulate.add_argument("--runs", type=int, default=5)
+    simulate.add_argument("--seconds", type=float, default=120.0, help="time limit per run")
+    simulate.add_argument("--seed", type=int, default=None, help="seed of the first run (default 2026)")
+    simulate.add_argument("--mode", choices=("endless", "challenge", "timed"), default="endless")
+    simulate.add_argument("--record", default=None, help="save the longest run as a ghost file")
+
+    replay = sub.add_parser("replay", parents=[common], help="summarize a ghost file, or race it in a window")
+    replay.add_argument("ghost")
+    replay.add_argument("--backend", choices=("headless", "tk", "kivy"), default="headless")
+    add_game_options(replay)
+
+    args = parser.parse_args(argv)
+    timer = ImportTimer()
+    timer.mark("parsed")
+    handler = {"play": cmd_play, "bench": cmd_bench, "simulate": cmd_simulate, "replay": cmd_replay}[args.command]
+    try:
+        handler(args, timer)
+    finally:
+        if args.timings:
+            print(timer.report(), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
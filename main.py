@@ -1,588 +1,416 @@
 ﻿
-import json
+import io
 import math
 import os
-import random
 import time
+from collections import OrderedDict
+from functools import partial
 
 from kivy.app import App
 from kivy.clock import Clock
+from kivy.config import Config
 from kivy.core.audio import SoundLoader
+from kivy.core.text import Label as CoreLabel
 from kivy.core.window import Window
-from kivy.graphics import Color, Ellipse, Line, Rectangle
+from kivy.graphics import ClearBuffers, ClearColor, Color, Ellipse, InstructionGroup, Line, Mesh, Rectangle, Translate
+from kivy.graphics.fbo import Fbo
+from kivy.graphics.texture import Texture
+from kivy.logger import Logger
+from kivy.metrics import dp
 from kivy.uix.button import Button
 from kivy.uix.floatlayout import FloatLayout
 from kivy.uix.label import Label
 from kivy.uix.widget import Widget
 
-
-class HorseGameWidget(Widget):
-    def __init__(self, **kwargs) -> None:
-        super().__init__(**kwargs)
-        self.base_width = 900.0
-        self.base_height = 520.0
-        self.ground_y = self.base_height - 90.0
-        self.gravity = 2200.0
-        self.jump_strength = 1100.0
-        self.max_air_jumps = 1
-
-        self.obstacles = []
-        self.trails = []
-        self.fireworks = []
-        self.air_stars = []
-        self.powerups = []
+from assetload import AssetLoader, LoadJob
+from assets import SOUNDS, SPRITES, sound_file, sprite_bytes
+from collision import BitMask
+from display import (
+    STAMP_CACHE,
+    Ghost,
+    Gradient,
+    Layer,
+    Oval,
+    Poly,
+    Rect,
+    Sprite,
+    Stamp,
+    Text,
+    build_display_list,
+    diff,
+    hud_lines,
+    make_top_lanterns,
+    obstacle_recipe,
+    stamp_size,
+)
+from display import Line as LineCommand
+from gestures import GESTURE_ACTIONS, GestureTracker
+from ghost import load_ghost
+from glyphs import AtlasLabel, GlyphAtlas
+from pacing import FramePacer
+from palette import THEMES
+from parallax import tile as layer_tile
+from quality import QualityGovernor
+from simulation import HorseSimulation
+from snapshot import pack_state, restore_state
+from spritesheet import pack_sheet, tex_coords
+from telemetry import TelemetryRecorder
+
+
+def _set_max_fps(hz: int) -> None:
+    """让 Kivy 主循环的帧率上限跟随排程器。"""
+    # 公开接口只有 Config 的 graphics/maxfps，而 Clock 只在创建时读一次；
+    # 运行中改上限只能写 Clock 的内部字段。Kivy 若改了这个字段就退回启动时的上限，不报错
+    Config.set("graphics", "maxfps", str(hz))
+    if hasattr(Clock, "_max_fps"):
+        Clock._max_fps = float(hz)
+
+
+class HorseGameWidget(HorseSimulation, Widget):
+    def __init__(self, seed=None, versus=None, spectators=None, watcher=None, threaded=False, **kwargs) -> None:
+        Widget.__init__(self, **kwargs)
+        HorseSimulation.__init__(
+            self,
+            seed=seed,
+            versus=versus,
+            spectators=spectators,
+            watcher=watcher,
+            data_dir=self._resolve_data_dir(),
+        )
+        self.base_width = self.world_width
+        self.base_height = self.world_height
         self.top_lanterns = []
+        self.restart_prompt = "点开始继续"
+        self.resume_prompt = "点继续"
 
-        self.spawn_timer = 0.0
-        self.star_spawn_timer = 0.0
-        self.powerup_spawn_timer = 0.0
-        self.invincible_timer = 0.0
-        self.slow_timer = 0.0
-        self.magnet_timer = 0.0
-        self.double_score_timer = 0.0
-        self.slide_timer = 0.0
-        self.slide_cooldown = 0.0
-        self.shield = False
-
-        self.current_hint = ""
-        self.hint_sound_cooldown = 0.0
-        self.jump_sound_counter = 0
-        self.jump_prompt_played = False
-
-        self.mode = "endless"
-        self.modes = ["endless", "challenge", "timed"]
-        self.mode_labels = {"endless": "无尽", "challenge": "挑战", "timed": "计时"}
-        self.time_limit = 60.0
-        self.game_over_reason = ""
-
-        self.awaiting_start = True
-        self.preparing_start = False
-        self.countdown_timer = 0.0
-        self.paused = False
-
-        self.total_stars = 0
-        self.star_combo = 0
-        self.star_combo_timer = 0.0
-        self.achievements = set()
-        self.achievement_text = ""
-        self.achievement_timer = 0.0
-
-        self.elapsed = 0.0
-        self.distance = 0.0
-        self.jumps = 0
-        self.air_jumps_used = 0
-        self.score = 0
-        self.difficulty = 1.0
-        self.stage = 0
-
-        self.status_text = "陈思颖: 无尽模式，空格起跳"
-        self.last_time = time.time()
+        self.hud_callback = None
+        # 全屏触摸手势：点按/上划跳、下划滑行，多指各自识别
+        self.gestures = GestureTracker(swipe_distance=dp(36))
 
         self.scale = 1.0
         self.x_offset = 0.0
         self.y_offset = 0.0
 
         self.visual_mode = 0
-        self.visual_profiles = [
-            {
-                "sky": ["#22030a", "#3a0a14", "#530e19", "#6e111b", "#8a141b"],
-                "ground": "#2b0a0f",
-                "grid": "#5c1b21",
-                "line": "#d4953f",
-                "glow": "#ffce73",
-            },
-            {
-                "sky": ["#05070f", "#0e1326", "#161d3b", "#1b274a", "#23335e"],
-                "ground": "#0b0f1f",
-                "grid": "#2a3864",
-                "line": "#fcbf49",
-                "glow": "#fef3c7",
-            },
-            {
-                "sky": ["#1c0b12", "#2a0f18", "#36131d", "#421621", "#4e1a25"],
-                "ground": "#250a12",
-                "grid": "#4a1b27",
-                "line": "#d4953f",
-                "glow": "#f4d35e",
-            },
-        ]
+        self.pacer = FramePacer(60)
+        self.quality = QualityGovernor(budget=self.pacer.period)
+        self.tick_event = None
+        self.idle_signature = None
+        self.suspended = False
+        # 上一帧的显示列表（键 → 命令）与画布上对应的指令组
+        self.shown = {}
+        self.canvas_groups = {}
+        self.gradient_textures = {}
+        self.layer_textures = {}
+        # 障碍贴图（ObstacleSprite → Fbo），最近用过的排在后面
+        self.stamp_fbos = OrderedDict()
+        self.label_font = None
 
         self.volume_levels = [0.0, 0.4, 0.7, 1.0]
         self.volume_index = 2
         self.volume = self.volume_levels[self.volume_index]
 
         self.sounds = {}
-        self.horse_textures = {}
-
-        self.records_path = self._resolve_records_path()
-        self.records = self._load_records()
+        # 马的全部帧拼成一张图集纹理，换帧只改矩形的 tex_coords
+        self.horse_sheet = None
+        self.horse_cells = {}
+        self.horse_uvs = {}
+        self.sprite_rects = {}
+        # 逐帧遥测，写到记录目录下的 telemetry/（python telemetry.py analyze 查看）
+        self.telemetry = TelemetryRecorder(os.path.join(os.path.dirname(self.records_path), "telemetry"))
+        self.telemetry.start()
+        self.snapshot_path = os.path.join(os.path.dirname(self.records_path), "horse_snapshot.bin")
 
         self._load_assets()
-        self.top_lanterns = self._make_top_lanterns()
+        self.top_lanterns = make_top_lanterns(self.base_width)
         self.reset()
-        Clock.schedule_interval(self.tick, 1 / 60)
-
-    def _resolve_records_path(self) -> str:
+        self._resume_snapshot()
+        self._apply_loop_rate()
+        if threaded:
+            # 规则挪到 worker 线程，Kivy 主线程只画最新快照
+            self.start_worker(self.pacer.target_hz)
+        self.tick_event = Clock.schedule_once(self.tick, 0)
+
+    def _resolve_data_dir(self) -> str:
         app = App.get_running_app()
         if app is not None:
-            return os.path.join(app.user_data_dir, "horse_records.json")
-        return os.path.join(os.path.dirname(__file__), "horse_records.json")
-
-    def _load_records(self) -> dict:
-        default = {
-            "best_time": 0.0,
-            "best_distance": 0.0,
-            "best_score": 0,
-            "best_combo": 0,
-            "best_timed_score": 0,
-            "best_challenge_time": 0.0,
-        }
-        if not os.path.exists(self.records_path):
-            return default
+            return app.user_data_dir
+        return os.path.dirname(os.path.abspath(__file__))
+
+    def save_snapshot(self) -> None:
+        """对局进行中时写出快照，供被系统杀掉后重启续玩（线程模式下须先 suspend worker）。"""
+        if not self.sim.running:
+            self._discard_snapshot()
+            return
         try:
-            with open(self.records_path, "r", encoding="utf-8") as handle:
-                data = json.load(handle)
-            if not isinstance(data, dict):
-                return default
-            merged = default.copy()
-            merged.update({k: data.get(k, v) for k, v in default.items()})
-            return merged
+            os.makedirs(os.path.dirname(self.snapshot_path), exist_ok=True)
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "wb") as handle:
+                handle.write(pack_state(self.sim, course=True))
+            os.replace(tmp_path, self.snapshot_path)
         except Exception:
-            return default
+            pass
 
-    def _save_records(self) -> None:
+    def _resume_snapshot(self) -> None:
+        if not os.path.exists(self.snapshot_path):
+            return
         try:
-            os.makedirs(os.path.dirname(self.records_path), exist_ok=True)
-            with open(self.records_path, "w", encoding="utf-8") as handle:
-                json.dump(self.records, handle, ensure_ascii=True, indent=2)
+            with open(self.snapshot_path, "rb") as handle:
+                restore_state(self, handle.read())
         except Exception:
+            self.reset()
+        else:
+            if self.running:
+                self.paused = True
+                self.status_text = "陈思颖: 已恢复上一局，点继续"
+        self._discard_snapshot()
+
+    def _discard_snapshot(self) -> None:
+        try:
+            os.remove(self.snapshot_path)
+        except OSError:
             pass
 
     def _load_assets(self) -> None:
-        base_dir = os.path.join(os.path.dirname(__file__), "image")
-        self.horse_textures["main"] = self._load_texture(os.path.join(base_dir, "horse.png"))
-        self.horse_textures["jump"] = self._load_texture(os.path.join(base_dir, "horse_jump.png"))
-        self.horse_textures["defend"] = self._load_texture(os.path.join(base_dir, "horse_Defend.png"))
-
-        sound_map = {
-            "start": "先试一试，空格起跳.MP3",
-            "jump": "轻盈跃起！.MP3",
-            "double_jump": "连跳加速！.MP3",
-            "pause": "暂停.MP3",
-            "resume": "继续冲刺.MP3",
-            "hit": "撞到障碍了，按 R 继续.MP3",
-            "invincible": "星光护体，5秒无敌！.MP3",
-            "hint_keep": "保持节奏.MP3",
-            "hint_ready": "准备跳！.MP3",
-            "hint_caution": "贴近了，小心！.MP3",
-            "hint_observe": "观察前方，寻找创造路.MP3",
-        }
-        for key, filename in sound_map.items():
-            path = os.path.join(base_dir, filename)
-            if os.path.exists(path):
-                self.sounds[key] = SoundLoader.load(path)
-
-    def _load_texture(self, path: str):
-        if not os.path.exists(path):
-            return None
+        # 不等资源就出开始画面：后台按优先级读文件，每帧在主线程收尾一部分（assetload.py）
+        self.loader = AssetLoader(self._asset_jobs()).start()
+        self.load_progress = 0.0
+
+    def _asset_jobs(self):
+        """载入顺序：马的各帧、拼图集与掩码，再按 SOUNDS 顺序的语音。"""
+        # 按屏幕高度选烘焙档位（bake_assets.py）；优先从内存映射的资源包解码，
+        # 其次是散装烘焙文件，最后退回 image/ 原图
+        scale = 1 if Window.height < 480 else 2 if Window.height < 960 else 3
+        sound_cache = os.path.join(os.path.dirname(self.records_path), "sound_cache")
+        textures = {}
+        jobs = [LoadJob(f"sprite:{key}", partial(sprite_bytes, key, scale), partial(self._finish_sprite, textures, key)) for key in SPRITES]
+        jobs.append(LoadJob("sheet", lambda: None, lambda _data: self._finish_horse(textures)))
+        jobs.extend(LoadJob(f"sound:{key}", partial(sound_file, key, sound_cache), partial(self._finish_sound, key)) for key in SOUNDS)
+        return jobs
+
+    def _finish_sprite(self, textures, key: str, data) -> None:
+        textures[key] = self._texture_from_png(data) if data else None
+
+    def _finish_horse(self, textures) -> None:
+        self._build_horse_masks(textures)
+        self._build_horse_sheet(textures)
+
+    def _finish_sound(self, key: str, path: str) -> None:
+        if path and os.path.exists(path):
+            self.sounds[key] = SoundLoader.load(path)
+
+    def _pump_assets(self) -> bool:
+        """每帧收尾一部分后台载好的资源；返回是否仍在载入。"""
+        if self.loader.complete:
+            return False
+        loading = self.loader.pump()
+        self.load_progress = self.loader.progress()
+        return loading
+
+    def _build_horse_masks(self, textures) -> None:
+        """贴图被拉伸画进马的外框，掩码也缩放到外框尺寸（世界坐标 1 像素 1 位）。"""
+        if self.horse_masks:
+            return
+        w, h = (int(v) for v in self.horse_size)
+        for key, texture in textures.items():
+            if texture is None:
+                continue
+            try:
+                mask = BitMask.from_rgba(texture.width, texture.height, texture.pixels, bottom_up=True)
+            except Exception:
+                continue
+            self.horse_masks[key] = mask.scaled(w, h)
+        # 原地更新：线程模式下 worker 的副本共用这两张表
+        self.horse_slide_masks.update((key, mask.without_top(0.4)) for key, mask in self.horse_masks.items())
+
+    def _build_horse_sheet(self, textures) -> None:
+        """把各帧像素拷进一张图集纹理，记下每帧的 UV 区域。"""
+        self.horse_sheet = None
+        self.horse_cells = {}
+        self.horse_uvs = {}
+        pixels = {}
+        for key, texture in textures.items():
+            if texture is None:
+                continue
+            try:
+                pixels[key] = (texture.size, texture.pixels)
+            except Exception:
+                continue
+        if not pixels:
+            return
+        layout = pack_sheet({key: size for key, (size, _data) in pixels.items()})
+        sheet = Texture.create(size=(layout.width, layout.height), colorfmt="rgba")
+        sheet.blit_buffer(bytes(layout.width * layout.height * 4), colorfmt="rgba", bufferfmt="ubyte")
+        for key, ((w, h), data) in pixels.items():
+            cell = layout.cells[key]
+            # 纹理自下而上，格子按自上而下的坐标排
+            sheet.blit_buffer(data, pos=(cell.x, layout.height - cell.y - h), size=(w, h), colorfmt="rgba", bufferfmt="ubyte")
+        self.horse_sheet = sheet
+        self.horse_cells = layout.cells
+        self.horse_uvs = {key: tex_coords(layout, cell) for key, cell in layout.cells.items()}
+
+    def _texture_from_png(self, data):
         try:
             from kivy.core.image import Image as CoreImage
 
-            return CoreImage(path).texture
+            return CoreImage(io.BytesIO(data), ext="png").texture
         except Exception:
             return None
 
     def _play_sound(self, key: str) -> None:
+        if key not in self.sounds:
+            # 还没轮到它就当场载入
+            self.loader.need(f"sound:{key}")
         sound = self.sounds.get(key)
         if sound and self.volume > 0:
             sound.volume = self.volume
             sound.stop()
             sound.play()
 
-    def _make_top_lanterns(self):
-        lanterns = []
-        center = self.base_width / 2
-        offsets = [180, 270, 360]
-        sizes = [random.uniform(34, 54) for _ in offsets]
-        ys = [random.uniform(32, 46) for _ in offsets]
-        blessings = ["福", "春", "吉祥", "如意", "安康", "平安", "顺意", "招财"]
-        for off, size, y in zip(offsets, sizes, ys):
-            label = random.choice(blessings)
-            lanterns.append({"x": center - off, "y": y, "size": size, "label": label})
-            lanterns.append({"x": center + off, "y": y, "size": size, "label": label})
-        lanterns.sort(key=lambda l: l["x"])
-        return lanterns
-
-    def _make_challenge_pattern(self):
-        pattern = []
-        base_delay = 1.1
-        themes = ["fence", "data", "lantern", "light"]
-        for i in range(12):
-            pattern.append(
-                {
-                    "delay": base_delay + i * 0.15,
-                    "h": 70 + i * 3,
-                    "w": 50 + (i % 3) * 10,
-                    "speed": 260 + i * 12,
-                    "theme": themes[i % len(themes)],
-                    "label": random.choice(["勇", "智", "行", "跃", "创", "新"]),
-                }
-            )
-        return pattern
-    def reset(self) -> None:
-        self.horse = {
-            "x": 120.0,
-            "y": self.ground_y - 70.0,
-            "w": 110.0,
-            "h": 70.0,
-            "vy": 0.0,
-            "on_ground": True,
-        }
-        self.obstacles.clear()
-        self.trails.clear()
-        self.fireworks.clear()
-        self.air_stars.clear()
-        self.powerups.clear()
-        self.spawn_timer = 1.2
-        self.star_spawn_timer = 0.8
-        self.powerup_spawn_timer = 1.6
-        self.running = False
-        self.paused = False
-        self.awaiting_start = True
-        self.preparing_start = False
-        self.countdown_timer = 0.0
-        self.game_over_reason = ""
-        self.start_time = time.time()
-        self.elapsed = 0.0
-        self.jumps = 0
-        self.air_jumps_used = 0
-        self.score = 0
-        self.total_stars = 0
-        self.star_combo = 0
-        self.star_combo_timer = 0.0
-        self.invincible_timer = 0.0
-        self.slow_timer = 0.0
-        self.magnet_timer = 0.0
-        self.double_score_timer = 0.0
-        self.slide_timer = 0.0
-        self.slide_cooldown = 0.0
-        self.shield = False
-        self.distance = 0.0
-        self.status_text = f"陈思颖: {self.mode_labels[self.mode]}模式，空格起跳"
-        self.current_hint = ""
-        self.hint_sound_cooldown = 0.0
-        self.jump_sound_counter = 0
-        self.jump_prompt_played = False
-        self.achievements.clear()
-        self.achievement_text = ""
-        self.achievement_timer = 0.0
-        self.difficulty = 1.0
-        self.stage = 0
-        self.challenge_pattern = self._make_challenge_pattern()
-        self.challenge_index = 0
-        self.challenge_timer = self.challenge_pattern[0]["delay"] if self.challenge_pattern else 1.0
-        self._play_sound("start")
-
-    def start_countdown(self) -> None:
-        if self.awaiting_start and not self.preparing_start:
-            self.preparing_start = True
-            self.countdown_timer = 3.0
-            self.status_text = "陈思颖: 准备起跑！"
-
-    def toggle_pause(self) -> None:
-        if not self.running or self.awaiting_start or self.preparing_start:
-            return
-        self.paused = not self.paused
-        self.status_text = "陈思颖: 暂停" if self.paused else "陈思颖: 继续冲刺"
-        self._play_sound("pause" if self.paused else "resume")
+    def _drain_sounds(self) -> None:
+        # 规则一侧排出的音效在主线程播放；None 表示先停掉所有音效
+        events = self.sim.sound_events
+        while events:
+            key = events.popleft()
+            if key is None:
+                for sound in self.sounds.values():
+                    if sound:
+                        sound.stop()
+            else:
+                self._play_sound(key)
 
     def toggle_volume(self) -> None:
         self.volume_index = (self.volume_index + 1) % len(self.volume_levels)
         self.volume = self.volume_levels[self.volume_index]
         label = "静音" if self.volume == 0 else f"{int(self.volume * 100)}%"
-        self.status_text = f"陈思颖: 音量 {label}"
+        self.post_input("say", f"陈思颖: 音量 {label}")
 
     def cycle_visual_mode(self) -> None:
-        self.visual_mode = (self.visual_mode + 1) % len(self.visual_profiles)
-        label = ["霓红", "高对比", "低闪烁"][self.visual_mode]
-        self.status_text = f"陈思颖: 画面 {label}"
+        self.visual_mode = (self.visual_mode + 1) % len(THEMES)
+        # 低闪烁模式会降低烟花频率，规则一侧只读这个值
+        self.sim.visual_mode = self.visual_mode
+        label = THEMES[self.visual_mode].name
+        self.post_input("say", f"陈思颖: 画面 {label}")
+
+    def cycle_frame_rate(self) -> None:
+        # 切档会清空统计，先把上一档的迟到/丢帧报出来
+        stats = self.pacer.stats()
+        hz = self.pacer.cycle_rate()
+        self.quality.set_budget(self.pacer.period)
+        self._apply_loop_rate()
+        if self.worker is not None:
+            self.worker.set_rate(hz)
+        else:
+            self.step_hz = hz
+        self.post_input(
+            "say",
+            f"陈思颖: 帧率 {hz}Hz（{stats['target_hz']}Hz 迟到 {stats['late_frames']} 丢帧 {stats['dropped_frames']}"
+            f" 抖动 {stats['jitter_ms']:.1f}ms）",
+        )
 
-    def cycle_mode(self) -> None:
-        if self.running and not self.paused:
-            return
-        index = self.modes.index(self.mode)
-        self.mode = self.modes[(index + 1) % len(self.modes)]
-        self.status_text = f"陈思颖: 切换到 {self.mode_labels[self.mode]}"
-        self.reset()
+    def _apply_loop_rate(self) -> None:
+        # Kivy 主循环按 maxfps 休眠；跟随目标帧率，否则 120Hz 会被 60 帧上限截断
+        _set_max_fps(self.pacer.current_hz())
+
+    def _idle_view(self):
+        return (
+            self.status_text,
+            self.current_hint,
+            self.load_progress,
+            self.achievement_timer > 0,
+            self.mode,
+            self.visual_mode,
+            self.quality.level,
+            self.running,
+            self.paused,
+            self.awaiting_start,
+            self.game_over_reason,
+            self.size,
+        )
 
-    def handle_jump(self) -> None:
-        if not self.running or self.paused:
+    def wake(self) -> None:
+        """有输入时立即退出低频空闲。"""
+        if self.suspended or not self.pacer.idle or self.tick_event is None:
             return
-        if self.horse["on_ground"]:
-            self._do_jump(self.jump_strength, air_jump=False)
-        else:
-            if self.air_jumps_used < self.max_air_jumps:
-                self._do_jump(self.jump_strength, air_jump=True)
-
-    def handle_slide(self) -> None:
-        if not self.horse["on_ground"] or self.slide_cooldown > 0:
+        self.tick_event.cancel()
+        self.pacer.set_idle(False)
+        self._apply_loop_rate()
+        self.tick_event = Clock.schedule_once(self.tick, 0)
+
+    def on_touch_down(self, touch):
+        # 开始/暂停/模式按钮叠在上层，先拿到触摸；落到这里的都当手势
+        if not self.collide_point(*touch.pos) or touch.is_mouse_scrolling:
+            return super().on_touch_down(touch)
+        touch.grab(self)
+        self.wake()
+        self._post_gesture(self.gestures.down(touch.uid, *touch.pos, self.clock()))
+        return True
+
+    def on_touch_move(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_move(touch)
+        self._post_gesture(self.gestures.move(touch.uid, *touch.pos))
+        return True
+
+    def on_touch_up(self, touch):
+        if touch.grab_current is not self:
+            return super().on_touch_up(touch)
+        touch.ungrab(self)
+        self._post_gesture(self.gestures.up(touch.uid, *touch.pos))
+        return True
+
+    def _post_gesture(self, gesture) -> None:
+        """识别出的手势直接排进输入队列，下一步就生效（不经按钮控件）。"""
+        if gesture is None or self.watcher is not None:
             return
-        self.slide_timer = 0.45
-        self.slide_cooldown = 1.3
-        self.status_text = "陈思颖: 滑行闪避！"
-
-    def _do_jump(self, strength: float, air_jump: bool) -> None:
-        self.horse["vy"] = -strength
-        self.horse["on_ground"] = False
-        if air_jump:
-            self.air_jumps_used += 1
-        else:
-            self.air_jumps_used = 0
-        self.jumps += 1
-        if air_jump:
-            self.status_text = "陈思颖: 连跳加速！"
-            self.jump_sound_counter += 1
-            if self.jump_sound_counter % 6 == 0:
-                self._play_sound("double_jump")
-        else:
-            self.status_text = "陈思颖: 轻盈跃起！"
-            if not self.jump_prompt_played:
-                self._play_sound("jump")
-                self.jump_prompt_played = True
-
-    def spawn_obstacle(self, config=None) -> None:
-        if config:
-            height = int(config["h"])
-            width = int(config["w"])
-            speed = float(config["speed"])
-            theme = config.get("theme", "fence")
-            blessing = config.get("label", "福")
-        else:
-            scale = 0.8 + self.difficulty * 0.35
-            height = int(random.randint(60, 120) * (0.9 + self.difficulty * 0.1))
-            width = int(random.randint(40, 80) * (0.9 + self.difficulty * 0.08))
-            speed = random.randint(230, 360) * scale
-            theme = random.choice(["data", "fence", "light", "lantern"])
-            blessing = random.choice(["福", "春", "安康", "平安", "顺意", "如意"])
-        self.obstacles.append(
-            {
-                "x": self.base_width + 20.0,
-                "y": self.ground_y - height,
-                "w": float(width),
-                "h": float(height),
-                "speed": float(speed),
-                "theme": theme,
-                "label": blessing,
-            }
-        )
-        if not config:
-            self.spawn_timer = random.uniform(1.1, 2.1) / max(0.8, self.difficulty)
-
-    def spawn_firework(self) -> None:
-        x = random.uniform(120, self.base_width - 120)
-        y = random.uniform(80, self.base_height * 0.4)
-        count = random.randint(15, 24)
-        particles = []
-        for _ in range(count):
-            angle = random.uniform(0, math.pi * 2)
-            speed = random.uniform(90, 210)
-            vx = speed * math.cos(angle)
-            vy = speed * math.sin(angle)
-            particles.append({"x": x, "y": y, "vx": vx, "vy": vy, "life": random.uniform(0.8, 1.4)})
-        color = random.choice(["#ff4d4f", "#ffd166", "#ff7a45", "#ff3859"])
-        self.fireworks.append({"particles": particles, "color": color})
-
-    def spawn_star(self) -> None:
-        x = self.base_width + 30
-        y = random.uniform(120, self.ground_y - 120)
-        size = random.uniform(10, 16)
-        self.air_stars.append({"x": x, "y": y, "size": size, "speed": random.uniform(220, 320)})
-
-    def spawn_powerup(self) -> None:
-        x = self.base_width + 40
-        y = random.uniform(140, self.ground_y - 140)
-        kind = random.choice(["slow", "shield", "magnet", "double"])
-        self.powerups.append({"x": x, "y": y, "size": 16.0, "speed": random.uniform(200, 300), "kind": kind})
-
-    def apply_powerup(self, kind: str) -> None:
-        if kind == "slow":
-            self.slow_timer = 4.0
-            self.status_text = "陈思颖: 时空减速！"
-        elif kind == "shield":
-            self.shield = True
-            self.status_text = "陈思颖: 护盾就位！"
-        elif kind == "magnet":
-            self.magnet_timer = 6.0
-            self.status_text = "陈思颖: 星星磁吸！"
-        elif kind == "double":
-            self.double_score_timer = 6.0
-            self.status_text = "陈思颖: 星星翻倍！"
-
-    def world_speed_multiplier(self) -> float:
-        mul = self.difficulty
-        if self.invincible_timer > 0:
-            mul *= 1.35
-        if self.slow_timer > 0:
-            mul *= 0.6
-        return max(0.4, min(mul, 3.0))
-
-    def update_horse(self, dt: float) -> None:
-        self.horse["vy"] += self.gravity * dt
-        self.horse["y"] += self.horse["vy"] * dt
-        if self.horse["y"] >= self.ground_y - self.horse["h"]:
-            self.horse["y"] = self.ground_y - self.horse["h"]
-            self.horse["vy"] = 0.0
-            self.horse["on_ground"] = True
-            self.air_jumps_used = 0
-        else:
-            self.horse["on_ground"] = False
-
-    def update_obstacles(self, dt: float) -> None:
-        speed_mul = self.world_speed_multiplier()
-        for obs in self.obstacles:
-            obs["x"] -= obs["speed"] * dt * speed_mul
-        self.obstacles = [o for o in self.obstacles if o["x"] + o["w"] > -30]
-
-    def update_fireworks(self, dt: float) -> None:
-        spawn_rate = 0.02 if self.visual_mode != 2 else 0.006
-        if random.random() < spawn_rate:
-            self.spawn_firework()
-        alive = []
-        for fw in self.fireworks:
-            particles = []
-            for p in fw["particles"]:
-                p["x"] += p["vx"] * dt
-                p["y"] += p["vy"] * dt
-                p["vy"] += 220 * dt
-                p["life"] -= dt
-                if p["life"] > 0:
-                    particles.append(p)
-            if particles:
-                fw["particles"] = particles
-                alive.append(fw)
-        self.fireworks = alive
-
-    def update_air_stars(self, dt: float) -> None:
-        speed_mul = self.world_speed_multiplier()
-        hx = self.horse["x"] + self.horse["w"] * 0.5
-        hy = self.horse["y"] + self.horse["h"] * 0.5
-        for s in self.air_stars:
-            s["x"] -= s["speed"] * dt * speed_mul
-            if self.magnet_timer > 0:
-                dx = hx - s["x"]
-                dy = hy - s["y"]
-                dist = math.hypot(dx, dy) + 0.01
-                pull = 260 * dt
-                s["x"] += dx / dist * pull
-                s["y"] += dy / dist * pull
-        self.air_stars = [s for s in self.air_stars if s["x"] > -40]
-
-    def update_powerups(self, dt: float) -> None:
-        speed_mul = self.world_speed_multiplier()
-        for p in self.powerups:
-            p["x"] -= p["speed"] * dt * speed_mul
-        self.powerups = [p for p in self.powerups if p["x"] > -50]
-
-    def check_collisions(self) -> None:
-        hx, hy, hw, hh = self.horse["x"], self.horse["y"], self.horse["w"], self.horse["h"]
-        hit_h = hh * (0.6 if self.slide_timer > 0 else 1.0)
-        hit_y = hy + (hh - hit_h)
-        invulnerable = self.invincible_timer > 0
-        if not invulnerable:
-            for obs in self.obstacles:
-                ox, oy, ow, oh = obs["x"], obs["y"], obs["w"], obs["h"]
-                if hx < ox + ow and hx + hw > ox and hit_y < oy + oh and hit_y + hit_h > oy:
-                    if self.shield:
-                        self.shield = False
-                        self.invincible_timer = max(self.invincible_timer, 1.2)
-                        self.status_text = "陈思颖: 护盾破碎！"
-                        return
-                    self._end_game("hit")
-                    return
-
-        collected = []
-        for s in self.air_stars:
-            sx, sy, ss = s["x"], s["y"], s["size"]
-            if hx < sx + ss and hx + hw > sx - ss and hit_y < sy + ss and hit_y + hit_h > sy - ss:
-                collected.append(s)
-        if collected:
-            for s in collected:
-                self.air_stars.remove(s)
-            score_gain = len(collected) * (2 if self.double_score_timer > 0 else 1)
-            self.score += score_gain
-            self.total_stars += len(collected)
-            self.star_combo += len(collected)
-            self.star_combo_timer = 1.8
-            if self.score >= 10:
-                self.score = 0
-                self.invincible_timer = 5.0
-                self.status_text = "陈思颖: 星光护体，5秒无敌！"
-                self._play_sound("invincible")
-            if self.total_stars >= 10:
-                self._set_achievement("十星初成")
-            if self.star_combo >= 5:
-                self._set_achievement("星光连击")
-
-        collected_powerups = []
-        for p in self.powerups:
-            px, py, ps = p["x"], p["y"], p["size"]
-            if hx < px + ps and hx + hw > px - ps and hit_y < py + ps and hit_y + hit_h > py - ps:
-                collected_powerups.append(p)
-        if collected_powerups:
-            for p in collected_powerups:
-                self.powerups.remove(p)
-                self.apply_powerup(p["kind"])
-
-    def nearest_hint(self) -> str:
-        hx = self.horse["x"] + self.horse["w"]
-        ahead = [o for o in self.obstacles if o["x"] + o["w"] >= hx]
-        if not ahead:
-            return "陈思颖: 保持节奏"
-        nearest = min(ahead, key=lambda o: o["x"])
-        distance = nearest["x"] - hx
-        if distance < 60:
-            return "陈思颖: 贴近了，小心！"
-        if self.horse["on_ground"] and distance < 220:
-            return "陈思颖: 准备跳！"
-        return "陈思颖: 观察前方，寻找创造路"
-
-    def _set_achievement(self, title: str) -> None:
-        if title in self.achievements:
+        self.wake()
+        self.post_input(GESTURE_ACTIONS[gesture])
+
+    def release_resources(self) -> None:
+        """切到后台：停帧、自动暂停，释放纹理与音频缓冲。"""
+        self.suspended = True
+        self.gestures.cancel()
+        if self.tick_event is not None:
+            self.tick_event.cancel()
+            self.tick_event = None
+        # 线程模式先让 worker 停在两步之间，再直接改它的局面
+        if self.worker is not None:
+            self.worker.suspend()
+        sim = self.sim
+        if sim.running and not sim.paused:
+            sim.paused = True
+            sim.status_text = "陈思颖: 暂停"
+        # 后台随时可能被杀，先落盘
+        self.save_snapshot()
+        self.telemetry.flush()
+        for sound in self.sounds.values():
+            if sound:
+                sound.stop()
+                sound.unload()
+        self.sounds.clear()
+        self.horse_sheet = None
+        self.horse_cells = {}
+        self.horse_uvs = {}
+        self.gradient_textures.clear()
+        self.layer_textures.clear()
+        self.stamp_fbos.clear()
+        self._forget_display()
+        self.idle_signature = None
+
+    def restore_resources(self) -> None:
+        """回到前台：重新加载资源并恢复帧调度（保持暂停，等玩家继续）。"""
+        if not self.suspended:
             return
-        self.achievements.add(title)
-        self.achievement_text = f"成就达成: {title}"
-        self.achievement_timer = 2.6
-
-    def _end_game(self, reason: str) -> None:
-        self.running = False
-        self.game_over_reason = reason
-        self._update_records()
-        if reason == "hit":
-            self.status_text = "陈思颖: 撞到障碍了，点开始继续"
-            self._play_sound("hit")
-        elif reason == "challenge":
-            self.status_text = "陈思颖: 挑战完成！"
-        elif reason == "timed":
-            self.status_text = "陈思颖: 计时完成！"
-        else:
-            self.status_text = "陈思颖: 本局结束"
-
-    def _update_records(self) -> None:
-        if self.elapsed > self.records["best_time"]:
-            self.records["best_time"] = self.elapsed
-        if self.distance > self.records["best_distance"]:
-            self.records["best_distance"] = self.distance
-        if self.total_stars > self.records["best_score"]:
-            self.records["best_score"] = self.total_stars
-        if self.star_combo > self.records["best_combo"]:
-            self.records["best_combo"] = self.star_combo
-        if self.mode == "timed" and self.total_stars > self.records["best_timed_score"]:
-            self.records["best_timed_score"] = self.total_stars
-        if self.mode == "challenge":
-            if self.game_over_reason == "challenge":
-                if self.records["best_challenge_time"] == 0 or self.elapsed < self.records["best_challenge_time"]:
-                    self.records["best_challenge_time"] = self.elapsed
-        self._save_records()
+        self.suspended = False
+        # 进程没被杀，内存里的局面就是最新的
+        self._discard_snapshot()
+        self._load_assets()
+        if self.worker is not None:
+            self.worker.resume()
+        self.pacer.restart()
+        self._apply_loop_rate()
+        self.tick_event = Clock.schedule_once(self.tick, 0)
+
     def on_size(self, *args) -> None:
         self._update_scale()
 
@@ -592,306 +420,231 @@ class HorseGameWidget(Widget):
         self.scale = min(self.width / self.base_width, self.height / self.base_height)
         self.x_offset = (self.width - self.base_width * self.scale) / 2
         self.y_offset = (self.height - self.base_height * self.scale) / 2
+        # 换算比例变了，所有图元与障碍贴图都要按新坐标重建
+        self.stamp_fbos.clear()
+        self._forget_display()
 
     def _to_screen(self, x, y, w=0, h=0):
         sx = self.x_offset + x * self.scale
         sy = self.y_offset + (self.base_height - y - h) * self.scale
         return sx, sy
 
-    def _color(self, hex_color: str):
-        hex_color = hex_color.lstrip("#")
-        r = int(hex_color[0:2], 16) / 255.0
-        g = int(hex_color[2:4], 16) / 255.0
-        b = int(hex_color[4:6], 16) / 255.0
-        return r, g, b
+    def _screen_points(self, points):
+        scaled = []
+        for i in range(0, len(points), 2):
+            scaled.extend(self._to_screen(points[i], points[i + 1]))
+        return scaled
+
+    def _line_width(self, width):
+        # Kivy 的线宽约为 Tk 的两倍粗细
+        return max(1.0, width * self.scale / 2)
+
+    def _gradient_texture(self, stops):
+        """每种色带只建一次 1 像素宽的纹理，拉伸画成一个矩形。"""
+        texture = self.gradient_textures.get(stops)
+        if texture is None:
+            texture = Texture.create(size=(1, len(stops)), colorfmt="rgba")
+            # 纹理原点在左下，色带自上而下，按行倒序写入
+            data = bytes(int(round(c * 255)) for stop in reversed(stops) for c in stop.rgba)
+            texture.blit_buffer(data, colorfmt="rgba", bufferfmt="ubyte")
+            texture.mag_filter = "nearest"
+            self.gradient_textures[stops] = texture
+        return texture
+
+    def _layer_texture(self, cmd):
+        """视差层图块做成可重复的纹理；高度补到 2 的幂，GLES2 才允许 repeat。"""
+        key = (cmd.key, cmd.theme, int(cmd.h))
+        texture = self.layer_textures.get(key)
+        if texture is None:
+            strip = layer_tile(cmd.key, cmd.theme, int(cmd.h))
+            height = 1
+            while height < strip.height:
+                height *= 2
+            texture = Texture.create(size=(strip.width, height), colorfmt="rgba")
+            texture.wrap = "repeat"
+            texture.mag_filter = "nearest"
+            texture.min_filter = "nearest"
+            texture.blit_buffer(
+                b"".join(strip.rows(bottom_up=True)),
+                size=(strip.width, strip.height),
+                colorfmt="rgba",
+                bufferfmt="ubyte",
+            )
+            self.layer_textures[key] = texture
+        return texture
+
+    def _stamp_texture(self, sprite):
+        """障碍贴图按配方渲染进 Fbo 一次，按 LRU 保留 STAMP_CACHE 张。"""
+        fbo = self.stamp_fbos.get(sprite)
+        if fbo is not None:
+            self.stamp_fbos.move_to_end(sprite)
+            return fbo.texture
+        w, h = stamp_size(sprite)
+        fbo = Fbo(size=(max(1, int(w * self.scale)), max(1, int(h * self.scale))))
+        with fbo:
+            ClearColor(0, 0, 0, 0)
+            ClearBuffers()
+            # 沿用画面的坐标换算，再平移回 Fbo 原点
+            Translate(-self.x_offset, -self.y_offset - (self.base_height - h) * self.scale)
+        for part in obstacle_recipe(sprite):
+            group = InstructionGroup()
+            self._fill_group(group, part)
+            fbo.add(group)
+        fbo.draw()
+        self.stamp_fbos[sprite] = fbo
+        if len(self.stamp_fbos) > STAMP_CACHE:
+            self.stamp_fbos.popitem(last=False)
+        return fbo.texture
+
+    def _fill_group(self, group, cmd) -> None:
+        """把一条显示列表命令翻译成 Kivy 指令。"""
+        if isinstance(cmd, LineCommand):
+            group.add(Color(*cmd.color.rgba))
+            group.add(Line(points=self._screen_points(cmd.points), width=self._line_width(cmd.width)))
+            return
+        if isinstance(cmd, Poly):
+            # 以中心为扇心画三角扇（星星和马耳都是以中心为星形的多边形）
+            points = self._screen_points(cmd.points)
+            count = len(points) // 2
+            cx = sum(points[0::2]) / count
+            cy = sum(points[1::2]) / count
+            vertices = [cx, cy, 0, 0]
+            for i in range(count):
+                vertices.extend([points[2 * i], points[2 * i + 1], 0, 0])
+            group.add(Color(*cmd.fill.rgba))
+            group.add(Mesh(vertices=vertices, indices=list(range(count + 1)) + [1], mode="triangle_fan"))
+            return
+        if isinstance(cmd, Stamp):
+            w, h = stamp_size(cmd.sprite)
+            group.add(Color(1, 1, 1, 1))
+            group.add(
+                Rectangle(
+                    pos=self._to_screen(cmd.x, cmd.y, w, h),
+                    size=(w * self.scale, h * self.scale),
+                    texture=self._stamp_texture(cmd.sprite),
+                )
+            )
+            return
+        if isinstance(cmd, Text):
+            # 只在渲染障碍贴图时出现；Tk 的字号是磅，换成像素
+            kwargs = {"font_name": self.label_font} if self.label_font else {}
+            label = CoreLabel(text=cmd.text, font_size=cmd.size * 4 / 3 * self.scale, bold=cmd.bold, **kwargs)
+            label.refresh()
+            texture = label.texture
+            sx, sy = self._to_screen(cmd.x, cmd.y)
+            group.add(Color(*cmd.color.rgba))
+            group.add(Rectangle(pos=(sx - texture.width / 2, sy - texture.height / 2), size=texture.size, texture=texture))
+            return
+        if isinstance(cmd, Layer):
+            # 一层一个矩形，滚动只移纹理坐标
+            texture = self._layer_texture(cmd)
+            u0 = cmd.offset / texture.width
+            u1 = u0 + cmd.w / texture.width
+            v1 = cmd.h / texture.height
+            group.add(Color(1, 1, 1, 1))
+            group.add(
+                Rectangle(
+                    pos=self._to_screen(0, cmd.y, cmd.w, cmd.h),
+                    size=(cmd.w * self.scale, cmd.h * self.scale),
+                    texture=texture,
+                    tex_coords=(u0, 0, u1, 0, u1, v1, u0, v1),
+                )
+            )
+            return
+        pos = self._to_screen(cmd.x, cmd.y, cmd.w, cmd.h)
+        size = (cmd.w * self.scale, cmd.h * self.scale)
+        if isinstance(cmd, Gradient):
+            group.add(Color(1, 1, 1, 1))
+            group.add(Rectangle(pos=pos, size=size, texture=self._gradient_texture(cmd.stops)))
+        elif isinstance(cmd, Sprite):
+            rect = Rectangle(pos=pos, size=size, texture=self.horse_sheet, tex_coords=self.horse_uvs[cmd.frame])
+            group.add(Color(1, 1, 1, 1))
+            group.add(rect)
+            self.sprite_rects[cmd.key] = rect
+        elif isinstance(cmd, Ghost):
+            group.add(Color(*cmd.color.rgba[:3], cmd.alpha))
+            if "main" in self.horse_uvs:
+                group.add(Rectangle(pos=pos, size=size, texture=self.horse_sheet, tex_coords=self.horse_uvs["main"]))
+            else:
+                group.add(Rectangle(pos=pos, size=size))
+        elif isinstance(cmd, (Rect, Oval)):
+            if cmd.fill:
+                group.add(Color(*cmd.fill.rgba))
+                group.add(Rectangle(pos=pos, size=size) if isinstance(cmd, Rect) else Ellipse(pos=pos, size=size))
+            if cmd.outline:
+                group.add(Color(*cmd.outline.rgba))
+                shape = "rectangle" if isinstance(cmd, Rect) else "ellipse"
+                group.add(Line(**{shape: (pos[0], pos[1], size[0], size[1])}, width=self._line_width(cmd.width)))
+
+    def _forget_display(self) -> None:
+        self.canvas.clear()
+        self.shown = {}
+        self.canvas_groups.clear()
+        self.sprite_rects.clear()
 
     def draw(self) -> None:
-        self.canvas.clear()
-        profile = self.visual_profiles[self.visual_mode]
-        band_h = self.base_height / len(profile["sky"])
-        with self.canvas:
-            for i, color in enumerate(profile["sky"]):
-                r, g, b = self._color(color)
-                Color(r, g, b)
-                sx, sy = self._to_screen(0, i * band_h, self.base_width, band_h)
-                Rectangle(pos=(sx, sy), size=(self.base_width * self.scale, band_h * self.scale))
-
-            r, g, b = self._color(profile["ground"])
-            Color(r, g, b)
-            sx, sy = self._to_screen(0, self.ground_y, self.base_width, self.base_height - self.ground_y)
-            Rectangle(pos=(sx, sy), size=(self.base_width * self.scale, (self.base_height - self.ground_y) * self.scale))
-
-            r, g, b = self._color(profile["grid"])
-            Color(r, g, b)
-            for x in range(0, int(self.base_width + 1), 50):
-                x1, y1 = self._to_screen(x, self.ground_y, 0, 0)
-                x2, y2 = self._to_screen(x - 40, self.base_height, 0, 0)
-                Line(points=[x1, y1, x2, y2], width=1)
-
-            r, g, b = self._color(profile["line"])
-            Color(r, g, b)
-            x1, y1 = self._to_screen(0, self.ground_y, 0, 0)
-            x2, y2 = self._to_screen(self.base_width, self.ground_y, 0, 0)
-            Line(points=[x1, y1, x2, y2], width=2)
-
-            r, g, b = self._color(profile["glow"])
-            Color(r, g, b)
-            for x in range(20, int(self.base_width), 40):
-                sx, sy = self._to_screen(x - 2, self.ground_y + 10, 4, 4)
-                Ellipse(pos=(sx, sy), size=(4 * self.scale, 4 * self.scale))
-
-            self._draw_lanterns()
-            self._draw_fireworks()
-            self._draw_obstacles()
-            self._draw_horse()
-            self._draw_powerups()
-            self._draw_stars()
-
-    def _draw_lanterns(self) -> None:
-        rope_y = 26
-        r, g, b = self._color("#fcbf49")
-        Color(r, g, b)
-        x1, y1 = self._to_screen(14, rope_y, 0, 0)
-        x2, y2 = self._to_screen(self.base_width / 2 - 90, rope_y, 0, 0)
-        Line(points=[x1, y1, x2, y2], width=2)
-        x3, y3 = self._to_screen(self.base_width / 2 + 90, rope_y, 0, 0)
-        x4, y4 = self._to_screen(self.base_width - 14, rope_y, 0, 0)
-        Line(points=[x3, y3, x4, y4], width=2)
-        for lantern in self.top_lanterns:
-            x = lantern["x"]
-            y = lantern["y"]
-            size = lantern["size"]
-            w = size * 1.15
-            h = size
-            r, g, b = self._color("#e63946")
-            Color(r, g, b)
-            sx, sy = self._to_screen(x - w / 2, y - h / 2, w, h)
-            Ellipse(pos=(sx, sy), size=(w * self.scale, h * self.scale))
-            r, g, b = self._color("#ffb703")
-            Color(r, g, b)
-            sx, sy = self._to_screen(x - 6, y - h / 2 - 6, 12, 12)
-            Rectangle(pos=(sx, sy), size=(12 * self.scale, 12 * self.scale))
-            r, g, b = self._color("#fcbf49")
-            Color(r, g, b)
-            x1, y1 = self._to_screen(x, y + h / 2, 0, 0)
-            x2, y2 = self._to_screen(x, y + h / 2 + 16, 0, 0)
-            Line(points=[x1, y1, x2, y2], width=2)
-
-    def _draw_fireworks(self) -> None:
-        for fw in self.fireworks:
-            r, g, b = self._color(fw["color"])
-            Color(r, g, b)
-            for p in fw["particles"]:
-                size = max(2, 5 * p["life"])
-                sx, sy = self._to_screen(p["x"] - size, p["y"] - size, size * 2, size * 2)
-                Ellipse(pos=(sx, sy), size=(size * 2 * self.scale, size * 2 * self.scale))
-
-    def _draw_obstacles(self) -> None:
-        for obs in self.obstacles:
-            x, y, w, h = obs["x"], obs["y"], obs["w"], obs["h"]
-            if obs["theme"] == "fence":
-                r, g, b = self._color("#d9d9d9")
-                Color(r, g, b)
-                sx, sy = self._to_screen(x, y, w, h)
-                Rectangle(pos=(sx, sy), size=(w * self.scale, h * self.scale))
-                r, g, b = self._color("#8c8c8c")
-                Color(r, g, b)
-                for bar in range(3):
-                    yy = y + h * (bar + 1) / 4
-                    x1, y1 = self._to_screen(x, yy, 0, 0)
-                    x2, y2 = self._to_screen(x + w, yy, 0, 0)
-                    Line(points=[x1, y1, x2, y2], width=2)
-            elif obs["theme"] == "data":
-                r, g, b = self._color("#3bd8c0")
-                Color(r, g, b)
-                sx, sy = self._to_screen(x, y, w, h)
-                Rectangle(pos=(sx, sy), size=(w * self.scale, h * self.scale))
-            elif obs["theme"] == "lantern":
-                r, g, b = self._color("#e63946")
-                Color(r, g, b)
-                sx, sy = self._to_screen(x, y, w, h)
-                Ellipse(pos=(sx, sy), size=(w * self.scale, h * self.scale))
-                r, g, b = self._color("#ffb703")
-                Color(r, g, b)
-                sx, sy = self._to_screen(x + w * 0.45, y - 10, w * 0.1, 18)
-                Rectangle(pos=(sx, sy), size=(w * 0.1 * self.scale, 18 * self.scale))
+        """生成本帧显示列表，只重建与上一帧不同的指令组（文字由 HUD 控件负责）。"""
+        commands = build_display_list(self, self.horse_cells, labels=False, hud=False)
+        changes = diff(self.shown, commands)
+        if changes is None:
+            self._forget_display()
+            changes = diff({}, commands)
+        for key in changes.removed:
+            self.canvas.remove(self.canvas_groups.pop(key))
+            self.sprite_rects.pop(key, None)
+        for cmd in changes.changed:
+            if isinstance(cmd, Sprite) and cmd.key in self.sprite_rects:
+                # 换帧或移动：同一个矩形只改位置与 UV，纹理不换
+                rect = self.sprite_rects[cmd.key]
+                rect.pos = self._to_screen(cmd.x, cmd.y, cmd.w, cmd.h)
+                rect.size = (cmd.w * self.scale, cmd.h * self.scale)
+                rect.tex_coords = self.horse_uvs[cmd.frame]
+                continue
+            group = self.canvas_groups[cmd.key]
+            group.clear()
+            self._fill_group(group, cmd)
+        for cmd, before in changes.added:
+            group = InstructionGroup()
+            self._fill_group(group, cmd)
+            if before is None:
+                self.canvas.add(group)
             else:
-                r, g, b = self._color("#f45b69")
-                Color(r, g, b)
-                sx, sy = self._to_screen(x, y, w, h)
-                Rectangle(pos=(sx, sy), size=(w * self.scale, h * self.scale))
-
-    def _draw_horse(self) -> None:
-        x, y, w, h = self.horse["x"], self.horse["y"], self.horse["w"], self.horse["h"]
-        texture = None
-        if self.invincible_timer > 0 and self.horse_textures.get("defend"):
-            texture = self.horse_textures["defend"]
-        elif self.horse_textures.get("main") and self.horse_textures.get("jump") and self.horse["on_ground"]:
-            texture = self.horse_textures["jump"] if int(time.time() * 6) % 2 else self.horse_textures["main"]
-        elif not self.horse["on_ground"] and self.horse_textures.get("jump"):
-            texture = self.horse_textures["jump"]
-        elif self.horse_textures.get("main"):
-            texture = self.horse_textures["main"]
-
-        sx, sy = self._to_screen(x, y, w, h)
-        if texture:
-            Rectangle(pos=(sx, sy), size=(w * self.scale, h * self.scale), texture=texture)
+                self.canvas.insert(self.canvas.indexof(self.canvas_groups[before]), group)
+            self.canvas_groups[cmd.key] = group
+        self.shown = {cmd.key: cmd for cmd in commands}
+
+    def tick(self, _clock_dt: float) -> None:
+        frame_start = time.perf_counter()
+        dt = min(0.05, self.pacer.begin_frame())
+        for gesture in self.gestures.poll(self.clock()):
+            self._post_gesture(gesture)
+
+        if self.worker is not None:
+            # 线程模式：规则在 worker 上跑，这里只取最新发布的快照
+            self.follow_worker()
         else:
-            r, g, b = self._color("#f2c14f")
-            Color(r, g, b)
-            Rectangle(pos=(sx, sy), size=(w * self.scale, h * self.scale))
-
-        if getattr(self, "shield", False):
-            r, g, b = self._color("#80ed99")
-            Color(r, g, b)
-            sx, sy = self._to_screen(x - 6, y - 6, w + 12, h + 12)
-            Ellipse(pos=(sx, sy), size=((w + 12) * self.scale, (h + 12) * self.scale))
-
-    def _draw_stars(self) -> None:
-        for s in self.air_stars:
-            size = s["size"]
-            x = s["x"]
-            y = s["y"]
-            points = []
-            for i in range(5):
-                angle = (i * 72 - 90) * math.pi / 180
-                outer_x = x + math.cos(angle) * size
-                outer_y = y + math.sin(angle) * size
-                inner_angle = angle + 36 * math.pi / 180
-                inner_x = x + math.cos(inner_angle) * size * 0.45
-                inner_y = y + math.sin(inner_angle) * size * 0.45
-                points.extend([outer_x, outer_y, inner_x, inner_y])
-            scaled = []
-            for i in range(0, len(points), 2):
-                sx, sy = self._to_screen(points[i], points[i + 1], 0, 0)
-                scaled.extend([sx, sy])
-            r, g, b = self._color("#fff3b0")
-            Color(r, g, b)
-            Line(points=scaled, close=True, width=1.5)
-
-    def _draw_powerups(self) -> None:
-        style = {
-            "slow": ("#7bdff2", "慢"),
-            "shield": ("#80ed99", "盾"),
-            "magnet": ("#f4acb7", "吸"),
-            "double": ("#f9c74f", "倍"),
-        }
-        for p in self.powerups:
-            color, _ = style.get(p["kind"], ("#ffffff", "?"))
-            size = p["size"]
-            x = p["x"]
-            y = p["y"]
-            r, g, b = self._color(color)
-            Color(r, g, b)
-            sx, sy = self._to_screen(x - size, y - size, size * 2, size * 2)
-            Ellipse(pos=(sx, sy), size=(size * 2 * self.scale, size * 2 * self.scale))
-    def tick(self, dt: float) -> None:
-        now = time.time()
-        dt = min(0.05, now - self.last_time)
-        self.last_time = now
-
-        if self.preparing_start:
-            self.countdown_timer = max(0.0, self.countdown_timer - dt)
-            if self.countdown_timer <= 0:
-                self.preparing_start = False
-                self.awaiting_start = False
-                self.running = True
-                self.start_time = time.time()
-                self.status_text = "陈思颖: 起跑！"
-
-        if self.running and not self.paused:
-            self.elapsed = now - self.start_time
-            if self.mode != "challenge":
-                self.difficulty = 1.0 + min(self.elapsed / 38.0, 2.2)
-            else:
-                self.difficulty = 1.0
-            new_stage = int(self.elapsed // 20)
-            if self.mode != "challenge" and new_stage > self.stage:
-                self.stage = new_stage
-                self.status_text = "陈思颖: 节奏升级！"
-
-            speed_mul = self.world_speed_multiplier()
-            self.distance += dt * 6.5 * speed_mul
-
-            if self.mode == "challenge":
-                self.challenge_timer -= dt
-                if self.challenge_index < len(self.challenge_pattern) and self.challenge_timer <= 0:
-                    config = self.challenge_pattern[self.challenge_index]
-                    self.spawn_obstacle(config)
-                    self.challenge_index += 1
-                    if self.challenge_index < len(self.challenge_pattern):
-                        self.challenge_timer = self.challenge_pattern[self.challenge_index]["delay"]
-            else:
-                self.spawn_timer -= dt
-                if self.spawn_timer <= 0:
-                    self.spawn_obstacle()
-
-            self.star_spawn_timer -= dt
-            if self.star_spawn_timer <= 0:
-                self.spawn_star()
-                self.star_spawn_timer = random.uniform(0.7, 1.3)
-
-            self.powerup_spawn_timer -= dt
-            if self.powerup_spawn_timer <= 0:
-                self.spawn_powerup()
-                self.powerup_spawn_timer = random.uniform(4.0, 6.5)
-
-            self.update_horse(dt)
-            self.update_obstacles(dt)
-            self.update_fireworks(dt)
-            self.update_air_stars(dt)
-            self.update_powerups(dt)
-            self.check_collisions()
-
-            if self.invincible_timer > 0:
-                self.invincible_timer = max(0.0, self.invincible_timer - dt)
-            if self.slow_timer > 0:
-                self.slow_timer = max(0.0, self.slow_timer - dt)
-            if self.magnet_timer > 0:
-                self.magnet_timer = max(0.0, self.magnet_timer - dt)
-            if self.double_score_timer > 0:
-                self.double_score_timer = max(0.0, self.double_score_timer - dt)
-            if self.slide_timer > 0:
-                self.slide_timer = max(0.0, self.slide_timer - dt)
-            if self.slide_cooldown > 0:
-                self.slide_cooldown = max(0.0, self.slide_cooldown - dt)
-            if self.star_combo_timer > 0:
-                self.star_combo_timer = max(0.0, self.star_combo_timer - dt)
-                if self.star_combo_timer == 0:
-                    self.star_combo = 0
-            if self.achievement_timer > 0:
-                self.achievement_timer = max(0.0, self.achievement_timer - dt)
-            if self.hint_sound_cooldown > 0:
-                self.hint_sound_cooldown = max(0.0, self.hint_sound_cooldown - dt)
-
-            if self.jumps >= 15:
-                self._set_achievement("连跳达人")
-            if self.elapsed >= 30:
-                self._set_achievement("无伤30秒")
-
-            if self.mode == "timed" and self.elapsed >= self.time_limit:
-                self._set_achievement("计时胜利")
-                self._end_game("timed")
-            if self.mode == "challenge" and self.challenge_index >= len(self.challenge_pattern) and not self.obstacles:
-                self._set_achievement("挑战通关")
-                self._end_game("challenge")
-
-            new_hint = self.nearest_hint()
-            if new_hint != self.current_hint:
-                self.current_hint = new_hint
-                if self.hint_sound_cooldown <= 0:
-                    hint_map = {
-                        "陈思颖: 保持节奏": "hint_keep",
-                        "陈思颖: 准备跳！": "hint_ready",
-                        "陈思颖: 贴近了，小心！": "hint_caution",
-                        "陈思颖: 观察前方，寻找创造路": "hint_observe",
-                    }
-                    key = hint_map.get(new_hint)
-                    if key:
-                        self._play_sound(key)
-                        self.hint_sound_cooldown = 1.0
-
-        self.draw()
+            self.step(dt)
+        self._drain_sounds()
+        loading = self._pump_assets()
+
+        # 空闲时画面不变就不重建画布，Kivy 也就不会重绘窗口
+        idle = self.is_idle()
+        view = self._idle_view() if idle else None
+        if not idle or loading or view != self.idle_signature:
+            self.draw()
+        self.idle_signature = view
+        if self.hud_callback is not None and self.pacer.hud_due():
+            self.hud_callback()
+        frame_time = time.perf_counter() - frame_start
+        if not idle:
+            self.quality.record(frame_time)
+        self.telemetry.record(frame_time, dt, self, self.world_speed_multiplier(), idle, self.pacer.target_hz)
+        # 载入期间保持正常帧率，资源按帧收尾得更快
+        paced_idle = idle and not loading
+        if paced_idle != self.pacer.idle:
+            self.pacer.set_idle(paced_idle)
+            self._apply_loop_rate()
+        self.tick_event = Clock.schedule_once(self.tick, self.pacer.next_delay())
 
 
 class HorseGameApp(App):
@@ -910,19 +663,74 @@ class HorseGameApp(App):
                 return path
         return None
 
+    def _make_versus(self):
+        # 对战模式通过环境变量开启：HORSE_VERSUS_PORT=47310 HORSE_VERSUS_PEER=127.0.0.1:47311
+        port = os.environ.get("HORSE_VERSUS_PORT")
+        if not port:
+            return None
+        # 对战与观战依赖 asyncio，只在用到时导入
+        from versus import VersusPeer, parse_peer
+
+        peer = VersusPeer(
+            int(port),
+            parse_peer(os.environ.get("HORSE_VERSUS_PEER", "127.0.0.1:47311")),
+            latency=float(os.environ.get("HORSE_VERSUS_LATENCY", "0")),
+            loss=float(os.environ.get("HORSE_VERSUS_LOSS", "0")),
+        )
+        peer.start()
+        return peer
+
     def build(self):
         layout = FloatLayout()
-        self.game = HorseGameWidget()
+        self.layout = layout
+        self.versus = self._make_versus()
+        seed = os.environ.get("HORSE_SEED")
+        if seed is None and self.versus is not None:
+            seed = "2026"
+        # 观战：HORSE_SPECTATE_PORT=47320 广播本局；HORSE_WATCH=127.0.0.1:47320 镜像别人的对局
+        self.spectators = None
+        if os.environ.get("HORSE_SPECTATE_PORT"):
+            from spectate import SpectatorServer
+
+            self.spectators = SpectatorServer(int(os.environ["HORSE_SPECTATE_PORT"]))
+            self.spectators.start()
+        self.watcher = None
+        if os.environ.get("HORSE_WATCH"):
+            from spectate import SpectatorClient, parse_addr
+
+            self.watcher = SpectatorClient(parse_addr(os.environ["HORSE_WATCH"]))
+            self.watcher.start()
+        self.game = HorseGameWidget(
+            seed=int(seed) if seed is not None else None,
+            versus=self.versus,
+            spectators=self.spectators,
+            watcher=self.watcher,
+            # HORSE_THREADED=1：规则放到独立线程，主线程只负责绘制
+            threaded=os.environ.get("HORSE_THREADED") == "1",
+        )
+        # HORSE_GHOST=路径：与这条幽灵轨迹比赛（python -m horsegame replay --backend kivy）
+        track = load_ghost(os.environ["HORSE_GHOST"]) if os.environ.get("HORSE_GHOST") else None
+        if track is not None:
+            self.game.use_ghost(track)
+        # HORSE_JUMP_BUFFER / HORSE_COYOTE：跳跃缓冲与土狼时间（毫秒）
+        self.game.set_input_windows(
+            float(os.environ.get("HORSE_JUMP_BUFFER", self.game.jump_buffer * 1000)) / 1000.0,
+            float(os.environ.get("HORSE_COYOTE", self.game.coyote_time * 1000)) / 1000.0,
+        )
         layout.add_widget(self.game)
         self.ui_font = self._resolve_ui_font()
+        self.game.label_font = self.ui_font
         ui_kwargs = {"font_name": self.ui_font} if self.ui_font else {}
 
-        self.stats_label = Label(text="", size_hint=(1, None), height=40, pos_hint={"x": 0, "top": 1}, **ui_kwargs)
-        self.best_label = Label(text="", size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.95}, **ui_kwargs)
-        self.controls_label = Label(text="", size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.9}, **ui_kwargs)
-        self.effects_label = Label(text="", size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.85}, **ui_kwargs)
-        self.status_label = Label(text="", size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.8}, **ui_kwargs)
-        self.achievement_label = Label(text="", size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.75}, **ui_kwargs)
+        # 每帧会变的 HUD 文字从字形图集取四边形绘制，改数字不再重新生成纹理
+        self.hud_atlas = GlyphAtlas(self.ui_font)
+        atlas = self.hud_atlas
+        self.stats_label = AtlasLabel(atlas, size_hint=(1, None), height=40, pos_hint={"x": 0, "top": 1})
+        self.best_label = AtlasLabel(atlas, size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.95})
+        self.controls_label = AtlasLabel(atlas, size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.9})
+        self.effects_label = AtlasLabel(atlas, size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.85})
+        self.status_label = AtlasLabel(atlas, size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.8})
+        self.achievement_label = AtlasLabel(atlas, size_hint=(1, None), height=30, pos_hint={"x": 0, "top": 0.75})
 
         for label in [
             self.stats_label,
@@ -935,41 +743,68 @@ class HorseGameApp(App):
             layout.add_widget(label)
 
         self.start_label = Label(text="准备就绪再出发", size_hint=(1, None), height=40, pos_hint={"x": 0, "center_y": 0.6}, **ui_kwargs)
-        self.countdown_label = Label(text="", size_hint=(1, None), height=60, pos_hint={"x": 0, "center_y": 0.5}, **ui_kwargs)
+        self.countdown_label = AtlasLabel(atlas, size_hint=(1, None), height=60, pos_hint={"x": 0, "center_y": 0.5})
         self.start_button = Button(text="点击开始", size_hint=(None, None), size=(180, 50), pos_hint={"center_x": 0.5, "center_y": 0.4}, **ui_kwargs)
-        self.start_button.bind(on_press=lambda *_: self.game.start_countdown())
+        self.start_button.bind(on_press=lambda *_: self._start_pressed())
 
         self.pause_button = Button(text="暂停", size_hint=(None, None), size=(120, 44), pos_hint={"x": 0.02, "top": 0.98}, **ui_kwargs)
-        self.pause_button.bind(on_press=lambda *_: self.game.toggle_pause())
+        self.pause_button.bind(on_press=lambda *_: self._pause_pressed())
         self.mode_button = Button(text="模式", size_hint=(None, None), size=(120, 44), pos_hint={"right": 0.98, "top": 0.98}, **ui_kwargs)
-        self.mode_button.bind(on_press=lambda *_: self.game.cycle_mode())
-        self.jump_button = Button(text="跳", size_hint=(None, None), size=(120, 80), pos_hint={"x": 0.04, "y": 0.04}, **ui_kwargs)
-        self.jump_button.bind(on_press=lambda *_: self.game.handle_jump())
-        self.slide_button = Button(text="滑", size_hint=(None, None), size=(120, 80), pos_hint={"right": 0.96, "y": 0.04}, **ui_kwargs)
-        self.slide_button.bind(on_press=lambda *_: self.game.handle_slide())
+        self.mode_button.bind(on_press=lambda *_: self._mode_pressed())
+        # 跳跃与滑行走游戏画面上的全屏手势（HorseGameWidget.on_touch_*），不再占固定按钮区域
 
-        for widget in [self.start_label, self.countdown_label, self.start_button, self.pause_button, self.mode_button, self.jump_button, self.slide_button]:
+        for widget in [self.start_label, self.countdown_label, self.start_button, self.pause_button, self.mode_button]:
             layout.add_widget(widget)
 
         Window.bind(on_key_down=self._on_key_down)
-        Clock.schedule_interval(self._sync_ui, 1 / 30)
+        # HUD 由游戏帧驱动刷新，与画面保持同一帧
+        self.game.hud_callback = self._sync_ui
         return layout
 
+    def on_stop(self):
+        if self.game.worker is not None:
+            self.game.worker.stop()
+        for service in (self.versus, self.spectators, self.watcher):
+            if service is not None:
+                service.stop()
+        self.game.telemetry.close()
+        Logger.info(f"HorseGame: frame pacing {self.game.pacer.summary()}")
+
+    def on_pause(self):
+        # Android 切后台：释放 GPU 纹理和音频缓冲，允许系统挂起
+        self.game.release_resources()
+        return True
+
+    def on_resume(self):
+        self.game.restore_resources()
+
+    def _start_pressed(self):
+        self.game.wake()
+        self.game.post_input("start")
+
+    def _pause_pressed(self):
+        self.game.wake()
+        self.game.post_input("pause")
+
+    def _mode_pressed(self):
+        self.game.wake()
+        self.game.post_input("mode")
+
     def _on_key_down(self, _window, key, scancode, codepoint, modifiers):
+        self.game.wake()
+        if self.game.watcher is not None:
+            return True
         if key == 13:
-            if self.game.awaiting_start and not self.game.preparing_start:
-                self.game.start_countdown()
-                return True
-            self.game.toggle_pause()
+            self.game.post_input("confirm")
             return True
         if key == 32:
-            self.game.handle_jump()
+            self.game.post_input("jump")
             return True
         if codepoint in ("s", "S"):
-            self.game.handle_slide()
+            self.game.post_input("slide")
             return True
         if codepoint in ("m", "M"):
-            self.game.cycle_mode()
+            self.game.post_input("mode")
             return True
         if codepoint in ("c", "C"):
             self.game.cycle_visual_mode()
@@ -977,55 +812,50 @@ class HorseGameApp(App):
         if codepoint in ("v", "V"):
             self.game.toggle_volume()
             return True
+        if codepoint in ("f", "F"):
+            self.game.cycle_frame_rate()
+            return True
+        if codepoint in ("p", "P"):
+            self.game.post_input("practice")
+            return True
         if codepoint in ("r", "R"):
-            self.game.reset()
+            self.game.post_input("reset")
             return True
         return False
 
-    def _sync_ui(self, _dt):
+    def _sync_ui(self):
         game = self.game
-        time_label = f"{game.elapsed:05.2f}s"
-        if game.mode == "timed":
-            remaining = max(0.0, game.time_limit - game.elapsed)
-            time_label = f"{remaining:05.2f}s"
-        stats = f"{game.mode_labels[game.mode]}  时间 {time_label}  跃起 {game.jumps}  星星 {game.total_stars}  距离 {game.distance:05.1f}"
-        if game.mode == "timed":
-            best = f"最佳 计时星星 {game.records['best_timed_score']}  距离 {game.records['best_distance']:.1f}"
-        elif game.mode == "challenge":
-            best_time = game.records["best_challenge_time"]
-            label = f"{best_time:.1f}s" if best_time > 0 else "--"
-            best = f"最佳 挑战用时 {label}  星星 {game.records['best_score']}"
-        else:
-            best = f"最佳 时间 {game.records['best_time']:.1f}s  星星 {game.records['best_score']}  距离 {game.records['best_distance']:.1f}"
-        controls = "空格=起跳  S=滑行  M=模式  C=画面  V=音量  Enter=暂停"
-        effects = []
-        if game.invincible_timer > 0:
-            effects.append(f"无敌 {game.invincible_timer:0.1f}s")
-        if game.slow_timer > 0:
-            effects.append(f"减速 {game.slow_timer:0.1f}s")
-        if game.magnet_timer > 0:
-            effects.append(f"磁吸 {game.magnet_timer:0.1f}s")
-        if game.double_score_timer > 0:
-            effects.append(f"翻倍 {game.double_score_timer:0.1f}s")
-        if getattr(game, "shield", False):
-            effects.append("护盾")
+        stats, best, effects = hud_lines(game)
+        controls = "点按/上划/空格=起跳  下划/S=滑行  M=模式  C=画面  V=音量  F=帧率  P=练习  Enter=暂停"
+        if game.versus is not None:
+            effects = " | ".join(part for part in (effects, game.versus_text()) if part)
+        effects = " | ".join(part for part in (effects, game.spectate_text()) if part)
 
         self.stats_label.text = stats
         self.best_label.text = best
         self.controls_label.text = controls
-        self.effects_label.text = " | ".join(effects)
+        self.effects_label.text = effects
         self.status_label.text = game.status_text
         self.achievement_label.text = game.achievement_text if game.achievement_timer > 0 else ""
 
-        show_start = game.awaiting_start or game.preparing_start
-        self.start_label.opacity = 1 if show_start else 0
-        self.start_label.disabled = not show_start
-        self.start_button.opacity = 1 if game.awaiting_start and not game.preparing_start else 0
-        self.start_button.disabled = not (game.awaiting_start and not game.preparing_start)
-        self.countdown_label.text = str(int(math.ceil(game.countdown_timer))) if game.preparing_start else ""
+        self._show(self.start_label, game.awaiting_start or game.preparing_start)
+        # 开始按钮上显示资源载入进度；载入中也能点，没载到的语音首次播放时补上
+        self.start_button.text = "点击开始" if game.load_progress >= 1 else f"点击开始 {int(game.load_progress * 100)}%"
+        self._show(self.start_button, game.awaiting_start and not game.preparing_start)
+        if not game.preparing_start:
+            self.countdown_label.text = ""
+        else:
+            self.countdown_label.text = "…" if game.waiting_rival else str(int(math.ceil(game.countdown_timer)))
 
         self.pause_button.text = "继续" if game.paused else "暂停"
 
+    def _show(self, widget, visible):
+        """隐藏时把控件摘出布局：禁用或透明的控件仍会吞掉落在它上面的触摸，手势就收不到了。"""
+        if visible and widget.parent is None:
+            self.layout.add_widget(widget)
+        elif not visible and widget.parent is not None:
+            self.layout.remove_widget(widget)
+
 
 if __name__ == "__main__":
     HorseGameApp().run()
@@ -0,0 +1,143 @@
+"""
+Drift-free frame pacing for the horse game.
+
+Frames are scheduled against absolute deadlines on a monotonic clock, so
+timer rounding and per-frame work do not accumulate into drift. Shared by
+the tkinter (horse_game.py) and Kivy (main.py) front-ends.
+"""
+
+import time
+from typing import Any, Callable, Dict
+
+
+class FramePacer:
+    """按目标帧率排程，记录迟到帧统计。"""
+
+    RATES = (30, 60, 120)
+
+    def __init__(
+        self,
+        target_hz: int = 60,
+        hud_hz: int = 30,
+        idle_hz: int = 12,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.clock = clock
+        self.hud_hz = hud_hz
+        self.idle_hz = idle_hz
+        self.idle = False
+        self.target_hz = target_hz
+        self.period = 1.0 / target_hz
+        self.hud_every = 1
+        self.frame_index = 0
+        self.deadline = 0.0
+        self.last_frame = 0.0
+        self.started = False
+        self.late_frames = 0
+        self.dropped_frames = 0
+        self.max_lateness = 0.0
+        self.interval_count = 0
+        self.interval_mean = 0.0
+        self.interval_m2 = 0.0
+        self.set_rate(target_hz)
+
+    def set_rate(self, hz: int) -> None:
+        """切换目标帧率（30/60/120），重新对齐截止时间并清空统计。"""
+        if hz not in self.RATES:
+            raise ValueError(f"unsupported frame rate: {hz}")
+        self.target_hz = hz
+        self.period = 1.0 / hz
+        # HUD 固定在约 hud_hz 刷新，并且总是落在游戏帧上
+        self.hud_every = max(1, round(hz / self.hud_hz))
+        self.started = False
+        self.reset_stats()
+
+    def set_idle(self, idle: bool) -> None:
+        """空闲（暂停/开始页/结算）时降到 idle_hz，恢复时从当前时刻重新对齐。"""
+        if idle == self.idle:
+            return
+        self.idle = idle
+        self.deadline = self.clock()
+
+    def current_hz(self) -> int:
+        return self.idle_hz if self.idle else self.target_hz
+
+    def restart(self) -> None:
+        """长时间停摆（如切到后台）后重新起步，不把停摆算成迟到帧。"""
+        self.started = False
+
+    def cycle_rate(self) -> int:
+        index = self.RATES.index(self.target_hz) if self.target_hz in self.RATES else 0
+        self.set_rate(self.RATES[(index + 1) % len(self.RATES)])
+        return self.target_hz
+
+    def reset_stats(self) -> None:
+        self.late_frames = 0
+        self.dropped_frames = 0
+        self.max_lateness = 0.0
+        self.interval_count = 0
+        self.interval_mean = 0.0
+        self.interval_m2 = 0.0
+
+    def begin_frame(self) -> float:
+        """帧开始时调用，返回距上一帧的真实间隔（秒）。"""
+        now = self.clock()
+        if not self.started:
+            self.started = True
+            self.deadline = now
+            self.last_frame = now - self.period
+        dt = now - self.last_frame
+        self.last_frame = now
+        self.frame_index += 1
+
+        if self.idle:
+            return dt
+        lateness = now - self.deadline
+        if lateness > self.period * 0.25:
+            self.late_frames += 1
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+        # Welford 在线统计帧间隔均值与方差
+        self.interval_count += 1
+        delta = dt - self.interval_mean
+        self.interval_mean += delta / self.interval_count
+        self.interval_m2 += delta * (dt - self.interval_mean)
+        return dt
+
+    def next_delay(self) -> float:
+        """帧结束时调用，返回距下一帧截止时间的等待秒数。"""
+        period = 1.0 / self.idle_hz if self.idle else self.period
+        self.deadline += period
+        now = self.clock()
+        if now > self.deadline:
+            # 落后超过一整帧：跳过错过的时隙，不追帧
+            missed = int((now - self.deadline) / period) + 1
+            if missed > 1:
+                if not self.idle:
+                    self.dropped_frames += missed - 1
+                self.deadline += (missed - 1) * period
+            return 0.0
+        return self.deadline - now
+
+    def hud_due(self) -> bool:
+        return self.idle or self.frame_index % self.hud_every == 0
+
+    def stats(self) -> Dict[str, Any]:
+        jitter = (self.interval_m2 / self.interval_count) ** 0.5 if self.interval_count > 1 else 0.0
+        return {
+            "target_hz": self.target_hz,
+            "frames": self.interval_count,
+            "late_frames": self.late_frames,
+            "dropped_frames": self.dropped_frames,
+            "max_lateness_ms": self.max_lateness * 1000.0,
+            "mean_interval_ms": self.interval_mean * 1000.0,
+            "jitter_ms": jitter * 1000.0,
+        }
+
+    def summary(self) -> str:
+        """当前档位的排程统计，一行文字（切换帧率和退出时输出）。"""
+        s = self.stats()
+        return (
+            f"{s['target_hz']} Hz: {s['frames']} frames, {s['late_frames']} late, {s['dropped_frames']} dropped, "
+            f"max late {s['max_lateness_ms']:.1f} ms, jitter {s['jitter_ms']:.2f} ms"
+        )
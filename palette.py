@@ -0,0 +1,137 @@
+"""
+Precompiled colors for the horse game renderers.
+
+Every color the display list uses is parsed once, at import, into a Swatch
+that carries both the Tk hex string and the Kivy RGBA floats. Visual
+profiles are compiled into VisualTheme bundles (sky gradient included), and
+the obstacle and power-up style tables are compiled the same way, so
+switching the visual mode is a list index and no frame parses a color.
+"""
+
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+
+class Swatch(NamedTuple):
+    """解析好的颜色：Tk 用 hex，Kivy 用 rgba。"""
+
+    hex: str
+    rgba: Tuple[float, float, float, float]
+
+
+_swatches: Dict[str, Swatch] = {}
+
+
+def swatch(hex_color: str) -> Swatch:
+    """#rrggbb → Swatch；同一颜色只解析一次（烟花这类运行时颜色也走缓存）。"""
+    cached = _swatches.get(hex_color)
+    if cached is None:
+        value = hex_color.lstrip("#")
+        rgba = (int(value[0:2], 16) / 255.0, int(value[2:4], 16) / 255.0, int(value[4:6], 16) / 255.0, 1.0)
+        cached = _swatches[hex_color] = Swatch(hex_color, rgba)
+    return cached
+
+
+class VisualTheme(NamedTuple):
+    name: str
+    sky: Tuple[Swatch, ...]  # 天空色带，自上而下
+    ground: Swatch
+    grid: Swatch
+    line: Swatch
+    glow: Swatch
+
+
+VISUAL_PROFILES: List[Dict[str, Any]] = [
+    {
+        "name": "霓红",
+        "sky": ["#22030a", "#3a0a14", "#530e19", "#6e111b", "#8a141b"],
+        "ground": "#2b0a0f",
+        "grid": "#5c1b21",
+        "line": "#d4953f",
+        "glow": "#ffce73",
+    },
+    {
+        "name": "高对比",
+        "sky": ["#05070f", "#0e1326", "#161d3b", "#1b274a", "#23335e"],
+        "ground": "#0b0f1f",
+        "grid": "#2a3864",
+        "line": "#fcbf49",
+        "glow": "#fef3c7",
+    },
+    {
+        "name": "低闪烁",
+        "sky": ["#1c0b12", "#2a0f18", "#36131d", "#421621", "#4e1a25"],
+        "ground": "#250a12",
+        "grid": "#4a1b27",
+        "line": "#d4953f",
+        "glow": "#f4d35e",
+    },
+]
+
+
+def compile_profile(profile: Dict[str, Any]) -> VisualTheme:
+    return VisualTheme(
+        profile["name"],
+        tuple(swatch(color) for color in profile["sky"]),
+        swatch(profile["ground"]),
+        swatch(profile["grid"]),
+        swatch(profile["line"]),
+        swatch(profile["glow"]),
+    )
+
+
+# cycle_visual_mode 只换下标，整套主题已经编译好
+THEMES: List[VisualTheme] = [compile_profile(profile) for profile in VISUAL_PROFILES]
+
+
+class ObstacleStyle(NamedTuple):
+    fill: Swatch
+    outline: Swatch
+    detail: Swatch  # 栅栏横杆 / 数据块的 01 / 灯笼顶盖 / 屋顶
+    label: Swatch
+
+
+OBSTACLE_STYLES: Dict[str, ObstacleStyle] = {
+    theme: ObstacleStyle(*(swatch(color) for color in colors))
+    for theme, colors in {
+        "fence": ("#d9d9d9", "#bfbfbf", "#8c8c8c", "#ffe8d6"),
+        "data": ("#3bd8c0", "#0c7c6a", "#0a2d24", "#0c2a26"),
+        "lantern": ("#e63946", "#a4161a", "#ffb703", "#ffe8d6"),
+        "light": ("#f45b69", "#c73a47", "#f9a23d", "#ffe8d6"),
+    }.items()
+}
+
+
+class PowerupStyle(NamedTuple):
+    fill: Swatch
+    label: str
+
+
+POWERUP_STYLES: Dict[str, PowerupStyle] = {
+    "slow": PowerupStyle(swatch("#7bdff2"), "慢"),
+    "shield": PowerupStyle(swatch("#80ed99"), "盾"),
+    "magnet": PowerupStyle(swatch("#f4acb7"), "吸"),
+    "double": PowerupStyle(swatch("#f9c74f"), "倍"),
+}
+UNKNOWN_POWERUP = PowerupStyle(swatch("#ffffff"), "?")
+
+# 场景与 HUD 的其余固定颜色
+GOLD = swatch("#fcbf49")
+GREETING = swatch("#ffd166")
+STAR = swatch("#fff3b0")
+SHIELD = swatch("#80ed99")
+GHOST = swatch("#d9e2ff")
+RIVAL = swatch("#f4acb7")
+POWERUP_LABEL = swatch("#1a1a1a")
+HORSE_BODY = swatch("#f2c14f")
+HORSE_EAR = swatch("#f77f00")
+HORSE_LEG = swatch("#cfa248")
+HORSE_EYE = swatch("#0c0c0c")
+HUD_TEXT = swatch("#f9f6f2")
+HUD_DIM = swatch("#ffe8b3")
+HUD_EFFECTS = swatch("#d9e2ff")
+HUD_HINT = swatch("#fef3c7")
+HUD_ACHIEVEMENT = swatch("#f4d35e")
+PANEL_FILL = swatch("#0b0f1f")
+PANEL_EDGE = swatch("#4fd1c5")
+PANEL_GOOD = swatch("#80ed99")
+PANEL_BAD = swatch("#f45b69")
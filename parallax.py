@@ -0,0 +1,137 @@
+"""
+Parallax background layers for the horse game.
+
+Each layer is a horizontally repeating tile that is rasterized once per
+visual theme, in plain Python, into RGBA rows. After that the layer is only
+scrolled. Kivy draws it as one textured rectangle whose texture coordinates
+are shifted. Tk draws it as one pre-tiled strip image (the tile repeated
+past the screen width) that is moved along x.
+
+The scroll offset follows HorseSimulation.distance, which integrates
+world_speed_multiplier(), so the layers speed up and slow down with the
+game, each at its own fraction of the ground speed. Tile widths are powers
+of two so the textures can use repeat wrapping on GLES2.
+"""
+
+import random
+import struct
+import zlib
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from palette import GOLD, THEMES, Swatch, VisualTheme
+
+# distance 每秒增加 6.5 * 速度倍率；地面层按障碍的平均速度（约 300 px/s）滚动
+PX_PER_DISTANCE = 300 / 6.5
+
+
+class Tile:
+    """一个重复周期的 RGBA 像素（自上而下逐行）。"""
+
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(width * height * 4)
+
+    def plot(self, x: int, y: int, rgba: bytes) -> None:
+        # x 按周期回绕，保证图块首尾相接
+        if 0 <= y < self.height:
+            i = (y * self.width + x % self.width) * 4
+            self.pixels[i:i + 4] = rgba
+
+    def fill(self, x: int, y: int, w: int, h: int, rgba: bytes) -> None:
+        for yy in range(y, y + h):
+            for xx in range(x, x + w):
+                self.plot(xx, yy, rgba)
+
+    def rows(self, width: int | None = None, bottom_up: bool = False) -> List[bytes]:
+        """逐行像素；给了 width 时把图块横向平铺到该宽度。"""
+        stride = self.width * 4
+        out = []
+        for y in range(self.height):
+            row = bytes(self.pixels[y * stride:(y + 1) * stride])
+            if width is not None:
+                row = (row * (width // self.width + 1))[:width * 4]
+            out.append(row)
+        if bottom_up:
+            out.reverse()
+        return out
+
+    def png(self, width: int) -> bytes:
+        """平铺到 width 宽的 PNG（Tk 的 PhotoImage 可直接读）。"""
+        raw = b"".join(b"\0" + row for row in self.rows(width))
+
+        def chunk(tag: bytes, data: bytes) -> bytes:
+            return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+
+        header = struct.pack(">IIBBBBB", width, self.height, 8, 6, 0, 0, 0)
+        return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def _rgba(color: Swatch, alpha: float = 1.0) -> bytes:
+    r, g, b, _a = color.rgba
+    return bytes(int(round(c * 255)) for c in (r, g, b, alpha))
+
+
+def _paint_far(tile: Tile, theme: VisualTheme) -> None:
+    """远景：稀疏的小星点，位置固定随机。"""
+    rng = random.Random(2026)
+    for _ in range(tile.width // 10):
+        size = rng.choice((1, 1, 2))
+        tile.fill(rng.randrange(tile.width), rng.randrange(tile.height), size, size, _rgba(theme.glow, 0.55))
+
+
+def _paint_rope(tile: Tile, theme: VisualTheme) -> None:
+    """灯笼绳：3 px 金绳，每个周期挂两颗小珠子。"""
+    gold = _rgba(GOLD)
+    tile.fill(0, 7, tile.width, 3, gold)
+    for x in (tile.width // 4, tile.width * 3 // 4):
+        tile.fill(x, 10, 1, 2, gold)
+        tile.fill(x - 1, 12, 3, 3, gold)
+
+
+def _paint_ground(tile: Tile, theme: VisualTheme) -> None:
+    """地面：斜向网格线（每 64 px）与光点（每 32 px）。"""
+    grid = _rgba(theme.grid)
+    for gx in range(0, tile.width, 64):
+        for y in range(tile.height):
+            tile.plot(gx - round(40 * y / tile.height), y, grid)
+    glow = _rgba(theme.glow)
+    for x in range(16, tile.width, 32):
+        tile.fill(x - 2, 11, 4, 2, glow)
+        tile.fill(x - 1, 10, 2, 4, glow)
+
+
+class ParallaxLayer(NamedTuple):
+    name: str
+    period: int  # 图块宽度
+    factor: float  # 相对地面层的滚动比例
+    paint: Callable[[Tile, VisualTheme], None]
+
+
+LAYERS: Dict[str, ParallaxLayer] = {
+    layer.name: layer
+    for layer in (
+        ParallaxLayer("far", 256, 0.12, _paint_far),
+        ParallaxLayer("rope", 64, 0.35, _paint_rope),
+        ParallaxLayer("ground", 64, 1.0, _paint_ground),
+    )
+}
+
+_tiles: Dict[Tuple[str, int, int], Tile] = {}
+
+
+def tile(name: str, theme: int, height: int) -> Tile:
+    """某层在某主题下的图块（每种组合只画一次）。"""
+    key = (name, theme, height)
+    cached = _tiles.get(key)
+    if cached is None:
+        layer = LAYERS[name]
+        cached = _tiles[key] = Tile(layer.period, height)
+        layer.paint(cached, THEMES[theme])
+    return cached
+
+
+def scroll_offset(name: str, distance: float) -> int:
+    """按已跑距离算出的图块内偏移（整数像素）。"""
+    layer = LAYERS[name]
+    return int(distance * PX_PER_DISTANCE * layer.factor) % layer.period
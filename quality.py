@@ -0,0 +1,94 @@
+"""
+Adaptive render quality for the horse game.
+
+Watches rolling frame times and steps scene detail down while the frame
+budget is being missed, then back up once there is steady headroom again.
+Shared by the tkinter (horse_game.py) and Kivy (main.py) front-ends.
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+
+# 从高到低的画质档位：烟花粒子 → 地面网格/光点 → 灯笼与障碍简化
+QUALITY_TIERS: List[Dict[str, Any]] = [
+    {"name": "high", "firework_scale": 1.0, "ground_details": True, "simple_art": False},
+    {"name": "medium", "firework_scale": 0.5, "ground_details": True, "simple_art": False},
+    {"name": "low", "firework_scale": 0.35, "ground_details": False, "simple_art": False},
+    {"name": "minimal", "firework_scale": 0.2, "ground_details": False, "simple_art": True},
+]
+
+
+class QualityGovernor:
+    """根据滚动帧耗时自动升降画质档位（带迟滞，避免来回闪烁）。"""
+
+    def __init__(
+        self,
+        budget: float = 1 / 60,
+        window: int = 45,
+        downgrade_ratio: float = 0.75,
+        upgrade_ratio: float = 0.4,
+        recover_frames: int = 180,
+    ) -> None:
+        # budget: 每帧可用时间（秒）；帧耗时均值超过 budget * downgrade_ratio 即降档，
+        # 连续 recover_frames 帧低于 budget * upgrade_ratio 才升档。
+        self.budget = budget
+        self.window = window
+        self.downgrade_ratio = downgrade_ratio
+        self.upgrade_ratio = upgrade_ratio
+        self.recover_frames = recover_frames
+        self.level = 0
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.sample_sum = 0.0
+        self.headroom_frames = 0
+        self.changes = 0
+
+    @property
+    def tier(self) -> Dict[str, Any]:
+        return QUALITY_TIERS[self.level]
+
+    @property
+    def name(self) -> str:
+        return self.tier["name"]
+
+    def set_budget(self, budget: float) -> None:
+        """目标帧率变化时同步预算，并重新开始统计。"""
+        self.budget = budget
+        self._reset_window()
+
+    def mean_frame_time(self) -> float:
+        if not self.samples:
+            return 0.0
+        return self.sample_sum / len(self.samples)
+
+    def record(self, frame_time: float) -> None:
+        """记录一帧的耗时（秒），必要时切换档位。"""
+        if len(self.samples) == self.samples.maxlen:
+            self.sample_sum -= self.samples[0]
+        self.samples.append(frame_time)
+        self.sample_sum += frame_time
+        # 刚切换过档位时先攒满一个窗口再做判断
+        if len(self.samples) < self.window:
+            return
+
+        mean = self.sample_sum / len(self.samples)
+        if mean > self.budget * self.downgrade_ratio:
+            self.headroom_frames = 0
+            if self.level < len(QUALITY_TIERS) - 1:
+                self._change_level(self.level + 1)
+        elif mean < self.budget * self.upgrade_ratio:
+            self.headroom_frames += 1
+            if self.headroom_frames >= self.recover_frames and self.level > 0:
+                self._change_level(self.level - 1)
+        else:
+            self.headroom_frames = 0
+
+    def _change_level(self, level: int) -> None:
+        self.level = level
+        self.changes += 1
+        self._reset_window()
+
+    def _reset_window(self) -> None:
+        self.samples.clear()
+        self.sample_sum = 0.0
+        self.headroom_frames = 0
@@ -0,0 +1,134 @@
+"""
+Memory-bounded rewind buffer for the practice mode.
+
+Frames are snapshot.pack_state() byte strings. Every keyframe_interval-th
+frame is stored whole; the frames in between are zlib-compressed with their
+keyframe as the preset dictionary, so each one only costs the bytes that
+changed. Seeking needs at most one keyframe lookup and one decompress.
+"""
+
+import zlib
+from typing import Any, Dict, List, Tuple
+
+# (关键帧序号, 是否关键帧, 数据)
+Entry = Tuple[int, bool, bytes]
+
+
+class RewindBuffer:
+    """固定容量的逐帧环形缓冲（关键帧 + 增量），带内存上限。"""
+
+    def __init__(
+        self,
+        seconds: float = 10.0,
+        hz: int = 60,
+        keyframe_interval: int = 30,
+        max_bytes: int = 512 * 1024,
+    ) -> None:
+        self.capacity = max(1, int(seconds * hz))
+        self.keyframe_interval = keyframe_interval
+        self.max_bytes = max_bytes
+        self.frames: List[Entry | None] = [None] * self.capacity
+        self.keyframes: Dict[int, bytes] = {}
+        self.key_refs: Dict[int, int] = {}
+        self.start = 0
+        self.count = 0
+        self.bytes_used = 0
+        self.key_serial = -1
+        self.since_key = keyframe_interval
+        self.evicted = 0
+
+    def clear(self) -> None:
+        self.frames = [None] * self.capacity
+        self.keyframes.clear()
+        self.key_refs.clear()
+        self.start = 0
+        self.count = 0
+        self.bytes_used = 0
+        self.key_serial = -1
+        self.since_key = self.keyframe_interval
+
+    def push(self, state: bytes) -> None:
+        """追加一帧；满了或超出内存上限时丢弃最旧的帧。"""
+        if self.count == self.capacity:
+            self._evict_oldest()
+        if self.since_key >= self.keyframe_interval or self.key_serial not in self.keyframes:
+            self.key_serial += 1
+            self.keyframes[self.key_serial] = state
+            self.key_refs[self.key_serial] = 0
+            self.bytes_used += len(state)
+            entry: Entry = (self.key_serial, True, b"")
+            self.since_key = 1
+        else:
+            packer = zlib.compressobj(1, zlib.DEFLATED, 12, 5, zdict=self.keyframes[self.key_serial])
+            delta = packer.compress(state) + packer.flush()
+            self.bytes_used += len(delta)
+            entry = (self.key_serial, False, delta)
+            self.since_key += 1
+        self.key_refs[self.key_serial] += 1
+        self.frames[(self.start + self.count) % self.capacity] = entry
+        self.count += 1
+        while self.bytes_used > self.max_bytes and self.count > 1:
+            self._evict_oldest()
+
+    def rewind(self, frames_back: int) -> bytes | None:
+        """取回 frames_back 帧之前的状态，并丢弃其后的帧；缓冲为空时返回 None。"""
+        if self.count == 0:
+            return None
+        frames_back = max(0, min(frames_back, self.count - 1))
+        while frames_back > 0:
+            self._drop_newest()
+            frames_back -= 1
+        entry = self.frames[(self.start + self.count - 1) % self.capacity]
+        if entry is None:
+            return None
+        state = self._decode(entry)
+        # 回退后从新的关键帧重新开始，避免基于已丢弃帧做增量
+        self.since_key = self.keyframe_interval
+        return state
+
+    def memory_bytes(self) -> int:
+        return self.bytes_used
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "frames": self.count,
+            "capacity": self.capacity,
+            "keyframes": len(self.keyframes),
+            "bytes": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+        }
+
+    def _decode(self, entry: Entry) -> bytes:
+        serial, is_key, delta = entry
+        key = self.keyframes[serial]
+        if is_key:
+            return key
+        unpacker = zlib.decompressobj(12, zdict=key)
+        return unpacker.decompress(delta) + unpacker.flush()
+
+    def _evict_oldest(self) -> None:
+        entry = self.frames[self.start]
+        self.frames[self.start] = None
+        self.start = (self.start + 1) % self.capacity
+        self.count -= 1
+        self.evicted += 1
+        self._release(entry)
+
+    def _drop_newest(self) -> None:
+        index = (self.start + self.count - 1) % self.capacity
+        entry = self.frames[index]
+        self.frames[index] = None
+        self.count -= 1
+        self._release(entry)
+
+    def _release(self, entry: Entry | None) -> None:
+        if entry is None:
+            return
+        serial, _is_key, delta = entry
+        self.bytes_used -= len(delta)
+        self.key_refs[serial] -= 1
+        if self.key_refs[serial] == 0:
+            # 没有帧再引用这个关键帧，释放它
+            self.bytes_used -= len(self.keyframes.pop(serial))
+            del self.key_refs[serial]
@@ -0,0 +1,1182 @@
+"""
+Game rules for the horse game, independent of any UI toolkit.
+
+HorseSimulation holds the whole run (horse, obstacles, stars, power-ups,
+timers, records, ghost, practice rewind, versus/spectator publishing) and
+advances it with step(dt). Both front-ends (horse_game.py, main.py) inherit
+it and only add windows, drawing and sound playback on top. Input reaches
+the rules as timestamped (stamp, action, value) entries on a deque; sounds
+leave as keys on another deque that the UI thread drains.
+
+A step covers the clock interval (now - dt, now]. The inputs queued when it
+starts cut it into sub-steps at their stamps, so a press lands at the moment
+it happened rather than at the frame boundary. Jumps also get two
+forgiveness windows. A press with no jump left is buffered and fires on
+landing (jump_buffer). A press just after walking off the ground still
+counts as a ground jump (coyote_time). input_latency is how long the newest
+input waited in the queue, and the telemetry records it per frame.
+
+In threaded mode SimulationWorker runs a forked copy of the simulation on
+its own thread and publishes an immutable RenderSnapshot after every step
+into one of two buffers, flipping the front index with a single
+assignment. The UI thread only copies the newest snapshot onto itself and
+draws it, so a slow frame no longer delays physics or input handling.
+"""
+
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+from collision import BitMask, ShapeCache, obstacle_hit, sweep_interval
+from ghost import GhostRecorder, GhostTrack, load_ghost, save_ghost
+from pacing import FramePacer
+from quality import QualityGovernor
+from rewind import RewindBuffer
+from snapshot import FLAG_FIELDS, FLOAT_FIELDS, INT_FIELDS, pack_state, restore_state
+from spritesheet import CLIPS, DEFEND, JUMP, LAND, RUN, SLIDE, frame_at
+
+# (按下时刻 sim.clock(), 动作, 参数)
+InputEvent = Tuple[float, str, Any]
+
+HINT_SOUNDS = {
+    "陈思颖: 保持节奏": "hint_keep",
+    "陈思颖: 准备跳！": "hint_ready",
+    "陈思颖: 贴近了，小心！": "hint_caution",
+    "陈思颖: 观察前方，寻找创造路": "hint_observe",
+}
+
+
+class HorseSimulation:
+    """不依赖界面的游戏规则：输入进、状态与音效事件出。"""
+
+    def __init__(
+        self,
+        seed: int | None = None,
+        versus: Any = None,
+        spectators: Any = None,
+        watcher: Any = None,
+        data_dir: str | None = None,
+    ) -> None:
+        # 基础尺寸与物理参数
+        self.world_width = 900.0
+        self.world_height = 520.0
+        self.ground_y = self.world_height - 90
+        self.gravity = 2200.0
+        self.jump_strength = 1100.0
+        self.max_air_jumps = 1  # 空中额外可跳一次
+        # 跳跃手感（秒）：落地前这么久内按下的跳跃落地即起跳；离地后这么久内仍算地面起跳
+        self.jump_buffer = 0.12
+        self.coyote_time = 0.08
+        self.horse_size = (110.0, 70.0)
+        self.horse: Dict[str, Any] = {}
+        # 前端资源的载入进度（0~1），开始按钮上显示；无界面时恒为 1
+        self.load_progress = 1.0
+        # 场景状态
+        self.obstacles: List[Dict[str, Any]] = []
+        # 障碍/星星/道具生成时各取一个递增编号，显示列表按它取键，前面的离场时后面的键不变
+        self.spawn_serial = 0
+        self.firework_serial = 0  # 烟花是装饰、不进快照，单独编号
+        self.trails: List[Dict[str, float]] = []
+        self.fireworks: List[Dict[str, Any]] = []
+        self.air_stars: List[Dict[str, float]] = []  # 可收集的星星
+        self.powerups: List[Dict[str, Any]] = []
+        self.spawn_timer = 0.0
+        self.star_spawn_timer = 0.0  # 星星生成计时
+        self.powerup_spawn_timer = 0.0
+        self.anim_clip = RUN  # 当前动画片段（spritesheet.CLIPS 下标）
+        self.anim_time = 0.0  # 片段已播放的秒数
+        self.invincible_timer = 0.0  # 无敌剩余时间
+        self.slow_timer = 0.0
+        self.magnet_timer = 0.0
+        self.double_score_timer = 0.0
+        self.slide_timer = 0.0
+        self.slide_cooldown = 0.0
+        self.shield = False
+        # 由贴图透明度生成的碰撞掩码（含滑铲形态），AABB 命中后才做逐像素判定
+        self.horse_masks: Dict[str, BitMask] = {}
+        self.horse_slide_masks: Dict[str, BitMask] = {}
+        self.collision_shapes = ShapeCache()
+        self.current_hint = ""
+        self.hint_sound_cooldown = 0.0
+        # 提示语音每变化几次才播一次：(普通提示, 贴近提示)
+        self.hint_sound_every = (1, 1)
+        self.hint_trigger_counter = 0
+        self.caution_trigger_counter = 0
+        self.jump_sound_counter = 0
+        self.jump_prompt_played = False
+        self.awaiting_start = True
+        self.preparing_start = False
+        self.countdown_timer = 0.0
+        self.running = False
+        self.paused = False
+        # 局内计时与输入时间戳共用的时钟；无界面跑局（python -m horsegame simulate）换成按步推进的虚拟时钟
+        self.clock: Callable[[], float] = time.perf_counter
+        self.start_time = self.clock()
+        self.elapsed = 0.0
+        self.distance = 0.0
+        self.jumps = 0
+        self.air_jumps_used = 0
+        # fork() 只复制 __init__ 后已有的属性，reset() 里重置的也要先在这里建好
+        self.ground_seen = 0.0
+        self.buffered_jump: float | None = None
+        self.score = 0
+        self.total_stars = 0
+        self.star_combo = 0
+        self.star_combo_timer = 0.0
+        self.achievements: set[str] = set()
+        self.achievement_text = ""
+        self.achievement_timer = 0.0
+        self.mode = "endless"
+        self.modes = ["endless", "challenge", "timed"]
+        self.mode_labels = {"endless": "无尽", "challenge": "挑战", "timed": "计时"}
+        self.time_limit = 60.0
+        self.game_over_reason = ""
+        self.difficulty = 1.0
+        self.stage = 0
+        self.challenge_pattern: List[Dict[str, Any]] = []
+        self.challenge_index = 0
+        self.challenge_timer = 1.0
+        self.status_text = "陈思颖: 无尽模式，空格起跳"
+        # 各前端的操作提示不同（键盘/触屏）
+        self.restart_prompt = "按 R 继续"
+        self.resume_prompt = "Enter 继续"
+        # 规则只读的画面设置：烟花密度跟随画质档位与低闪烁模式
+        self.visual_mode = 0
+        self.quality = QualityGovernor()
+        data_dir = data_dir or os.path.dirname(os.path.abspath(__file__))
+        self.records_path = os.path.join(data_dir, "horse_records.json")
+        self.records = self._load_records()
+        # 最佳一局的轨迹，作为半透明幽灵马回放
+        self.ghost_path = os.path.join(data_dir, "horse_ghost.bin")
+        self.ghost_recorder = GhostRecorder()
+        self.ghost_track = load_ghost(self.ghost_path)
+        # 练习模式：撞到障碍时倒带而不是结束
+        self.practice = False
+        # 本局开过练习模式：倒带过的成绩不算最佳，也不覆盖幽灵马
+        self.practiced = False
+        self.rewind_seconds = 2.0
+        self.rewind = RewindBuffer(seconds=10.0, hz=60)
+        self.step_hz = 60  # 每秒调用 step 的次数，倒带按它换算帧数
+        # 障碍/星星/道具走独立随机源；给定种子时每局赛道完全一致（对战用）
+        self.course_seed = seed
+        self.course_rng = random.Random(seed)
+        self.versus = versus
+        self.last_input_at = 0.0
+        self.waiting_rival = False  # 对战：已按开始，等对手也准备好
+        # 观战：spectators 把本局广播出去；watcher 不为空时本机只镜像别人的画面
+        self.spectators = spectators
+        self.watcher = watcher
+        # 输入队列与音效事件：deque 两端的 append/popleft 是原子的，跨线程无需加锁
+        self.inputs: Deque[InputEvent] = deque()
+        self.input_hook: Callable[[], None] | None = None
+        self.input_latency = 0.0  # 最近一次输入从按下到被规则处理的秒数
+        self.inputs_applied = 0  # 累计处理的输入数，遥测据此判断本帧有没有新输入
+        self.sound_events: Deque[str | None] = deque()
+        # 线程模式下 sim 指向 worker 上的副本，本对象只当画面镜像
+        self.sim = self
+        self.worker: SimulationWorker | None = None
+        self.shown_seq = -1
+
+    def _load_records(self) -> Dict[str, Any]:
+        default = {
+            "best_time": 0.0,
+            "best_distance": 0.0,
+            "best_score": 0,
+            "best_combo": 0,
+            "best_timed_score": 0,
+            "best_challenge_time": 0.0,
+        }
+        if not os.path.exists(self.records_path):
+            return default
+        try:
+            with open(self.records_path, "r", encoding="utf-8") as handle:
+                data = json.load(handle)
+            if not isinstance(data, dict):
+                return default
+            merged = default.copy()
+            merged.update({k: data.get(k, v) for k, v in default.items()})
+            return merged
+        except Exception:
+            return default
+
+    def _save_records(self) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.records_path), exist_ok=True)
+            with open(self.records_path, "w", encoding="utf-8") as handle:
+                json.dump(self.records, handle, ensure_ascii=True, indent=2)
+        except Exception:
+            pass
+
+    def play_sound(self, key: str) -> None:
+        """排一个音效给 UI 线程播放。"""
+        self.sound_events.append(key)
+
+    def stop_sounds(self) -> None:
+        self.sound_events.append(None)
+
+    def post_input(self, action: str, value: Any = None, stamp: float | None = None) -> None:
+        """把一次输入连同按下时刻排进模拟的输入队列；stamp 缺省为现在（sim.clock()）。"""
+        sim = self.sim
+        sim.inputs.append((sim.clock() if stamp is None else stamp, action, value))
+        if sim.input_hook is not None:
+            sim.input_hook()
+
+    def set_input_windows(self, jump_buffer: float, coyote_time: float) -> None:
+        """设置跳跃缓冲与土狼时间（秒）；线程模式下 worker 上的副本一起改。"""
+        for sim in (self, self.sim):
+            sim.jump_buffer = max(0.0, jump_buffer)
+            sim.coyote_time = max(0.0, coyote_time)
+
+    def _apply_input(self, stamp: float, action: str, value: Any) -> None:
+        if action == "jump":
+            self.handle_jump(stamp)
+        elif action == "slide":
+            if self.running and not self.paused:
+                self.handle_slide()
+        elif action == "confirm":
+            # Enter：开始页上开始倒计时，其余时候暂停/继续
+            if self.awaiting_start and not self.preparing_start:
+                self.start_countdown()
+            else:
+                self.toggle_pause()
+        elif action == "start":
+            self.start_countdown()
+        elif action == "pause":
+            self.toggle_pause()
+        elif action == "reset":
+            self.reset()
+        elif action == "mode":
+            self.cycle_mode()
+        elif action == "practice":
+            self.toggle_practice()
+        elif action == "say":
+            self.status_text = value
+
+    def _make_challenge_pattern(self) -> List[Dict[str, Any]]:
+        """固定挑战关卡序列。"""
+        pattern = []
+        base_delay = 1.1
+        themes = ["fence", "data", "lantern", "light"]
+        for i in range(12):
+            pattern.append(
+                {
+                    "delay": base_delay + i * 0.15,
+                    "h": 70 + i * 3,
+                    "w": 50 + (i % 3) * 10,
+                    "speed": 260 + i * 12,
+                    "theme": themes[i % len(themes)],
+                    "label": self.course_rng.choice(["勇", "智", "行", "跃", "创", "新"]),
+                }
+            )
+        return pattern
+
+    def reset(self) -> None:
+        """重置游戏到初始状态。"""
+        w, h = self.horse_size
+        if self.course_seed is not None:
+            self.course_rng.seed(self.course_seed)
+        if self._versus_online():
+            self.versus.set_ready(False)
+        self.waiting_rival = False
+        self.horse = {
+            "x": 120.0,
+            "y": self.ground_y - h,
+            "w": w,
+            "h": h,
+            "vy": 0.0,
+            "on_ground": True,
+        }
+        self.obstacles.clear()
+        self.trails.clear()
+        self.fireworks.clear()
+        self.air_stars.clear()
+        self.powerups.clear()
+        self.spawn_timer = 1.2
+        self.star_spawn_timer = 0.8
+        self.powerup_spawn_timer = 1.6
+        self.running = False
+        self.paused = False
+        self.awaiting_start = True
+        self.preparing_start = False
+        self.countdown_timer = 0.0
+        self.game_over_reason = ""
+        self.start_time = self.clock()
+        self.elapsed = 0.0
+        self.jumps = 0
+        self.air_jumps_used = 0
+        self.ground_seen = 0.0  # 最后一次站在地面的局内时刻
+        self.buffered_jump: float | None = None  # 缓冲中的跳跃的按下时刻（局内时间）
+        self.score = 0
+        self.total_stars = 0
+        self.star_combo = 0
+        self.star_combo_timer = 0.0
+        self.invincible_timer = 0.0
+        self.slow_timer = 0.0
+        self.magnet_timer = 0.0
+        self.double_score_timer = 0.0
+        self.shield = False
+        self.distance = 0.0
+        self.slide_timer = 0.0
+        self.slide_cooldown = 0.0
+        self.status_text = f"陈思颖: {self.mode_labels[self.mode]}模式，空格起跳"
+        self.anim_clip = RUN
+        self.anim_time = 0.0
+        self.current_hint = ""
+        self.hint_sound_cooldown = 0.0
+        self.jump_sound_counter = 0
+        self.jump_prompt_played = False
+        self.hint_trigger_counter = 0
+        self.caution_trigger_counter = 0
+        self.achievements.clear()
+        self.achievement_text = ""
+        self.achievement_timer = 0.0
+        self.difficulty = 1.0
+        self.stage = 0
+        self.challenge_pattern = self._make_challenge_pattern()
+        self.challenge_index = 0
+        self.challenge_timer = self.challenge_pattern[0]["delay"] if self.challenge_pattern else 1.0
+        self.rewind.clear()
+        self.ghost_recorder.clear()
+        self.stop_sounds()
+        self.play_sound("start")
+
+    def start_countdown(self) -> None:
+        if self.awaiting_start and not self.preparing_start:
+            self.preparing_start = True
+            self.countdown_timer = 3.0
+            if self._versus_online():
+                # 对战双方倒数到同一个起跑时刻，先等对手也按下开始
+                self.versus.set_ready(True)
+                self.waiting_rival = True
+                self.status_text = "陈思颖: 等待对手准备…"
+            else:
+                self.status_text = "陈思颖: 准备起跑！"
+
+    def handle_jump(self, stamp: float | None = None) -> None:
+        """地面起跳或空中连跳，都用完了就缓冲到落地；stamp 为按键时刻（sim.clock()）。"""
+        if not self.running or self.paused:
+            return
+        pressed = self.elapsed if stamp is None else stamp - self.start_time
+        if self.horse["on_ground"] or self._in_coyote_time(pressed):
+            self._do_jump(self.jump_strength, air_jump=False, stamp=stamp)
+        elif self.air_jumps_used < self.max_air_jumps:
+            self._do_jump(self.jump_strength, air_jump=True, stamp=stamp)
+        elif self.jump_buffer > 0:
+            self.buffered_jump = pressed
+
+    def _in_coyote_time(self, pressed: float) -> bool:
+        """刚离开地面（不是跳起来的，正在下落）不久按下的跳跃仍算地面起跳。"""
+        since = pressed - self.ground_seen
+        return self.horse["vy"] >= 0 and 0 <= since <= self.coyote_time
+
+    def _take_buffered_jump(self) -> None:
+        """站在地面时记下时刻；有缓冲窗口内的跳跃就当场起跳。"""
+        if not self.horse["on_ground"]:
+            return
+        self.ground_seen = self.elapsed
+        pressed = self.buffered_jump
+        if pressed is not None and self.elapsed - pressed <= self.jump_buffer:
+            self._do_jump(self.jump_strength, air_jump=False)
+        self.buffered_jump = None
+
+    def _do_jump(self, strength: float, air_jump: bool, stamp: float | None = None) -> None:
+        """执行跳跃动作。"""
+        self.horse["vy"] = -strength
+        self.horse["on_ground"] = False
+        self.buffered_jump = None
+        if air_jump:
+            self.air_jumps_used += 1
+        else:
+            self.air_jumps_used = 0
+        self.jumps += 1
+        # 对战统计的输入→显示延迟从真正按键的时刻算起
+        queued = self.clock() - stamp if stamp is not None else 0.0
+        self.last_input_at = time.time() - queued
+        if air_jump:
+            self.status_text = "陈思颖: 连跳加速！"
+            self.jump_sound_counter += 1
+            if self.jump_sound_counter % 6 == 0:
+                self.play_sound("double_jump")
+        else:
+            self.status_text = "陈思颖: 轻盈跃起！"
+            if not self.jump_prompt_played:
+                self.play_sound("jump")
+                self.jump_prompt_played = True
+
+    def toggle_pause(self) -> None:
+        """暂停/继续。"""
+        if not self.running or self.awaiting_start or self.preparing_start:
+            return
+        self.paused = not self.paused
+        self.status_text = "陈思颖: 暂停" if self.paused else "陈思颖: 继续冲刺"
+        self.play_sound("pause" if self.paused else "resume")
+
+    def toggle_practice(self) -> None:
+        self.practice = not self.practice
+        self.rewind.clear()
+        if self.practice:
+            self.practiced = True
+            budget_kb = self.rewind.max_bytes // 1024
+            self.status_text = f"陈思颖: 练习模式（撞到倒带 {self.rewind_seconds:.0f} 秒，缓存上限 {budget_kb}KB）"
+        else:
+            self.status_text = "陈思颖: 练习模式关闭"
+
+    def _rewind_after_hit(self) -> bool:
+        """练习模式撞到障碍：回到几秒前并暂停，返回是否成功倒带。"""
+        frames_back = int(self.rewind_seconds * self.step_hz)
+        data = self.rewind.rewind(frames_back)
+        if data is None:
+            return False
+        restore_state(self, data)
+        self.paused = True
+        self.buffered_jump = None
+        used_kb = self.rewind.memory_bytes() / 1024
+        self.status_text = f"陈思颖: 倒带 {self.rewind_seconds:.0f} 秒，{self.resume_prompt}（缓存 {used_kb:.0f}KB）"
+        return True
+
+    def cycle_mode(self) -> None:
+        if self.running and not self.paused:
+            return
+        index = self.modes.index(self.mode)
+        self.mode = self.modes[(index + 1) % len(self.modes)]
+        self.status_text = f"陈思颖: 切换到 {self.mode_labels[self.mode]}"
+        self.reset()
+
+    def handle_slide(self) -> None:
+        if not self.horse["on_ground"] or self.slide_cooldown > 0:
+            return
+        self.slide_timer = 0.45
+        self.slide_cooldown = 1.3
+        self.status_text = "陈思颖: 滑行闪避！"
+
+    def spawn_obstacle(self, config: Dict[str, Any] | None = None) -> None:
+        """生成障碍，附带一个祝福词。"""
+        if config:
+            height = int(config["h"])
+            width = int(config["w"])
+            speed = float(config["speed"])
+            theme = config.get("theme", "fence")
+            blessing = config.get("label", "福")
+        else:
+            scale = 0.8 + self.difficulty * 0.35
+            height = int(self.course_rng.randint(60, 120) * (0.9 + self.difficulty * 0.1))
+            width = int(self.course_rng.randint(40, 80) * (0.9 + self.difficulty * 0.08))
+            speed = self.course_rng.randint(230, 360) * scale
+            theme = self.course_rng.choice(["data", "fence", "light", "lantern"])
+            blessing = self.course_rng.choice(["福", "春", "安康", "平安", "顺意", "如意"])
+        self.obstacles.append(
+            {
+                "x": self.world_width + 20.0,
+                "y": self.ground_y - height,
+                "w": float(width),
+                "h": float(height),
+                "speed": float(speed),
+                "theme": theme,
+                "label": blessing,
+                "id": self._next_id(),
+            }
+        )
+        if not config:
+            self.spawn_timer = self.course_rng.uniform(1.1, 2.1) / max(0.8, self.difficulty)
+
+    def update_horse(self, dt: float) -> None:
+        """更新马的物理位置与落地状态。"""
+        # 记下本步起点，碰撞检测按整步的运动轨迹扫掠
+        self.horse["py"] = self.horse["y"]
+        self.horse["vy"] += self.gravity * dt
+        self.horse["y"] += self.horse["vy"] * dt
+
+        if self.horse["y"] >= self.ground_y - self.horse["h"]:
+            self.horse["y"] = self.ground_y - self.horse["h"]
+            self.horse["vy"] = 0.0
+            self.horse["on_ground"] = True
+            self.air_jumps_used = 0
+        else:
+            self.horse["on_ground"] = False
+
+    def world_speed_multiplier(self) -> float:
+        mul = self.difficulty
+        if self.invincible_timer > 0:
+            mul *= 1.35
+        if self.slow_timer > 0:
+            mul *= 0.6
+        return max(0.4, min(mul, 3.0))
+
+    def update_obstacles(self, dt: float) -> None:
+        """推进障碍并清理离场。"""
+        speed_mul = self.world_speed_multiplier()
+        for obs in self.obstacles:
+            obs["px"] = obs["x"]
+            obs["x"] -= obs["speed"] * dt * speed_mul
+        self.obstacles = [o for o in self.obstacles if o["x"] + o["w"] > -30]
+
+    def _next_id(self) -> int:
+        self.spawn_serial += 1
+        return self.spawn_serial
+
+    def spawn_firework(self) -> None:
+        """生成一束烟花粒子。"""
+        x = random.uniform(120, self.world_width - 120)
+        y = random.uniform(80, self.world_height * 0.4)
+        count = max(3, int(random.randint(15, 24) * self.quality.tier["firework_scale"]))
+        particles = []
+        for n in range(count):
+            angle = random.uniform(0, math.pi * 2)
+            speed = random.uniform(90, 210)
+            vx = speed * math.cos(angle)
+            vy = speed * math.sin(angle)
+            # n 为粒子在这束烟花里的编号，粒子陆续熄灭时其余粒子的键不变
+            particles.append({"x": x, "y": y, "vx": vx, "vy": vy, "life": random.uniform(0.8, 1.4), "n": n})
+        color = random.choice(["#ff4d4f", "#ffd166", "#ff7a45", "#ff3859"])
+        self.firework_serial += 1
+        self.fireworks.append({"particles": particles, "color": color, "id": self.firework_serial})
+
+    def spawn_star(self) -> None:
+        """生成可收集星星。"""
+        x = self.world_width + 30
+        y = self.course_rng.uniform(120, self.ground_y - 120)
+        size = self.course_rng.uniform(10, 16)
+        self.air_stars.append(
+            {"x": x, "y": y, "size": size, "speed": self.course_rng.uniform(220, 320), "id": self._next_id()}
+        )
+
+    def spawn_powerup(self) -> None:
+        """生成道具。"""
+        x = self.world_width + 40
+        y = self.course_rng.uniform(140, self.ground_y - 140)
+        kind = self.course_rng.choice(["slow", "shield", "magnet", "double"])
+        speed = self.course_rng.uniform(200, 300)
+        self.powerups.append({"x": x, "y": y, "size": 16.0, "speed": speed, "kind": kind, "id": self._next_id()})
+
+    def apply_powerup(self, kind: str) -> None:
+        if kind == "slow":
+            self.slow_timer = 4.0
+            self.status_text = "陈思颖: 时空减速！"
+        elif kind == "shield":
+            self.shield = True
+            self.status_text = "陈思颖: 护盾就位！"
+        elif kind == "magnet":
+            self.magnet_timer = 6.0
+            self.status_text = "陈思颖: 星星磁吸！"
+        elif kind == "double":
+            self.double_score_timer = 6.0
+            self.status_text = "陈思颖: 星星翻倍！"
+
+    def update_powerups(self, dt: float) -> None:
+        speed_mul = self.world_speed_multiplier()
+        for p in self.powerups:
+            p["px"] = p["x"]
+            p["x"] -= p["speed"] * dt * speed_mul
+        self.powerups = [p for p in self.powerups if p["x"] > -50]
+
+    def update_fireworks(self, dt: float) -> None:
+        """更新烟花粒子运动与存活。"""
+        spawn_rate = 0.02 if self.visual_mode != 2 else 0.006
+        if random.random() < spawn_rate:
+            self.spawn_firework()
+        alive = []
+        for fw in self.fireworks:
+            particles = []
+            for p in fw["particles"]:
+                p["x"] += p["vx"] * dt
+                p["y"] += p["vy"] * dt
+                p["vy"] += 220 * dt
+                p["life"] -= dt
+                if p["life"] > 0:
+                    particles.append(p)
+            if particles:
+                fw["particles"] = particles
+                alive.append(fw)
+        self.fireworks = alive
+
+    def update_air_stars(self, dt: float) -> None:
+        """更新可收集星星。"""
+        speed_mul = self.world_speed_multiplier()
+        hx = self.horse["x"] + self.horse["w"] * 0.5
+        hy = self.horse["y"] + self.horse["h"] * 0.5
+        for s in self.air_stars:
+            s["px"], s["py"] = s["x"], s["y"]
+            s["x"] -= s["speed"] * dt * speed_mul
+            if self.magnet_timer > 0:
+                dx = hx - s["x"]
+                dy = hy - s["y"]
+                dist = math.hypot(dx, dy) + 0.01
+                pull = 260 * dt
+                s["x"] += dx / dist * pull
+                s["y"] += dy / dist * pull
+        self.air_stars = [s for s in self.air_stars if s["x"] > -40]
+
+    def resize_horse(self, w: float, h: float) -> None:
+        """贴图载入后换马的外框；已开跑的这一局保持原尺寸，下局生效。"""
+        self.horse_size = (w, h)
+        if not self.running and not self.preparing_start and self.horse:
+            self.horse.update(w=w, h=h, y=self.ground_y - h)
+
+    def use_ghost(self, track: GhostTrack) -> None:
+        """用给定轨迹代替本机最佳成绩作幽灵马（回放录像）。"""
+        self.ghost_track = track
+        self.sim.ghost_track = track
+
+    def horse_frame_key(self, frames: Dict[str, Any]) -> str | None:
+        """当前帧的马贴图键（绘制与碰撞掩码共用）；frames 为已加载的图集格子或掩码表。"""
+        key = frame_at(self.anim_clip, self.anim_time)
+        if frames.get(key):
+            return key
+        if frames.get("main"):
+            return "main"
+        return None
+
+    def _horse_clip(self) -> int:
+        """按马的状态选动画片段；落地后先播完 land 再接 run。"""
+        if self.invincible_timer > 0:
+            return DEFEND
+        if self.slide_timer > 0:
+            return SLIDE
+        if not self.horse["on_ground"]:
+            return JUMP
+        if self.anim_clip == JUMP or (self.anim_clip == LAND and self.anim_time < CLIPS[LAND].duration):
+            return LAND
+        return RUN
+
+    def _horse_mask(self) -> BitMask | None:
+        masks = self.horse_slide_masks if self.slide_timer > 0 else self.horse_masks
+        return masks.get(self.horse_frame_key(self.horse_masks))
+
+    def check_collisions(self) -> None:
+        """检测马与障碍的碰撞。"""
+        hx, hy, hw, hh = self.horse["x"], self.horse["y"], self.horse["w"], self.horse["h"]
+        hit_h = hh * (0.6 if self.slide_timer > 0 else 1.0)
+        hit_y = hy + (hh - hit_h)
+        # 扫掠判定：用本步起点到终点的整段运动求外框重叠区间，高速或低帧率时也不会穿模；
+        # 刚生成或刚从快照恢复、还没有起点记录的对象按本步静止处理
+        prev_hy = self.horse.get("py", hy)
+        horse_from = (hx, prev_hy + (hh - hit_h))
+        horse_to = (hx, hit_y)
+        horse_box = (hw, hit_h)
+        invulnerable = self.invincible_timer > 0
+        if not invulnerable:
+            mask = self._horse_mask()
+            for obs in self.obstacles:
+                ox, oy = obs["x"], obs["y"]
+                span = sweep_interval(
+                    horse_from, horse_to, horse_box, (obs.get("px", ox), oy), (ox, oy), (obs["w"], obs["h"])
+                )
+                if span is not None:
+                    # 外框相交后再沿轨迹做逐像素判定，透明的角落不算撞上
+                    if mask is not None and not obstacle_hit(
+                        mask, (hx, prev_hy), (hx, hy), obs, self.collision_shapes, span
+                    ):
+                        continue
+                    if self.shield:
+                        self.shield = False
+                        self.invincible_timer = max(self.invincible_timer, 1.2)
+                        self.status_text = "陈思颖: 护盾破碎！"
+                        return
+                    if self.practice and self._rewind_after_hit():
+                        return
+                    self._end_game("hit")
+                    return
+
+        # 收集星星加分
+        collected = []
+        for s in self.air_stars:
+            sx, sy, ss = s["x"], s["y"], s["size"]
+            start = (s.get("px", sx) - ss, s.get("py", sy) - ss)
+            if sweep_interval(horse_from, horse_to, horse_box, start, (sx - ss, sy - ss), (ss * 2, ss * 2)):
+                collected.append(s)
+        if collected:
+            for s in collected:
+                self.air_stars.remove(s)
+            score_gain = len(collected) * (2 if self.double_score_timer > 0 else 1)
+            self.score += score_gain
+            self.total_stars += len(collected)
+            self.star_combo += len(collected)
+            self.star_combo_timer = 1.8
+            if self.score >= 10:
+                self.score = 0
+                self.invincible_timer = 5.0
+                self.status_text = "陈思颖: 星光护体，5秒无敌！"
+                self.play_sound("invincible")
+            if self.total_stars >= 10:
+                self._set_achievement("十星初成")
+            if self.star_combo >= 5:
+                self._set_achievement("星光连击")
+
+        collected_powerups = []
+        for p in self.powerups:
+            px, py, ps = p["x"], p["y"], p["size"]
+            start = (p.get("px", px) - ps, py - ps)
+            if sweep_interval(horse_from, horse_to, horse_box, start, (px - ps, py - ps), (ps * 2, ps * 2)):
+                collected_powerups.append(p)
+        if collected_powerups:
+            for p in collected_powerups:
+                self.powerups.remove(p)
+                self.apply_powerup(p["kind"])
+
+    def _set_achievement(self, title: str) -> None:
+        if title in self.achievements:
+            return
+        self.achievements.add(title)
+        self.achievement_text = f"成就达成: {title}"
+        self.achievement_timer = 2.6
+
+    def _end_game(self, reason: str) -> None:
+        self.running = False
+        self.game_over_reason = reason
+        self._update_records()
+        self.stop_sounds()
+        if reason == "hit":
+            self.status_text = f"陈思颖: 撞到障碍了，{self.restart_prompt}"
+            self.play_sound("hit")
+        elif reason == "challenge":
+            self.status_text = "陈思颖: 挑战完成！"
+        elif reason == "timed":
+            self.status_text = "陈思颖: 计时完成！"
+        else:
+            self.status_text = "陈思颖: 本局结束"
+
+    def _update_records(self) -> None:
+        if self.practiced:
+            return
+        if self.elapsed > self.records["best_time"]:
+            self.records["best_time"] = self.elapsed
+        if self.distance > self.records["best_distance"]:
+            self.records["best_distance"] = self.distance
+            self._save_ghost()
+        if self.total_stars > self.records["best_score"]:
+            self.records["best_score"] = self.total_stars
+        if self.star_combo > self.records["best_combo"]:
+            self.records["best_combo"] = self.star_combo
+        if self.mode == "timed" and self.total_stars > self.records["best_timed_score"]:
+            self.records["best_timed_score"] = self.total_stars
+        if self.mode == "challenge":
+            if self.game_over_reason == "challenge":
+                if self.records["best_challenge_time"] == 0 or self.elapsed < self.records["best_challenge_time"]:
+                    self.records["best_challenge_time"] = self.elapsed
+        self._save_records()
+
+    def _save_ghost(self) -> None:
+        recorder = self.ghost_recorder
+        if not recorder.samples:
+            return
+        self.ghost_track = GhostTrack(recorder.samples, recorder.rate)
+        save_ghost(self.ghost_path, recorder)
+
+    def _versus_online(self) -> bool:
+        return self.versus is not None and self.versus.error is None
+
+    def _sync_countdown(self) -> None:
+        """对战倒数按双方约定的墙钟起跑时刻走，两边同时起跑。"""
+        go_at = self.versus.start_time()
+        if go_at is None:
+            return
+        if self.waiting_rival:
+            self.waiting_rival = False
+            self.status_text = "陈思颖: 准备起跑！"
+        self.countdown_timer = max(0.0, go_at - time.time())
+
+    def _publish_versus(self) -> None:
+        if self.versus is None:
+            return
+        altitude = max(0.0, self.ground_y - (self.horse["y"] + self.horse["h"]))
+        self.versus.publish(altitude, self.distance, self.running, self.last_input_at)
+
+    def _publish_spectators(self) -> None:
+        if self.spectators is not None:
+            self.spectators.publish(pack_state(self))
+
+    def _follow_broadcast(self) -> None:
+        """观战模式：用收到的最新一帧覆盖本地局面。"""
+        state = self.watcher.poll()
+        if state is None:
+            if self.watcher.error:
+                self.status_text = f"观战连接已断开：{self.watcher.error}"
+            return
+        try:
+            restore_state(self, state)
+        except ValueError:
+            return
+
+    def rival_horse_y(self) -> float | None:
+        """对战对手的 y 坐标；未连接或对方数据过期时返回 None。"""
+        if self.versus is None:
+            return None
+        remote = self.versus.remote_state()
+        if remote is None or not remote.running:
+            return None
+        return self.ground_y - self.horse["h"] - remote.altitude
+
+    def versus_text(self) -> str:
+        if self.versus is None:
+            return ""
+        if self.versus.error is not None:
+            return f"对战不可用：{self.versus.error}，本局单人进行"
+        remote = self.versus.remote
+        stats = self.versus.stats()
+        rival = f"对手 距离 {remote.distance:05.1f}" if remote is not None else "等待对手…"
+        return (
+            f"{rival}  延迟 {stats['one_way_ms']:.0f}ms  输入→显示 {stats['input_to_display_ms']:.0f}ms"
+            f"  上行 {stats['bandwidth_bps'] / 1000:.1f}kbps"
+        )
+
+    def spectate_text(self) -> str:
+        """观战广播没开起来时 HUD 上的提示。"""
+        if self.spectators is None or self.spectators.error is None:
+            return ""
+        return f"观战广播不可用：{self.spectators.error}"
+
+    def ghost_horse_y(self) -> float | None:
+        """幽灵马当前的 y 坐标；没有录像或已超出录像长度时返回 None。"""
+        if self.ghost_track is None or not self.running:
+            return None
+        altitude = self.ghost_track.altitude_at(self.elapsed)
+        if altitude is None:
+            return None
+        return self.ground_y - self.horse["h"] - altitude
+
+    def nearest_hint(self) -> str:
+        """AI 提示：基于最近障碍给出文案。"""
+        hx = self.horse["x"] + self.horse["w"]
+        ahead = [o for o in self.obstacles if o["x"] + o["w"] >= hx]
+        if not ahead:
+            return "陈思颖: 保持节奏"
+        nearest = min(ahead, key=lambda o: o["x"])
+        distance = nearest["x"] - hx
+        if distance < 60:
+            return "陈思颖: 贴近了，小心！"
+        if self.horse["on_ground"] and distance < 220:
+            return "陈思颖: 准备跳！"
+        return "陈思颖: 观察前方，寻找创造路"
+
+    def _play_hint(self, key: str) -> None:
+        every_hint, every_caution = self.hint_sound_every
+        if key == "hint_caution":
+            self.caution_trigger_counter += 1
+            due = self.caution_trigger_counter % every_caution == 0
+        else:
+            self.hint_trigger_counter += 1
+            due = self.hint_trigger_counter % every_hint == 0
+        if due:
+            self.play_sound(key)
+            self.hint_sound_cooldown = 1.0
+
+    def is_idle(self) -> bool:
+        """暂停、开始页、结算页：没有任何影响玩法的东西在动。"""
+        return not self.preparing_start and (not self.running or self.paused)
+
+    def step(self, dt: float) -> None:
+        """推进一步：排队的输入按按下时刻把这一步切成几段，各在发生的子步生效；最后发布给对战/观战。"""
+        now = self.clock()
+        start = now - dt
+        done = 0.0
+        # 只处理进入本步时已排好的输入，处理中途新到的留给下一步
+        for _ in range(len(self.inputs)):
+            stamp, action, value = self.inputs.popleft()
+            at = min(dt, max(done, stamp - start))
+            if at > done:
+                self._advance(at - done, start + at)
+                done = at
+            self.input_latency = self.clock() - stamp
+            self.inputs_applied += 1
+            self._apply_input(stamp, action, value)
+        self._advance(dt - done, now)
+        if self.practice and self.running and not self.paused:
+            self.rewind.push(pack_state(self))
+
+        self._publish_versus()
+        self._publish_spectators()
+
+    def _advance(self, dt: float, now: float) -> None:
+        """规则推进 dt 秒到时刻 now（一个子步）。"""
+        if self.watcher is not None:
+            self._follow_broadcast()
+        elif self.preparing_start:
+            if self._versus_online():
+                self._sync_countdown()
+            else:
+                self.countdown_timer = max(0.0, self.countdown_timer - dt)
+            if self.countdown_timer <= 0:
+                self.preparing_start = False
+                self.awaiting_start = False
+                self.running = True
+                self.practiced = self.practice
+                self.start_time = now
+                self.status_text = "陈思颖: 起跑！"
+        if self.running and not self.paused and self.watcher is None:
+            self.elapsed = now - self.start_time
+            if self.mode != "challenge":
+                self.difficulty = 1.0 + min(self.elapsed / 38.0, 2.2)
+            else:
+                self.difficulty = 1.0
+            new_stage = int(self.elapsed // 20)
+            if self.mode != "challenge" and new_stage > self.stage:
+                self.stage = new_stage
+                self.status_text = "陈思颖: 节奏升级！"
+            speed_mul = self.world_speed_multiplier()
+            self.distance += dt * 6.5 * speed_mul
+
+            if self.mode == "challenge":
+                self.challenge_timer -= dt
+                if self.challenge_index < len(self.challenge_pattern) and self.challenge_timer <= 0:
+                    config = self.challenge_pattern[self.challenge_index]
+                    self.spawn_obstacle(config)
+                    self.challenge_index += 1
+                    if self.challenge_index < len(self.challenge_pattern):
+                        self.challenge_timer = self.challenge_pattern[self.challenge_index]["delay"]
+            else:
+                self.spawn_timer -= dt
+                if self.spawn_timer <= 0:
+                    self.spawn_obstacle()
+
+            self.star_spawn_timer -= dt
+            if self.star_spawn_timer <= 0:
+                self.spawn_star()
+                self.star_spawn_timer = self.course_rng.uniform(0.7, 1.3)
+
+            self.powerup_spawn_timer -= dt
+            if self.powerup_spawn_timer <= 0:
+                self.spawn_powerup()
+                self.powerup_spawn_timer = self.course_rng.uniform(4.0, 6.5)
+
+            self.update_horse(dt)
+            self._take_buffered_jump()
+            self.ghost_recorder.sample(self.elapsed, self.horse, self.ground_y)
+            self.update_obstacles(dt)
+            self.update_fireworks(dt)
+            self.update_air_stars(dt)
+            self.update_powerups(dt)
+            self.check_collisions()
+
+            if self.invincible_timer > 0:
+                self.invincible_timer = max(0.0, self.invincible_timer - dt)
+            if self.slow_timer > 0:
+                self.slow_timer = max(0.0, self.slow_timer - dt)
+            if self.magnet_timer > 0:
+                self.magnet_timer = max(0.0, self.magnet_timer - dt)
+            if self.double_score_timer > 0:
+                self.double_score_timer = max(0.0, self.double_score_timer - dt)
+            if self.slide_timer > 0:
+                self.slide_timer = max(0.0, self.slide_timer - dt)
+            if self.slide_cooldown > 0:
+                self.slide_cooldown = max(0.0, self.slide_cooldown - dt)
+            if self.star_combo_timer > 0:
+                self.star_combo_timer = max(0.0, self.star_combo_timer - dt)
+                if self.star_combo_timer == 0:
+                    self.star_combo = 0
+            if self.achievement_timer > 0:
+                self.achievement_timer = max(0.0, self.achievement_timer - dt)
+            if self.hint_sound_cooldown > 0:
+                self.hint_sound_cooldown = max(0.0, self.hint_sound_cooldown - dt)
+
+            if self.jumps >= 15:
+                self._set_achievement("连跳达人")
+            if self.elapsed >= 30:
+                self._set_achievement("无伤30秒")
+
+            if self.mode == "timed" and self.elapsed >= self.time_limit:
+                self._set_achievement("计时胜利")
+                self._end_game("timed")
+            if self.mode == "challenge" and self.challenge_index >= len(self.challenge_pattern) and not self.obstacles:
+                self._set_achievement("挑战通关")
+                self._end_game("challenge")
+
+            new_hint = self.nearest_hint()
+            if new_hint != self.current_hint:
+                self.current_hint = new_hint
+                key = HINT_SOUNDS.get(new_hint)
+                if key and self.hint_sound_cooldown <= 0:
+                    self._play_hint(key)
+
+            # 动画：按状态切片段，片段内按帧率取帧（绘制时只换图集区域）
+            clip = self._horse_clip()
+            if clip == self.anim_clip:
+                self.anim_time += dt
+            else:
+                self.anim_clip = clip
+                self.anim_time = 0.0
+        else:
+            # Even when paused keep fireworks alive at a slower rate.
+            self.update_fireworks(dt * 0.3)
+
+    def fork(self) -> "HorseSimulation":
+        """交给 worker 线程的副本：接管当前局面和所有规则状态，之后本对象只做画面镜像。"""
+        sim = HorseSimulation(
+            seed=self.course_seed,
+            versus=self.versus,
+            spectators=self.spectators,
+            watcher=self.watcher,
+            data_dir=os.path.dirname(self.records_path),
+        )
+        for name in vars(sim):
+            if name not in ("sim", "worker", "shown_seq", "inputs", "sound_events", "input_hook"):
+                setattr(sim, name, getattr(self, name))
+        # 未处理的输入与音效一并转交
+        sim.inputs.extend(self.inputs)
+        self.inputs.clear()
+        sim.sound_events.extend(self.sound_events)
+        self.sound_events.clear()
+        return sim
+
+    def start_worker(self, hz: int | None = None) -> "SimulationWorker":
+        """切到线程模式：规则在 worker 线程上跑，本对象改为跟随其发布的快照。"""
+        sim = self.fork()
+        self.worker = SimulationWorker(sim, hz or self.step_hz)
+        self.sim = sim
+        self.follow_worker()
+        self.worker.start()
+        return self.worker
+
+    def follow_worker(self) -> bool:
+        """UI 线程：把 worker 最新发布的快照套到自身，返回是否换了新帧。"""
+        snapshot = self.worker.latest()
+        if snapshot is None or snapshot.seq == self.shown_seq:
+            return False
+        snapshot.apply(self)
+        self.shown_seq = snapshot.seq
+        return True
+
+
+# 画面/HUD 需要的标量字段（快照二进制格式里的字段 + 文本与少量引用）
+RENDER_FIELDS = FLOAT_FIELDS + INT_FIELDS + FLAG_FIELDS + (
+    "mode",
+    "practice",
+    "start_time",
+    "status_text",
+    "current_hint",
+    "achievement_text",
+    "game_over_reason",
+    "ghost_track",
+    "input_latency",
+    "inputs_applied",
+    "waiting_rival",
+)
+
+
+class RenderSnapshot:
+    """某一步结束时画面需要的全部状态；发布后不再修改，UI 线程可随时读取。"""
+
+    __slots__ = (
+        "seq",
+        "values",
+        "horse",
+        "obstacles",
+        "air_stars",
+        "powerups",
+        "fireworks",
+        "achievements",
+        "records",
+    )
+
+    def __init__(self, seq: int, sim: HorseSimulation) -> None:
+        self.seq = seq
+        self.values = tuple(getattr(sim, name) for name in RENDER_FIELDS)
+        # 列表换成元组、字典逐个复制，worker 后续的原地修改不会影响已发布的帧
+        self.horse = dict(sim.horse)
+        self.obstacles = tuple(dict(o) for o in sim.obstacles)
+        self.air_stars = tuple(dict(s) for s in sim.air_stars)
+        self.powerups = tuple(dict(p) for p in sim.powerups)
+        self.fireworks = tuple(
+            {"color": fw["color"], "id": fw["id"], "particles": tuple(dict(p) for p in fw["particles"])}
+            for fw in sim.fireworks
+        )
+        self.achievements = frozenset(sim.achievements)
+        self.records = dict(sim.records)
+
+    def apply(self, game: Any) -> None:
+        """把快照内容挂到画面镜像对象上（只换引用，不复制）。"""
+        for name, value in zip(RENDER_FIELDS, self.values):
+            setattr(game, name, value)
+        game.horse = self.horse
+        game.obstacles = self.obstacles
+        game.air_stars = self.air_stars
+        game.powerups = self.powerups
+        game.fireworks = self.fireworks
+        game.achievements = self.achievements
+        game.records = self.records
+
+
+class SimulationWorker:
+    """在独立线程上按固定帧率推进模拟，每步发布一份只读快照（双缓冲）。"""
+
+    def __init__(self, sim: HorseSimulation, hz: int = 60) -> None:
+        self.sim = sim
+        self.pacer = FramePacer(hz if hz in FramePacer.RATES else 60)
+        self.sim.step_hz = self.pacer.target_hz
+        # 两个槽位轮流写：新帧写进后台槽，再用一次赋值把 front 翻过去
+        self.buffers: List[RenderSnapshot | None] = [None, None]
+        self.front = 0
+        self.seq = 0
+        self.rate_request: int | None = None
+        self.hold = False
+        self.parked = threading.Event()
+        self.wakeup = threading.Event()
+        self.stopping = False
+        self.thread: threading.Thread | None = None
+        self.step_time = 0.0  # 最近一步规则 + 发布的耗时（秒）
+        sim.input_hook = self.wakeup.set
+        self._publish()
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self._run, name="horse-sim", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopping = True
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(1.0)
+
+    def latest(self) -> RenderSnapshot | None:
+        return self.buffers[self.front]
+
+    def set_rate(self, hz: int) -> None:
+        """UI 切换帧率时调用，由 worker 线程在下一步生效。"""
+        self.rate_request = hz
+        self.wakeup.set()
+
+    def suspend(self, timeout: float = 1.0) -> bool:
+        """让 worker 停在两步之间，之后调用方可以直接读写 sim（如写快照），再 resume()。"""
+        self.parked.clear()
+        self.hold = True
+        self.wakeup.set()
+        if self.thread is None or not self.thread.is_alive():
+            return True
+        return self.parked.wait(timeout)
+
+    def resume(self) -> None:
+        self.hold = False
+        self.wakeup.set()
+
+    def _publish(self) -> None:
+        self.seq += 1
+        back = 1 - self.front
+        self.buffers[back] = RenderSnapshot(self.seq, self.sim)
+        self.front = back
+
+    def _run(self) -> None:
+        pacer = self.pacer
+        while not self.stopping:
+            if self.hold:
+                self.parked.set()
+                self.wakeup.wait(0.1)
+                self.wakeup.clear()
+                pacer.restart()
+                continue
+            if self.rate_request is not None:
+                pacer.set_rate(self.rate_request)
+                self.sim.step_hz = pacer.target_hz
+                self.rate_request = None
+            start = time.perf_counter()
+            dt = min(0.05, pacer.begin_frame())
+            self.sim.step(dt)
+            self._publish()
+            self.step_time = time.perf_counter() - start
+            # 空闲时降频；有输入时 post_input 会立刻叫醒
+            pacer.set_idle(self.sim.is_idle() and not self.sim.inputs)
+            self.wakeup.wait(pacer.next_delay())
+            self.wakeup.clear()
@@ -0,0 +1,322 @@
+"""
+Compact binary snapshots of the horse game's simulation state.
+
+pack_state/restore_state work on either front-end's game object (they share
+attribute names) and cover everything needed to continue a run exactly:
+the horse, obstacles, stars, power-ups, effect timers and the challenge
+sequence. Fireworks and lanterns are cosmetic and are not stored.
+pack_state(game, course=True) also stores the course generator's state, so
+a resumed seeded run keeps producing the same obstacles. The suspend
+snapshot needs this; the per-frame practice rewind and spectator stream do
+not, and skip its 2.5 KB.
+"""
+
+import math
+import random
+import struct
+import sys
+from array import array
+from typing import Any, List
+
+MAGIC = b"HGSS"
+# 2：动画字段换成 anim_clip/anim_time（片段下标与片段内时间），旧文件里同一位置存的是别的含义
+# 3：加入跳跃缓冲/土狼时间状态与可选的赛道随机源状态
+# 4：每个障碍带上编号（显示列表的键），并存下一个编号
+# 5：星星和道具也带上编号
+VERSION = 5
+FLAG_COURSE = 1  # 文件头标志位：末尾附有 course_rng 状态
+
+THEMES = ("fence", "data", "lantern", "light")
+KINDS = ("slow", "shield", "magnet", "double")
+MODES = ("endless", "challenge", "timed")
+
+HEADER = struct.Struct("<4sHH")
+# 马 (x, y, w, h, vy) + 各类计时器/进度，全部用 double 以便精确续玩
+FLOAT_FIELDS = (
+    "spawn_timer",
+    "star_spawn_timer",
+    "powerup_spawn_timer",
+    "invincible_timer",
+    "slow_timer",
+    "magnet_timer",
+    "double_score_timer",
+    "slide_timer",
+    "slide_cooldown",
+    "star_combo_timer",
+    "achievement_timer",
+    "hint_sound_cooldown",
+    "countdown_timer",
+    "elapsed",
+    "distance",
+    "difficulty",
+    "challenge_timer",
+    "anim_time",
+    "ground_seen",
+    "buffered_jump",  # None 存成 NaN
+)
+INT_FIELDS = (
+    "jumps",
+    "air_jumps_used",
+    "score",
+    "total_stars",
+    "star_combo",
+    "stage",
+    "challenge_index",
+    "jump_sound_counter",
+    "anim_clip",
+    "spawn_serial",
+)
+FLAG_FIELDS = ("shield", "running", "paused", "awaiting_start", "preparing_start", "jump_prompt_played")
+SCALARS = struct.Struct(f"<5d{len(FLOAT_FIELDS)}d{len(INT_FIELDS)}iBBB")
+COUNT = struct.Struct("<H")
+STR_LEN = struct.Struct("<B")
+ITEM_ID = struct.Struct("<I")
+# random.Random.getstate()：(版本, 624 个状态字 + 下标, gauss_next)，gauss_next 为 None 时存 NaN
+RNG = struct.Struct("<Bd625I")
+
+_SWAP = sys.byteorder != "little"
+
+
+def _pack_floats(out: bytearray, values: List[float]) -> None:
+    data = array("d", values)
+    if _SWAP:
+        data.byteswap()
+    out += data.tobytes()
+
+
+def _unpack_floats(data: bytes, offset: int, count: int) -> tuple[array, int]:
+    end = offset + count * 8
+    values = array("d")
+    values.frombytes(data[offset:end])
+    if _SWAP:
+        values.byteswap()
+    return values, end
+
+
+def _pack_ids(out: bytearray, items: List[dict]) -> None:
+    out += struct.pack(f"<{len(items)}I", *(item["id"] for item in items))
+
+
+def _unpack_ids(data: bytes, offset: int, count: int) -> tuple[tuple, int]:
+    return struct.unpack_from(f"<{count}I", data, offset), offset + count * ITEM_ID.size
+
+
+def _pack_str(out: bytearray, text: str) -> None:
+    raw = text.encode("utf-8")[:255]
+    out += STR_LEN.pack(len(raw))
+    out += raw
+
+
+def _unpack_str(data: bytes, offset: int) -> tuple[str, int]:
+    (length,) = STR_LEN.unpack_from(data, offset)
+    offset += STR_LEN.size
+    return data[offset:offset + length].decode("utf-8", "replace"), offset + length
+
+
+def _code(table: tuple, value: str) -> int:
+    return table.index(value) if value in table else 0
+
+
+def _float(value: float | None) -> float:
+    return math.nan if value is None else float(value)
+
+
+def _pack_rng(out: bytearray, rng: random.Random) -> None:
+    version, words, gauss_next = rng.getstate()
+    out += RNG.pack(version, _float(gauss_next), *words)
+
+
+def _unpack_rng(data: bytes, offset: int) -> tuple:
+    version, gauss_next, *words = RNG.unpack_from(data, offset)
+    return (version, tuple(words), None if math.isnan(gauss_next) else gauss_next)
+
+
+def pack_state(game: Any, course: bool = False) -> bytes:
+    """把当前局面打包成字节串；course 为真时连赛道随机源的状态一起存（挂起续玩用）。"""
+    horse = game.horse
+    flags = 0
+    for bit, name in enumerate(FLAG_FIELDS):
+        if getattr(game, name, False):
+            flags |= 1 << bit
+    if horse["on_ground"]:
+        flags |= 1 << len(FLAG_FIELDS)
+
+    out = bytearray(HEADER.pack(MAGIC, VERSION, FLAG_COURSE if course else 0))
+    out += SCALARS.pack(
+        horse["x"],
+        horse["y"],
+        horse["w"],
+        horse["h"],
+        horse["vy"],
+        *[_float(getattr(game, name, 0.0)) for name in FLOAT_FIELDS],
+        *[int(getattr(game, name, 0)) for name in INT_FIELDS],
+        flags,
+        _code(MODES, game.mode),
+        0,
+    )
+    for text in (game.status_text, game.current_hint, game.achievement_text, game.game_over_reason):
+        _pack_str(out, text)
+    out += COUNT.pack(len(game.achievements))
+    for title in sorted(game.achievements):
+        _pack_str(out, title)
+
+    out += COUNT.pack(len(game.obstacles))
+    _pack_floats(out, [v for o in game.obstacles for v in (o["x"], o["y"], o["w"], o["h"], o["speed"])])
+    for obs in game.obstacles:
+        out.append(_code(THEMES, obs["theme"]))
+        _pack_str(out, obs.get("label", ""))
+        out += ITEM_ID.pack(obs["id"])
+
+    out += COUNT.pack(len(game.air_stars))
+    _pack_floats(out, [v for s in game.air_stars for v in (s["x"], s["y"], s["size"], s["speed"])])
+    _pack_ids(out, game.air_stars)
+
+    out += COUNT.pack(len(game.powerups))
+    _pack_floats(out, [v for p in game.powerups for v in (p["x"], p["y"], p["size"], p["speed"])])
+    out += bytes(_code(KINDS, p["kind"]) for p in game.powerups)
+    _pack_ids(out, game.powerups)
+
+    out += COUNT.pack(len(game.challenge_pattern))
+    _pack_floats(out, [v for c in game.challenge_pattern for v in (c["delay"], c["h"], c["w"], c["speed"])])
+    for cfg in game.challenge_pattern:
+        out.append(_code(THEMES, cfg["theme"]))
+        _pack_str(out, cfg.get("label", ""))
+    if course:
+        _pack_rng(out, game.course_rng)
+    return bytes(out)
+
+
+def restore_state(game: Any, data: bytes) -> None:
+    """从字节串恢复局面；格式不符时抛出 ValueError，game 不被改动。"""
+    try:
+        magic, version, header_flags = HEADER.unpack_from(data, 0)
+    except struct.error as exc:
+        raise ValueError("snapshot too short") from exc
+    if magic != MAGIC:
+        raise ValueError("not a horse game snapshot")
+    if version != VERSION:
+        raise ValueError(f"unsupported snapshot version {version}")
+    try:
+        state = _decode(data, HEADER.size, bool(header_flags & FLAG_COURSE))
+    except (struct.error, IndexError, UnicodeDecodeError, ValueError, TypeError) as exc:
+        raise ValueError("corrupt snapshot") from exc
+
+    scalars = state["scalars"]
+    hx, hy, hw, hh, hvy = scalars[:5]
+    floats = scalars[5:5 + len(FLOAT_FIELDS)]
+    ints = scalars[5 + len(FLOAT_FIELDS):5 + len(FLOAT_FIELDS) + len(INT_FIELDS)]
+    flags, mode_code, _reserved = scalars[-3:]
+
+    game.horse = {
+        "x": hx,
+        "y": hy,
+        "w": hw,
+        "h": hh,
+        "vy": hvy,
+        "on_ground": bool(flags & (1 << len(FLAG_FIELDS))),
+    }
+    for name, value in zip(FLOAT_FIELDS, floats):
+        setattr(game, name, None if math.isnan(value) else value)
+    for name, value in zip(INT_FIELDS, ints):
+        setattr(game, name, value)
+    for bit, name in enumerate(FLAG_FIELDS):
+        setattr(game, name, bool(flags & (1 << bit)))
+    game.mode = MODES[mode_code] if mode_code < len(MODES) else MODES[0]
+    # 计时基于墙钟：用已用时间反推开局时刻
+    game.start_time = game.clock() - game.elapsed
+    game.status_text, game.current_hint, game.achievement_text, game.game_over_reason = state["texts"]
+    game.achievements = set(state["achievements"])
+    game.obstacles = state["obstacles"]
+    game.air_stars = state["air_stars"]
+    game.powerups = state["powerups"]
+    game.challenge_pattern = state["challenge_pattern"]
+    if state["course_rng"] is not None:
+        game.course_rng.setstate(state["course_rng"])
+
+
+def _decode(data: bytes, offset: int, course: bool) -> dict:
+    scalars = SCALARS.unpack_from(data, offset)
+    offset += SCALARS.size
+    texts = []
+    for _ in range(4):
+        text, offset = _unpack_str(data, offset)
+        texts.append(text)
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    achievements = []
+    for _ in range(count):
+        title, offset = _unpack_str(data, offset)
+        achievements.append(title)
+
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    values, offset = _unpack_floats(data, offset, count * 5)
+    obstacles = []
+    for i in range(count):
+        theme = THEMES[data[offset]] if data[offset] < len(THEMES) else THEMES[0]
+        label, offset = _unpack_str(data, offset + 1)
+        (obstacle_id,) = ITEM_ID.unpack_from(data, offset)
+        offset += ITEM_ID.size
+        x, y, w, h, speed = values[i * 5:i * 5 + 5]
+        obstacles.append(
+            {"x": x, "y": y, "w": w, "h": h, "speed": speed, "theme": theme, "label": label, "id": obstacle_id}
+        )
+
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    values, offset = _unpack_floats(data, offset, count * 4)
+    ids, offset = _unpack_ids(data, offset, count)
+    air_stars = [
+        {
+            "x": values[i * 4],
+            "y": values[i * 4 + 1],
+            "size": values[i * 4 + 2],
+            "speed": values[i * 4 + 3],
+            "id": ids[i],
+        }
+        for i in range(count)
+    ]
+
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    values, offset = _unpack_floats(data, offset, count * 4)
+    kinds = data[offset:offset + count]
+    if len(kinds) != count:
+        raise IndexError("truncated power-up kinds")
+    offset += count
+    ids, offset = _unpack_ids(data, offset, count)
+    powerups = [
+        {
+            "x": values[i * 4],
+            "y": values[i * 4 + 1],
+            "size": values[i * 4 + 2],
+            "speed": values[i * 4 + 3],
+            "kind": KINDS[kinds[i]] if kinds[i] < len(KINDS) else KINDS[0],
+            "id": ids[i],
+        }
+        for i in range(count)
+    ]
+
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    values, offset = _unpack_floats(data, offset, count * 4)
+    pattern = []
+    for i in range(count):
+        theme = THEMES[data[offset]] if data[offset] < len(THEMES) else THEMES[0]
+        label, offset = _unpack_str(data, offset + 1)
+        delay, h, w, speed = values[i * 4:i * 4 + 4]
+        pattern.append({"delay": delay, "h": h, "w": w, "speed": speed, "theme": theme, "label": label})
+    course_rng = _unpack_rng(data, offset) if course else None
+    if course_rng is not None:
+        # 先验证再交给 restore_state，setstate 失败时 game 还没被改动
+        random.Random().setstate(course_rng)
+    return {
+        "scalars": scalars,
+        "texts": texts,
+        "achievements": achievements,
+        "obstacles": obstacles,
+        "air_stars": air_stars,
+        "powerups": powerups,
+        "challenge_pattern": pattern,
+        "course_rng": course_rng,
+    }
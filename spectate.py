@@ -0,0 +1,423 @@
+"""
+Spectator broadcast: mirror a player's run onto other screens.
+
+The playing game hands snapshot.pack_state() bytes to SpectatorServer.publish()
+every frame. That call only stores a reference to the newest frame, so its
+cost on the game thread does not depend on how many viewers are connected.
+The server's asyncio loop picks the frame up at 60 Hz, encodes it once, as a keyframe or a
+zlib delta against the current keyframe (same scheme as rewind.py), and fans
+it out to a single newest-frame slot per subscriber. A newer frame replaces
+one still waiting in the slot.
+
+Viewers acknowledge every frame they have processed. The server keeps at most
+`window` unacknowledged frames in flight per viewer, so a slow viewer never
+has seconds of old frames queued up in kernel or transport buffers: when it
+is ready for more, it gets the newest frame, and everything in between is
+dropped for that viewer only. Every delta is relative to a keyframe, and a
+viewer holding a stale keyframe is sent the current one first, so any frame it
+receives still decodes.
+
+Run ``python spectate.py watch HOST:PORT`` for a text monitor of a stream,
+or ``python spectate.py selftest`` to measure fan-out with many viewers.
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import socket
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Tuple
+
+MAGIC = b"HGSP"
+VERSION = 2
+HELLO = struct.Struct("<4sHH")
+# 类型 (0 关键帧 / 1 增量 / 2 补发的关键帧), 帧序号, 关键帧序号, 数据长度
+FRAME = struct.Struct("<BIII")
+# 观众 → 服务端：处理完的帧序号
+ACK = struct.Struct("<I")
+KIND_KEY = 0
+KIND_DELTA = 1
+KIND_BASE = 2  # 只作为后面增量的解码底，不是新画面
+DEFAULT_PORT = 47320
+
+
+def _delta(state: bytes, key: bytes) -> bytes:
+    packer = zlib.compressobj(1, zlib.DEFLATED, 12, 5, zdict=key)
+    return packer.compress(state) + packer.flush()
+
+
+def _undelta(delta: bytes, key: bytes) -> bytes:
+    unpacker = zlib.decompressobj(12, zdict=key)
+    return unpacker.decompress(delta) + unpacker.flush()
+
+
+class _Subscriber:
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.slot: bytes | None = None  # 最新一帧，还没发出；新帧直接覆盖
+        self.wake = asyncio.Event()
+        self.key_serial = -1  # 对方手上的关键帧
+        self.in_flight = 0  # 已发出、还没确认的帧数
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+
+class SpectatorServer:
+    """本机观战广播：游戏线程 O(1) 投递，网络线程编码一次后分发给所有观众。"""
+
+    def __init__(
+        self,
+        port: int = DEFAULT_PORT,
+        keyframe_interval: int = 60,
+        window: int = 2,
+        send_hz: int = 60,
+    ) -> None:
+        self.port = port
+        self.send_hz = send_hz
+        self.keyframe_interval = keyframe_interval
+        self.window = window
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.thread: threading.Thread | None = None
+        self.ready = threading.Event()
+        self.stop_event: asyncio.Event | None = None
+        self.error: str | None = None  # 端口监听失败等，HUD 上显示
+        self.subscribers: List[_Subscriber] = []
+        # 游戏线程只写这一个字段；网络线程按固定频率取走最新帧，没取走的旧帧直接被覆盖
+        self.latest: bytes | None = None
+        self.seq = 0
+        self.key_serial = -1
+        self.key_frame = b""
+        self.key_packet = b""
+        self.base_packet = b""
+        self.since_key = keyframe_interval
+        self.frames_published = 0
+        self.bytes_out = 0
+
+    # --- 游戏线程接口 ---
+    def start(self) -> bool:
+        """启动网络线程；端口监听失败时返回 False，原因记在 error 里。"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if not self.ready.wait(2.0):
+            self.error = "网络线程启动超时"
+        return self.error is None
+
+    def stop(self) -> None:
+        if self.loop is not None and self.stop_event is not None:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+        if self.thread is not None:
+            self.thread.join(1.0)
+
+    def publish(self, state: bytes) -> None:
+        """投递一帧（常数开销，与观众数量无关）。"""
+        self.frames_published += 1
+        self.latest = state
+
+    def stats(self) -> Dict[str, Any]:
+        subscribers = list(self.subscribers)
+        return {
+            "viewers": len(subscribers),
+            "published": self.frames_published,
+            "coalesced": self.frames_published - self.seq,
+            "encoded": self.seq,
+            "bytes_out": self.bytes_out,
+            "viewer_dropped": sum(s.dropped for s in subscribers),
+        }
+
+    # --- 网络线程 ---
+    def _run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        try:
+            server = await asyncio.start_server(self._serve, "127.0.0.1", self.port)
+        except OSError as exc:
+            # asyncio 把系统错误包成一长串说明，只留错误码对应的那句
+            reason = os.strerror(exc.errno) if exc.errno else str(exc)
+            self.error = f"端口 {self.port} 监听失败（{reason}）"
+            self.ready.set()
+            return
+        self.ready.set()
+        period = 1.0 / self.send_hz
+        deadline = self.loop.time()
+        try:
+            while not self.stop_event.is_set():
+                self._fan_out()
+                deadline += period
+                await asyncio.sleep(max(0.0, deadline - self.loop.time()))
+        finally:
+            server.close()
+            for sub in list(self.subscribers):
+                sub.writer.close()
+            await server.wait_closed()
+
+    def _fan_out(self) -> None:
+        state = self.latest
+        self.latest = None
+        if state is None:
+            return
+        self.seq += 1
+        if self.since_key >= self.keyframe_interval:
+            self.key_serial += 1
+            self.key_frame = state
+            self.key_packet = FRAME.pack(KIND_KEY, self.seq, self.key_serial, len(state)) + state
+            self.base_packet = FRAME.pack(KIND_BASE, self.seq, self.key_serial, len(state)) + state
+            packet = self.key_packet
+            self.since_key = 1
+        else:
+            delta = _delta(state, self.key_frame)
+            packet = FRAME.pack(KIND_DELTA, self.seq, self.key_serial, len(delta)) + delta
+            self.since_key += 1
+        # 槽位里的增量总是相对当前关键帧：关键帧只在这里更换，换的同时槽位也被新帧覆盖
+        for sub in self.subscribers:
+            if sub.slot is not None:
+                sub.dropped += 1
+            sub.slot = packet
+            sub.wake.set()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sub = _Subscriber(writer)
+        self.subscribers.append(sub)
+        acks = asyncio.ensure_future(self._read_acks(reader, sub))
+        try:
+            writer.write(HELLO.pack(MAGIC, VERSION, self.keyframe_interval))
+            while not sub.closed:
+                await sub.wake.wait()
+                sub.wake.clear()
+                # 在途帧满了就等确认；这期间新帧只覆盖槽位，观众落后多少帧都不会排队
+                if sub.slot is None or sub.in_flight >= self.window:
+                    continue
+                packet, sub.slot = sub.slot, None
+                if sub.key_serial != self.key_serial and packet is not self.key_packet:
+                    # 新观众或手上的关键帧过期：先补当前关键帧
+                    self._send(sub, self.base_packet)
+                self._send(sub, packet)
+                sub.key_serial = self.key_serial
+                await writer.drain()
+        except (ConnectionError, OSError, asyncio.CancelledError):
+            pass
+        finally:
+            acks.cancel()
+            self.subscribers.remove(sub)
+            writer.close()
+
+    def _send(self, sub: _Subscriber, packet: bytes) -> None:
+        sub.writer.write(packet)
+        sub.in_flight += 1
+        sub.sent += 1
+        self.bytes_out += len(packet)
+
+    async def _read_acks(self, reader: asyncio.StreamReader, sub: _Subscriber) -> None:
+        try:
+            while True:
+                await reader.readexactly(ACK.size)
+                sub.in_flight = max(0, sub.in_flight - 1)
+                sub.wake.set()
+        except (ConnectionError, OSError, asyncio.IncompleteReadError):
+            pass
+        sub.closed = True
+        sub.wake.set()
+
+
+class SpectatorClient:
+    """观众端：后台线程收流并解码，游戏线程用 poll() 取最新状态。"""
+
+    def __init__(self, addr: Tuple[str, int], read_delay: float = 0.0) -> None:
+        self.addr = addr
+        self.read_delay = read_delay
+        self.thread: threading.Thread | None = None
+        self.sock: socket.socket | None = None
+        self.closed = False
+        self.latest: bytes | None = None
+        self.frames = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.last_seq = 0
+        self.error = ""
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.closed = True
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def poll(self) -> bytes | None:
+        """返回自上次调用以来最新的一帧，没有新帧时返回 None。"""
+        state = self.latest
+        self.latest = None
+        return state
+
+    def _run(self) -> None:
+        keyframes: Dict[int, bytes] = {}
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock.settimeout(5.0)
+            self.sock.connect(self.addr)
+            self.sock.settimeout(None)
+            magic, version, _interval = HELLO.unpack(self._read(HELLO.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("not a horse game spectator stream")
+            while not self.closed:
+                kind, seq, serial, length = FRAME.unpack(self._read(FRAME.size))
+                payload = self._read(length)
+                self.bytes_in += FRAME.size + length
+                state = None
+                if kind == KIND_KEY:
+                    keyframes = {serial: payload}
+                    state = payload
+                elif kind == KIND_BASE:
+                    keyframes = {serial: payload}
+                elif serial in keyframes:
+                    state = _undelta(payload, keyframes[serial])
+                if state is not None:
+                    if self.last_seq and seq > self.last_seq + 1:
+                        self.skipped += seq - self.last_seq - 1
+                    self.last_seq = seq
+                    self.frames += 1
+                    self.latest = state
+                    if self.read_delay:
+                        time.sleep(self.read_delay)
+                # 每一帧都确认（包括补发的关键帧），服务端据此控制在途帧数
+                self.sock.sendall(ACK.pack(seq))
+        except (OSError, ValueError, EOFError, struct.error, zlib.error) as exc:
+            if not self.closed:
+                self.error = str(exc) or type(exc).__name__
+
+    def _read(self, size: int) -> bytes:
+        # 按需从 socket 读取，不预读；在途帧数由服务端的确认窗口限制
+        data = bytearray(size)
+        view = memoryview(data)
+        got = 0
+        while got < size:
+            n = self.sock.recv_into(view[got:])
+            if n == 0:
+                raise EOFError("stream closed")
+            got += n
+        return bytes(data)
+
+
+def parse_addr(text: str) -> Tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def _watch(addr: Tuple[str, int]) -> None:
+    from snapshot import FLOAT_FIELDS, HEADER, SCALARS
+
+    client = SpectatorClient(addr)
+    client.start()
+    distance_at = 5 + FLOAT_FIELDS.index("distance")
+    last_frames = last_bytes = 0
+    try:
+        while client.thread is not None and client.thread.is_alive():
+            time.sleep(1.0)
+            state = client.poll()
+            line = f"{client.frames - last_frames} fps, {(client.bytes_in - last_bytes) * 8 / 1000:.1f} kbit/s"
+            if state is not None:
+                scalars = SCALARS.unpack_from(state, HEADER.size)
+                line += f", distance {scalars[distance_at]:.1f}"
+            print(line + f", skipped {client.skipped}")
+            last_frames, last_bytes = client.frames, client.bytes_in
+    except KeyboardInterrupt:
+        pass
+    client.stop()
+    if client.error:
+        print(f"stream ended: {client.error}")
+
+
+def _selftest(viewers: int, slow: int, seconds: float, port: int) -> None:
+    server = SpectatorServer(port)
+    if not server.start():
+        raise SystemExit(server.error)
+    # 同一端口再开一次必须报错，而不是假装在广播
+    taken = SpectatorServer(port)
+    if taken.start():
+        raise SystemExit(f"second listen on port {port} did not fail")
+    # 慢观众每 0.1 s 才处理一帧
+    slow_delay = 0.1
+    clients = [
+        SpectatorClient(("127.0.0.1", port), slow_delay) if i < slow else SpectatorClient(("127.0.0.1", port))
+        for i in range(viewers)
+    ]
+    for client in clients:
+        client.start()
+    time.sleep(0.3)
+    # 模拟一份约 700 字节、每帧只有少量字段变化的快照
+    state = bytearray(bytes(range(256)) * 2 + bytes(200))
+    publish_cost = 0.0
+    frames = 0
+    # 慢观众落后多少帧：服务端最新帧序号 - 观众最后收到的序号（跳过开头的连接阶段）
+    max_lag = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        if time.perf_counter() - start > 0.5:
+            for client in clients[:slow]:
+                max_lag = max(max_lag, server.seq - client.last_seq)
+        struct.pack_into("<dd", state, 16, frames / 60.0, frames * 0.108)
+        state[300 + frames % 40] = frames % 256
+        payload = bytes(state)
+        t0 = time.perf_counter()
+        server.publish(payload)
+        publish_cost += time.perf_counter() - t0
+        frames += 1
+        time.sleep(1 / 60)
+    time.sleep(0.3)
+    stats = server.stats()
+    for client in clients:
+        client.stop()
+    server.stop()
+    print(
+        f"{viewers} viewers ({slow} slow): {frames} frames, "
+        f"publish {publish_cost / frames * 1e6:.1f} us/frame on the game thread, "
+        f"{stats['bytes_out'] / max(1, stats['encoded']) / max(1, viewers):.0f} B/frame/viewer, "
+        f"{stats['viewer_dropped']} frames dropped for slow viewers"
+    )
+    for i, client in enumerate(clients[: max(slow + 1, 1)]):
+        kind = "slow" if i < slow else "fast"
+        print(f"  {kind} viewer: received {client.frames}, skipped {client.skipped} {client.error}".rstrip())
+    if slow:
+        # 确认窗口内的帧 + 观众处理一帧期间新产生的帧，再留一点调度余量
+        per_read = math.ceil(slow_delay * server.send_hz)
+        bound = (server.window + 1) * per_read + 4
+        print(f"  slow viewers lag at most {max_lag} frames (bound {bound})")
+        if max_lag > bound:
+            raise SystemExit(f"slow viewers fell {max_lag} frames behind, more than {bound}")
+    print(f"  second listen reported: {taken.error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Horse game spectator stream tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    watch = sub.add_parser("watch", help="print a summary of a live stream")
+    watch.add_argument("addr", nargs="?", default=f"127.0.0.1:{DEFAULT_PORT}")
+    test = sub.add_parser("selftest", help="fan out a synthetic stream to local viewers")
+    test.add_argument("--viewers", type=int, default=20)
+    test.add_argument("--slow", type=int, default=2, help="viewers that read only 10 frames/s")
+    test.add_argument("--seconds", type=float, default=3.0)
+    test.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    if args.command == "watch":
+        _watch(parse_addr(args.addr))
+    elif args.command == "selftest":
+        _selftest(args.viewers, args.slow, args.seconds, args.port)
+
+
+if __name__ == "__main__":
+    main()
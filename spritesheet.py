@@ -0,0 +1,83 @@
+"""
+Sprite-sheet layout and animation clips for the horse.
+
+Both front-ends pack the loaded horse frames into one atlas: a single row of
+equal cells, each frame in the top-left corner of its cell, with a
+transparent gap so linear filtering never bleeds a neighbour in. A clip is a
+list of frame names played at a fixed frame rate. The simulation keeps only
+the current clip and its clock, and horse_frame_key() turns them into a
+frame name, so changing frames never changes textures: Kivy moves the
+rectangle's tex_coords, Tk copies the frame's cell into the one view image
+its canvas item shows.
+
+Adding a frame is an entry in assets.SPRITES plus its name in a clip.
+"""
+
+from typing import Dict, NamedTuple, Tuple
+
+SHEET_GAP = 2
+
+
+class Clip(NamedTuple):
+    name: str
+    frames: Tuple[str, ...]
+    fps: float
+    loop: bool
+
+    @property
+    def duration(self) -> float:
+        return len(self.frames) / self.fps
+
+
+# 下标即快照里的 anim_clip；奔跑沿用原来每 0.18 s 换一帧的节奏
+CLIPS: Tuple[Clip, ...] = (
+    Clip("run", ("main", "jump"), 1 / 0.18, True),
+    Clip("jump", ("jump",), 1.0, False),
+    Clip("land", ("main",), 8.0, False),
+    Clip("slide", ("main",), 1.0, False),
+    Clip("defend", ("defend",), 1.0, False),
+)
+RUN, JUMP, LAND, SLIDE, DEFEND = range(len(CLIPS))
+
+
+def frame_at(clip: int, t: float) -> str:
+    """片段播放 t 秒时的帧名；不循环的片段停在最后一帧。"""
+    spec = CLIPS[clip] if 0 <= clip < len(CLIPS) else CLIPS[RUN]
+    index = int(t * spec.fps)
+    count = len(spec.frames)
+    return spec.frames[index % count if spec.loop else min(index, count - 1)]
+
+
+class Cell(NamedTuple):
+    """帧在图集里的矩形（自上而下的像素坐标）。"""
+
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+class SheetLayout(NamedTuple):
+    cell_w: int
+    cell_h: int
+    width: int
+    height: int
+    cells: Dict[str, Cell]
+
+
+def pack_sheet(sizes: Dict[str, Tuple[int, int]]) -> SheetLayout:
+    """按 {帧名: (宽, 高)} 排成一行等宽格子。"""
+    cell_w = max((w for w, _h in sizes.values()), default=0)
+    cell_h = max((h for _w, h in sizes.values()), default=0)
+    cells = {key: Cell(i * (cell_w + SHEET_GAP), 0, w, h) for i, (key, (w, h)) in enumerate(sizes.items())}
+    width = max(0, len(sizes) * (cell_w + SHEET_GAP) - SHEET_GAP)
+    return SheetLayout(cell_w, cell_h, width, cell_h, cells)
+
+
+def tex_coords(layout: SheetLayout, cell: Cell) -> Tuple[float, ...]:
+    """帧在自下而上纹理里的 UV（Kivy Rectangle.tex_coords 的顺序）。"""
+    u0 = cell.x / layout.width
+    u1 = (cell.x + cell.w) / layout.width
+    v0 = (layout.height - cell.y - cell.h) / layout.height
+    v1 = (layout.height - cell.y) / layout.height
+    return (u0, v0, u1, v0, u1, v1, u0, v1)
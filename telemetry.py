@@ -0,0 +1,317 @@
+"""
+Per-frame telemetry for the horse game.
+
+Every frame appends one fixed-width record (frame work time, dt, entity
+counts, difficulty, speed multiplier, active effects, input latency, the
+pacer's target rate at that frame) into a preallocated ring of chunks with
+struct.pack_into. When a chunk fills up it is handed to a background thread that zlib-compresses it and appends it to the session
+file, so the tick path never allocates or touches the disk. Only the newest
+few session files are kept.
+
+Run ``python telemetry.py analyze [FILES...]`` for a per-session summary of
+hitches, slow sections and input-to-action latency.
+"""
+
+import argparse
+import glob
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from typing import Any, BinaryIO, Dict, List, Tuple
+
+MAGIC = b"HGTL"
+VERSION = 3
+CHUNK_MAGIC = b"HGTC"
+# 文件头：魔数, 版本, 单条记录字节数, 开局时的目标帧率, 会话开始时间
+FILE_HEADER = struct.Struct("<4sHHHd")
+# 块头：魔数, 记录条数, 压缩后字节数
+CHUNK_HEADER = struct.Struct("<4sII")
+# 会话时间, 帧耗时(ms), dt(ms), 障碍/星星/道具/烟花数量, 难度, 速度倍率, 效果位, 状态位,
+# 本帧处理的最新输入从按下到生效的延迟(ms，本帧没有新输入为 0), 本帧的目标帧率（F 键可随时切换）
+RECORD = struct.Struct("<dffHHHHffBBfH")
+# 旧版本没有后面几列，读出时补上：输入延迟补 0，目标帧率取文件头里的
+OLD_RECORDS = {1: struct.Struct("<dffHHHHffBB"), 2: struct.Struct("<dffHHHHffBBf")}
+
+EFFECTS = ("shield", "invincible", "slow", "magnet", "double", "slide")
+STATES = ("running", "paused", "practice", "idle")  # 状态位，顺序即 record() 里的位序
+
+
+class TelemetryRecorder:
+    """逐帧定长记录写入预分配环形块，满块交给后台线程压缩落盘。"""
+
+    def __init__(
+        self,
+        directory: str,
+        target_hz: int = 60,
+        chunk_frames: int = 600,
+        chunks: int = 4,
+        keep_sessions: int = 20,
+    ) -> None:
+        self.directory = directory
+        self.target_hz = target_hz
+        self.chunk_frames = chunk_frames
+        self.chunk_bytes = chunk_frames * RECORD.size
+        self.chunks = chunks
+        self.keep_sessions = keep_sessions
+        self.buffer = bytearray(self.chunk_bytes * chunks)
+        # 每个块是否还在等后台线程写出；追上未写完的块时丢弃记录而不是阻塞
+        self.pending = [False] * chunks
+        self.chunk = 0
+        self.index = 0
+        self.dropped = 0
+        self.inputs_seen = 0
+        self.started = time.perf_counter()
+        self.path = ""
+        self.handle = None
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread: threading.Thread | None = None
+        self.enabled = False
+
+    def start(self) -> bool:
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            self._prune()
+            self.handle = self._open_session()
+            self.handle.write(FILE_HEADER.pack(MAGIC, VERSION, RECORD.size, self.target_hz, time.time()))
+        except OSError:
+            self.handle = None
+            return False
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._writer, daemon=True)
+        self.thread.start()
+        self.enabled = True
+        return True
+
+    def _open_session(self) -> BinaryIO:
+        """新建会话文件；名字带毫秒，同一时刻已有同名文件（另一个实例）就加序号，绝不续写别人的文件。"""
+        now = time.time()
+        stamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(now)) + f"_{int(now * 1000) % 1000:03d}"
+        for attempt in range(100):
+            suffix = f"-{attempt}" if attempt else ""
+            self.path = os.path.join(self.directory, f"session_{stamp}{suffix}.hgt")
+            try:
+                return open(self.path, "xb")
+            except FileExistsError:
+                continue
+        raise FileExistsError(self.path)
+
+    def record(self, frame_time: float, dt: float, game: Any, speed_mul: float, idle: bool, target_hz: int) -> None:
+        """追加一帧记录（几微秒，不分配、不做 I/O）。"""
+        if not self.enabled or self.pending[self.chunk]:
+            self.dropped += 1
+            return
+        effects = (
+            (1 if game.shield else 0)
+            | (2 if game.invincible_timer > 0 else 0)
+            | (4 if game.slow_timer > 0 else 0)
+            | (8 if game.magnet_timer > 0 else 0)
+            | (16 if game.double_score_timer > 0 else 0)
+            | (32 if game.slide_timer > 0 else 0)
+        )
+        states = (
+            (1 if game.running else 0)
+            | (2 if game.paused else 0)
+            | (4 if game.practice else 0)
+            | (8 if idle else 0)
+        )
+        input_ms = game.input_latency * 1000.0 if game.inputs_applied != self.inputs_seen else 0.0
+        self.inputs_seen = game.inputs_applied
+        RECORD.pack_into(
+            self.buffer,
+            self.chunk * self.chunk_bytes + self.index * RECORD.size,
+            time.perf_counter() - self.started,
+            frame_time * 1000.0,
+            dt * 1000.0,
+            len(game.obstacles),
+            len(game.air_stars),
+            len(game.powerups),
+            len(game.fireworks),
+            game.difficulty,
+            speed_mul,
+            effects,
+            states,
+            input_ms,
+            target_hz,
+        )
+        self.index += 1
+        if self.index == self.chunk_frames:
+            self._hand_off(self.index)
+
+    def flush(self) -> None:
+        """把未满的当前块也交给后台线程（切后台、退出前调用）。"""
+        if self.enabled and self.index:
+            self._hand_off(self.index)
+
+    def close(self) -> None:
+        if not self.enabled:
+            return
+        self.flush()
+        self.enabled = False
+        self.queue.put(None)
+        if self.thread is not None:
+            self.thread.join(2.0)
+
+    def _hand_off(self, count: int) -> None:
+        self.pending[self.chunk] = True
+        self.queue.put((self.chunk, count))
+        self.chunk = (self.chunk + 1) % self.chunks
+        self.index = 0
+
+    def _writer(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            chunk, count = item
+            start = chunk * self.chunk_bytes
+            payload = zlib.compress(bytes(self.buffer[start:start + count * RECORD.size]), 6)
+            self.pending[chunk] = False
+            try:
+                self.handle.write(CHUNK_HEADER.pack(CHUNK_MAGIC, count, len(payload)) + payload)
+                self.handle.flush()
+            except (OSError, ValueError):
+                pass
+        try:
+            self.handle.close()
+        except OSError:
+            pass
+
+    def _prune(self) -> None:
+        sessions = sorted(glob.glob(os.path.join(self.directory, "session_*.hgt")))
+        for path in sessions[:max(0, len(sessions) - self.keep_sessions + 1)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def read_session(path: str) -> Tuple[Dict[str, Any], List[tuple]]:
+    """读取一个会话文件，返回 (文件头信息, 记录列表)；截断的尾块被忽略。"""
+    with open(path, "rb") as handle:
+        data = handle.read()
+    try:
+        magic, version, record_size, target_hz, started_at = FILE_HEADER.unpack_from(data, 0)
+    except struct.error as exc:
+        raise ValueError("telemetry file too short") from exc
+    layout = OLD_RECORDS.get(version, RECORD if version == VERSION else None)
+    if magic != MAGIC or layout is None or record_size != layout.size:
+        raise ValueError("not a supported telemetry file")
+    records: List[tuple] = []
+    offset = FILE_HEADER.size
+    while offset + CHUNK_HEADER.size <= len(data):
+        chunk_magic, count, length = CHUNK_HEADER.unpack_from(data, offset)
+        offset += CHUNK_HEADER.size
+        if chunk_magic != CHUNK_MAGIC or offset + length > len(data):
+            break
+        try:
+            raw = zlib.decompress(data[offset:offset + length])
+        except zlib.error:
+            break
+        offset += length
+        records.extend(layout.iter_unpack(raw[:count * layout.size]))
+    if layout is not RECORD:
+        missing = (0.0, target_hz)[len(layout.unpack(bytes(layout.size))) - 11:]
+        records = [r + missing for r in records]
+    return {"target_hz": target_hz, "started_at": started_at}, records
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _flag_names(names: Tuple[str, ...], bits: int) -> str:
+    return ",".join(name for i, name in enumerate(names) if bits & (1 << i)) or "-"
+
+
+def _period_ms(record: tuple) -> float:
+    return 1000.0 / max(1, record[12])
+
+
+def analyze(path: str, window: float = 1.0, top: int = 3) -> str:
+    info, records = read_session(path)
+    active = [r for r in records if r[10] & 1 and not r[10] & 8]
+    rates = sorted({r[12] for r in active} or {info["target_hz"]})
+    lines = [
+        f"{os.path.basename(path)}  {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info['started_at']))}"
+        f"  target {'/'.join(str(hz) for hz in rates)} Hz"
+    ]
+    if not active:
+        lines.append(f"  {len(records)} frames, none while running")
+        return "\n".join(lines)
+    work = [r[1] for r in active]
+    dts = [r[2] for r in active]
+    duration = active[-1][0] - active[0][0]
+    lines.append(
+        f"  {len(active)} running frames over {duration:.1f}s"
+        f"  work mean {sum(work) / len(work):.2f} ms  p95 {_percentile(work, 0.95):.2f}  p99 {_percentile(work, 0.99):.2f}"
+        f"  dt p99 {_percentile(dts, 0.99):.1f} ms"
+    )
+    # 卡顿：dt 超过两个帧周期，或单帧工作时间超出一个帧周期（按该帧当时的目标帧率）
+    hitches = [r for r in active if r[2] > 2 * _period_ms(r) or r[1] > _period_ms(r)]
+    lines.append(f"  hitches: {len(hitches)} ({len(hitches) / len(active) * 100:.2f}% of frames)")
+    for r in sorted(hitches, key=lambda r: r[2], reverse=True)[:top]:
+        lines.append(
+            f"    t={r[0]:7.2f}s dt {r[2]:6.1f} ms work {r[1]:5.2f} ms"
+            f"  obstacles {r[3]} stars {r[4]} powerups {r[5]} fireworks {r[6]}  effects {_flag_names(EFFECTS, r[9])}"
+            f"  state {_flag_names(STATES, r[10])}"
+        )
+    # 慢区段：按固定窗口聚合，取平均 dt 最高的几个
+    sections: Dict[int, List[tuple]] = {}
+    for r in active:
+        sections.setdefault(int(r[0] / window), []).append(r)
+    ranked = sorted(sections.items(), key=lambda item: sum(r[2] for r in item[1]) / len(item[1]), reverse=True)
+    # 输入延迟：所有帧都算（开始、暂停这些按键也在内）
+    inputs = [r for r in records if r[11] > 0]
+    if inputs:
+        latencies = [r[11] for r in inputs]
+        # 以帧周期为单位也给一份，帧率切换过的会话里才可比
+        frames = [r[11] / _period_ms(r) for r in inputs]
+        lines.append(
+            f"  input latency: {len(latencies)} inputs  mean {sum(latencies) / len(latencies):.1f} ms"
+            f"  p95 {_percentile(latencies, 0.95):.1f}  max {max(latencies):.1f}"
+            f"  ({sum(frames) / len(frames):.2f} frames mean, {max(frames):.2f} max)"
+        )
+    lines.append(f"  slowest {window:g}s sections:")
+    for key, rows in ranked[:top]:
+        mean_dt = sum(r[2] for r in rows) / len(rows)
+        mean_work = sum(r[1] for r in rows) / len(rows)
+        peak = max(rows, key=lambda r: r[3] + r[4] + r[5] + r[6])
+        lines.append(
+            f"    {key * window:7.1f}s  {len(rows) / window:5.1f} fps  dt {mean_dt:5.1f} ms  work {mean_work:5.2f} ms"
+            f"  difficulty {rows[-1][7]:.2f} speed x{rows[-1][8]:.2f}"
+            f"  peak entities {peak[3] + peak[4] + peak[5] + peak[6]}"
+        )
+    return "\n".join(lines)
+
+
+def default_directory() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetry")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Horse game telemetry tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report = sub.add_parser("analyze", help="summarize hitches and slow sections per session")
+    report.add_argument("files", nargs="*", help="session files (default: all in ./telemetry)")
+    report.add_argument("--window", type=float, default=1.0, help="section length in seconds")
+    report.add_argument("--top", type=int, default=3)
+    args = parser.parse_args()
+    if args.command == "analyze":
+        files = args.files or sorted(glob.glob(os.path.join(default_directory(), "session_*.hgt")))
+        if not files:
+            print("no telemetry sessions found")
+        for path in files:
+            try:
+                print(analyze(path, args.window, args.top))
+            except (OSError, ValueError) as exc:
+                print(f"{path}: {exc}")
+
+
+if __name__ == "__main__":
+    main()
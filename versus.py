@@ -0,0 +1,339 @@
+"""
+Localhost two-player race over asyncio UDP.
+
+Each game instance runs a VersusPeer next to its normal loop. The game
+thread publishes its horse state every frame; the peer's asyncio loop runs
+on a background thread and sends a 41-byte packet at up to 60 Hz, but only
+when the state changed or as a 10 Hz heartbeat. Every packet carries the
+full state, so a lost packet is simply superseded by the next one.
+
+Races start together: pressing start marks the local side ready, and the
+ready time rides along in every packet. Once each side has seen the other's
+ready time, both count down to the same wall-clock moment, START_LEAD
+seconds after the later of the two. If the UDP port cannot be bound, the
+peer records the error for the HUD and the game plays on its own.
+
+Latency and packet loss can be simulated on the sending side. Run
+``python versus.py selftest`` to race two synthetic peers on localhost and
+print bandwidth and latency for each player.
+"""
+
+import argparse
+import asyncio
+import random
+import struct
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+# 魔数, 会话号, 序号, 发送时刻, 最近输入时刻, 高度, 距离, 标志, 准备时刻（0 为未准备）
+PACKET = struct.Struct("<2sIIddHfBd")
+MAGIC = b"HV"
+SEND_HZ = 60
+HEARTBEAT_EVERY = 6  # 无变化时每 6 帧补一个心跳包（10 Hz）
+STALE_AFTER = 2.0
+QUANT = 4.0
+START_LEAD = 3.0  # 双方都准备好后，从较晚的准备时刻起倒数这么久同时起跑
+
+
+class RemoteState(NamedTuple):
+    seq: int
+    sent_at: float
+    input_at: float
+    altitude: float
+    distance: float
+    running: bool
+    ready_at: float
+    received_at: float
+
+
+class _PeerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, peer: "VersusPeer") -> None:
+        self.peer = peer
+
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]) -> None:
+        self.peer._on_packet(data)
+
+
+class VersusPeer:
+    """一端的联机同步：后台线程跑 asyncio，游戏线程只读写最新状态。"""
+
+    def __init__(
+        self,
+        local_port: int,
+        peer_addr: Tuple[str, int],
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+    ) -> None:
+        self.local_port = local_port
+        self.peer_addr = peer_addr
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.net_rng = random.Random()
+        # 每次启动换一个会话号；对手重开后序号从 1 重来，靠它识别出新会话
+        self.session = self.net_rng.getrandbits(32)
+        self.remote_session: int | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.transport: asyncio.DatagramTransport | None = None
+        self.thread: threading.Thread | None = None
+        self.ready = threading.Event()
+        self.stop_event: asyncio.Event | None = None
+        self.error: str | None = None  # 端口绑定失败等，HUD 上显示
+        # 游戏线程写、网络线程读：整体替换元组，无需加锁
+        self.local: Tuple[float, float, bool, float] = (0.0, 0.0, False, 0.0)
+        self.remote: RemoteState | None = None
+        self.ready_at = 0.0
+        self.go_at: float | None = None
+        self.last_go = 0.0  # 上一局的起跑时刻，早于它的准备时刻属于上一局
+        self.seq = 0
+        self.last_sent: Tuple | None = None
+        self.frames_since_send = 0
+        self.started_at = 0.0
+        self.bytes_sent = 0
+        self.packets_sent = 0
+        self.packets_dropped = 0
+        self.packets_received = 0
+        self.packets_stale = 0
+        self.highest_seq = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.last_displayed_input = 0.0
+        self.input_latencies: List[float] = []
+
+    # --- 游戏线程接口 ---
+    def start(self) -> bool:
+        """启动网络线程；端口绑定失败时返回 False，原因记在 error 里。"""
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        if not self.ready.wait(2.0):
+            self.error = "网络线程启动超时"
+        return self.error is None
+
+    def stop(self) -> None:
+        if self.loop is not None and self.stop_event is not None:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
+        if self.thread is not None:
+            self.thread.join(1.0)
+
+    def publish(self, altitude: float, distance: float, running: bool, input_at: float) -> None:
+        self.local = (altitude, distance, running, input_at)
+
+    def set_ready(self, ready: bool) -> None:
+        """本地玩家按下开始（或重置取消）；准备时刻随每个包发给对手。"""
+        self.ready_at = time.time() if ready else 0.0
+        self.go_at = None
+
+    def start_time(self) -> float | None:
+        """双方都准备好后返回共同的起跑时刻（time.time() 墙钟），否则 None。"""
+        if self.go_at is None and self.ready_at:
+            remote = self.remote
+            if remote is not None and remote.ready_at > self.last_go:
+                self.go_at = max(self.ready_at, remote.ready_at) + START_LEAD
+                self.last_go = self.go_at
+        return self.go_at
+
+    def remote_state(self) -> RemoteState | None:
+        """读取对手最新状态（过期则返回 None），顺便统计输入到显示的延迟。"""
+        remote = self.remote
+        if remote is None:
+            return None
+        now = time.time()
+        if now - remote.received_at > STALE_AFTER:
+            return None
+        if remote.input_at > self.last_displayed_input:
+            self.last_displayed_input = remote.input_at
+            self.input_latencies.append(now - remote.input_at)
+            if len(self.input_latencies) > 240:
+                del self.input_latencies[:120]
+        return remote
+
+    def stats(self) -> Dict[str, Any]:
+        duration = max(1e-6, time.time() - self.started_at) if self.started_at else 0.0
+        received = self.packets_received
+        expected = self.highest_seq
+        recent = self.input_latencies
+        return {
+            "packets_sent": self.packets_sent,
+            "packets_dropped": self.packets_dropped,
+            "packets_received": received,
+            "packet_loss": 1.0 - received / expected if expected else 0.0,
+            "bandwidth_bps": self.bytes_sent * 8 / duration if duration else 0.0,
+            "one_way_ms": self.latency_sum / received * 1000 if received else 0.0,
+            "one_way_max_ms": self.latency_max * 1000,
+            "input_to_display_ms": sum(recent) / len(recent) * 1000 if recent else 0.0,
+        }
+
+    # --- 网络线程 ---
+    def _run(self) -> None:
+        asyncio.run(self._main())
+
+    async def _main(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        try:
+            self.transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: _PeerProtocol(self), local_addr=("127.0.0.1", self.local_port)
+            )
+        except OSError as exc:
+            self.error = f"端口 {self.local_port} 绑定失败（{exc.strerror or exc}）"
+            self.ready.set()
+            return
+        self.started_at = time.time()
+        self.ready.set()
+        period = 1.0 / SEND_HZ
+        deadline = self.loop.time()
+        try:
+            while not self.stop_event.is_set():
+                self._send_tick()
+                deadline += period
+                await asyncio.sleep(max(0.0, deadline - self.loop.time()))
+        finally:
+            self.transport.close()
+
+    def _send_tick(self) -> None:
+        altitude, distance, running, input_at = self.local
+        ready_at = self.ready_at
+        state = (round(altitude * QUANT), running, input_at, ready_at)
+        self.frames_since_send += 1
+        # 只在状态变化或心跳到期时发送（地面奔跑时基本只剩心跳）
+        if state == self.last_sent and self.frames_since_send < HEARTBEAT_EVERY:
+            return
+        self.last_sent = state
+        self.frames_since_send = 0
+        self.seq += 1
+        flags = 1 if running else 0
+        data = PACKET.pack(MAGIC, self.session, self.seq, time.time(), input_at, min(0xFFFF, state[0]), distance, flags, ready_at)
+        self.packets_sent += 1
+        self.bytes_sent += len(data) + 28  # 含 IPv4 + UDP 头
+        if self.loss and self.net_rng.random() < self.loss:
+            self.packets_dropped += 1
+            return
+        delay = self.latency + (self.net_rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            self.loop.call_later(delay, self._sendto, data)
+        else:
+            self._sendto(data)
+
+    def _sendto(self, data: bytes) -> None:
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.sendto(data, self.peer_addr)
+
+    def _new_remote_session(self, session: int) -> None:
+        """对手（重新）启动：序号和收包统计从头算，旧状态作废。"""
+        self.remote_session = session
+        self.remote = None
+        self.highest_seq = 0
+        self.packets_received = 0
+        self.packets_stale = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.last_displayed_input = 0.0
+        self.input_latencies = []
+
+    def _on_packet(self, data: bytes) -> None:
+        if len(data) != PACKET.size:
+            return
+        magic, session, seq, sent_at, input_at, altitude, distance, flags, ready_at = PACKET.unpack(data)
+        if magic != MAGIC:
+            return
+        if session != self.remote_session:
+            self._new_remote_session(session)
+        if seq <= self.highest_seq:
+            # 乱序到达的旧包直接丢弃
+            self.packets_stale += 1
+            return
+        now = time.time()
+        self.highest_seq = seq
+        self.packets_received += 1
+        one_way = max(0.0, now - sent_at)
+        self.latency_sum += one_way
+        self.latency_max = max(self.latency_max, one_way)
+        self.remote = RemoteState(seq, sent_at, input_at, altitude / QUANT, distance, bool(flags & 1), ready_at, now)
+
+
+def parse_peer(text: str) -> Tuple[str, int]:
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def _selftest(seconds: float, latency: float, jitter: float, loss: float, base_port: int) -> None:
+    a = VersusPeer(base_port, ("127.0.0.1", base_port + 1), latency, jitter, loss)
+    b = VersusPeer(base_port + 1, ("127.0.0.1", base_port), latency, jitter, loss)
+    for peer in (a, b):
+        if not peer.start():
+            raise SystemExit(peer.error)
+    # 同一端口再绑一次必须报错，而不是悄悄变成单人游戏
+    taken = VersusPeer(base_port, ("127.0.0.1", base_port + 1))
+    if taken.start():
+        raise SystemExit(f"second bind on port {base_port} did not fail")
+    start = time.time()
+    # 两边先后按下开始，应当算出同一个起跑时刻
+    a.set_ready(True)
+    ready_b = start + 0.4
+    go_at: Dict[int, float] = {}
+    next_jump = {id(a): start, id(b): start + 0.3}
+    input_at = {id(a): 0.0, id(b): 0.0}
+    while time.time() - start < seconds:
+        now = time.time()
+        t = now - start
+        for peer in (a, b):
+            if now >= next_jump[id(peer)]:
+                input_at[id(peer)] = now
+                next_jump[id(peer)] = now + 0.9
+            phase = now - input_at[id(peer)]
+            altitude = max(0.0, 1100 * phase - 1100 * phase * phase) if phase < 1.0 else 0.0
+            peer.publish(altitude, t * 6.5, True, input_at[id(peer)])
+            go = peer.start_time()
+            if go is not None:
+                go_at.setdefault(id(peer), go)
+        if not b.ready_at and now >= ready_b:
+            b.set_ready(True)
+        a.remote_state()
+        b.remote_state()
+        time.sleep(1 / 60)
+    b.stop()
+    # B 重开一局：序号从 1 重来，A 应当认出新会话继续收包
+    restarted = VersusPeer(base_port + 1, ("127.0.0.1", base_port), latency, jitter, loss)
+    if not restarted.start():
+        raise SystemExit(restarted.error)
+    stats_a = a.stats()
+    deadline = time.time() + 1.0
+    while time.time() < deadline and (a.remote_session != restarted.session or a.remote is None):
+        restarted.publish(0.0, 0.0, False, 0.0)
+        time.sleep(1 / 60)
+    restarted.stop()
+    a.stop()
+    if a.remote_session != restarted.session or a.remote is None:
+        raise SystemExit("packets from the restarted peer were not accepted")
+    print(f"restarted peer accepted after {a.packets_received} packets (seq {a.remote.seq})")
+    if len(go_at) != 2 or go_at[id(a)] != go_at[id(b)]:
+        raise SystemExit(f"start handshake failed: {go_at}")
+    print(f"start handshake: both peers go {go_at[id(a)] - start:.2f} s in; bind failure reported: {taken.error}")
+    for name, s in (("player A", stats_a), ("player B", b.stats())):
+        print(
+            f"{name}: {s['bandwidth_bps'] / 1000:.1f} kbit/s up, "
+            f"sent {s['packets_sent']} (dropped {s['packets_dropped']}), "
+            f"received {s['packets_received']} (loss {s['packet_loss'] * 100:.1f}%), "
+            f"one-way {s['one_way_ms']:.1f} ms (max {s['one_way_max_ms']:.1f}), "
+            f"input->remote display {s['input_to_display_ms']:.1f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Horse game versus-mode network tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    test = sub.add_parser("selftest", help="race two synthetic peers on localhost")
+    test.add_argument("--seconds", type=float, default=5.0)
+    test.add_argument("--latency", type=float, default=0.0, help="simulated one-way latency (s)")
+    test.add_argument("--jitter", type=float, default=0.0, help="extra random latency (s)")
+    test.add_argument("--loss", type=float, default=0.0, help="simulated packet loss ratio")
+    test.add_argument("--port", type=int, default=47310)
+    args = parser.parse_args()
+    if args.command == "selftest":
+        _selftest(args.seconds, args.latency, args.jitter, args.loss, args.port)
+
+
+if __name__ == "__main__":
+    main()